@@ -0,0 +1,69 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+# Mensajes por segundo que puede enviar cada cliente a /mensaje y /ws/chat
+# sostenidamente (0 desactiva el límite) y ráfaga máxima que se le admite
+MENSAJES_POR_SEGUNDO = float(os.getenv("MENSAJES_POR_SEGUNDO", "5"))
+MENSAJES_RAFAGA = float(os.getenv("MENSAJES_RAFAGA", "20"))
+
+
+class LimitadorTasa:
+    """
+    Cubeta de fichas por cliente: cada mensaje gasta una ficha y las fichas
+    se reponen a `tasa` por segundo hasta `rafaga`. Decidir cuesta O(1) y no
+    espera a nada, así que un cliente que se excede recibe la respuesta de
+    rechazo de inmediato.
+
+    Se guardan a lo sumo `max_clientes` cubetas; la del cliente inactivo hace
+    más tiempo se descarta, lo que equivale a devolverle la ráfaga completa.
+    """
+
+    def __init__(self, tasa: float, rafaga: float, max_clientes: int = 10000) -> None:
+        self.tasa = tasa
+        self.rafaga = max(rafaga, 1.0)
+        self.max_clientes = max_clientes
+        # cliente -> (fichas, instante de la última actualización)
+        self._cubetas: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, cliente: str) -> float:
+        """
+        Gasta una ficha del cliente si tiene.
+
+        Args:
+            cliente: Identificador del cliente (su IP)
+
+        Returns:
+            float: 0 si se admite el mensaje; si no, segundos hasta que tenga una ficha
+        """
+        if self.tasa <= 0:
+            return 0.0
+        ahora = time.monotonic()
+        with self._lock:
+            fichas, instante = self._cubetas.pop(cliente, (self.rafaga, ahora))
+            fichas = min(self.rafaga, fichas + (ahora - instante) * self.tasa)
+            if fichas >= 1:
+                fichas -= 1
+                espera = 0.0
+            else:
+                espera = (1 - fichas) / self.tasa
+            self._cubetas[cliente] = (fichas, ahora)
+            if len(self._cubetas) > self.max_clientes:
+                self._cubetas.popitem(last=False)
+        return espera
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cubetas)
+
+
+def segundos_retry_after(espera: float) -> str:
+    """Valor de la cabecera Retry-After (segundos enteros, al menos 1)."""
+    return str(max(1, math.ceil(espera)))
+
+
+limitador_mensajes = LimitadorTasa(MENSAJES_POR_SEGUNDO, MENSAJES_RAFAGA)
@@ -0,0 +1,138 @@
+"""
+Mide el arranque en frío del servidor: desde que se lanza el proceso de
+uvicorn hasta que responde el primer /mensaje, y hasta que se puede descargar
+el primer gráfico (pedido justo después de ese mensaje, así que incluye el
+arranque de los procesos de renderizado).
+
+Uso (desde backend/):
+    python -m benchmarks.arranque [--repeticiones 5] [--workers N] [--guardar] [--comparar --umbral 0.2]
+
+También mide, en un proceso aparte, cuánto tarda `import main` y si importa
+matplotlib (no debería: solo lo usan los procesos de renderizado).
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+from benchmarks.lineas_base import finalizar
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tiempo máximo de espera de cada paso antes de dar la corrida por fallida
+LIMITE_ESPERA = 60.0
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pedir(url: str, datos: Optional[dict] = None) -> Optional[dict]:
+    """Hace una petición y retorna el JSON (o {} si no es JSON); None si aún no responde 200."""
+    cuerpo = json.dumps(datos).encode() if datos is not None else None
+    peticion = urllib.request.Request(url, data=cuerpo, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(peticion, timeout=5) as respuesta:
+            if respuesta.status != 200:
+                return None
+            contenido = respuesta.read()
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+    try:
+        return json.loads(contenido)
+    except ValueError:
+        return {}
+
+
+def _esperar(url: str, datos: Optional[dict] = None) -> dict:
+    limite = time.perf_counter() + LIMITE_ESPERA
+    while time.perf_counter() < limite:
+        respuesta = _pedir(url, datos)
+        if respuesta is not None:
+            return respuesta
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} no respondió en {LIMITE_ESPERA:.0f} s")
+
+
+def _importacion(directorio: str) -> Dict[str, float]:
+    codigo = (
+        "import sys, time; sys.path.insert(0, sys.argv[1]); inicio = time.perf_counter(); import main; "
+        "print(time.perf_counter() - inicio, int('matplotlib' in sys.modules))"
+    )
+    salida = subprocess.run([sys.executable, "-c", codigo, BACKEND], cwd=directorio,
+                            capture_output=True, text=True, check=True).stdout.split()
+    return {"importacion": float(salida[0]), "matplotlib": float(salida[1])}
+
+
+def _corrida(directorio: str, workers: Optional[int]) -> Dict[str, float]:
+    """Arranca un servidor, mide el primer /mensaje y el primer gráfico, y lo detiene."""
+    puerto = _puerto_libre()
+    base = f"http://127.0.0.1:{puerto}"
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND, "--port", str(puerto),
+         "--log-level", "warning"],
+        cwd=directorio,
+        env={**os.environ, "RENDER_WORKERS": str(workers)} if workers else None,
+    )
+    try:
+        _esperar(f"{base}/mensaje", {"texto": "Ana", "session_id": "arranque"})
+        primer_mensaje = time.perf_counter() - inicio
+
+        graph_id = _esperar(f"{base}/imc", {"edad": 7, "sexo": "niña", "peso": 25, "talla": 1.2})["graph_id"]
+        _esperar(f"{base}/grafico/{graph_id}")
+        primer_grafico = time.perf_counter() - inicio
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=LIMITE_ESPERA)
+    return {"primer_mensaje": primer_mensaje, "primer_grafico": primer_grafico}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--workers", type=int,
+                        help="Procesos de renderizado (por defecto, RENDER_WORKERS o el de graficos.py)")
+    parser.add_argument("--guardar", action="store_true", help="Guarda el resultado como línea base")
+    parser.add_argument("--comparar", action="store_true", help="Compara con la línea base guardada")
+    parser.add_argument("--umbral", type=float, default=0.2,
+                        help="Fracción de empeoramiento tolerada al comparar")
+    args = parser.parse_args()
+
+    corridas: List[Dict[str, float]] = []
+    # Cada corrida usa un directorio limpio (sin gráficos en caché ni bases de datos)
+    # que ve las tablas reales a través de enlaces
+    for _ in range(args.repeticiones):
+        with tempfile.TemporaryDirectory() as directorio:
+            os.makedirs(os.path.join(directorio, "data"))
+            for nombre in ("tablas_percentiles.json", "grilla_meses.npz"):
+                os.symlink(os.path.join(BACKEND, "data", nombre), os.path.join(directorio, "data", nombre))
+            corrida = _importacion(directorio)
+            corrida.update(_corrida(directorio, args.workers))
+            corridas.append(corrida)
+
+    metricas = {
+        clave: statistics.median(corrida[clave] for corrida in corridas)
+        for clave in ("importacion", "primer_mensaje", "primer_grafico")
+    }
+    print(f"import main:                 {metricas['importacion'] * 1000:8.1f} ms (mediana de {args.repeticiones})")
+    print(f"arranque hasta 1er /mensaje: {metricas['primer_mensaje'] * 1000:8.1f} ms")
+    print(f"arranque hasta 1er gráfico:  {metricas['primer_grafico'] * 1000:8.1f} ms")
+    if any(corrida["matplotlib"] for corrida in corridas):
+        print("AVISO: `import main` importa matplotlib en el proceso del servidor")
+
+    return finalizar("arranque", metricas, args.guardar, args.comparar, args.umbral)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
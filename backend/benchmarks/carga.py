@@ -0,0 +1,146 @@
+"""
+Generador de carga en proceso: conversaciones completas de cinco turnos
+(nombre, edad, sexo, peso, talla) contra /mensaje, con varias conversaciones
+a la vez, más la descarga del gráfico resultante.
+
+Uso (desde backend/):
+    python -m benchmarks.carga [--conversaciones 200] [--concurrencia 20]
+        [--sin-graficos] [--guardar] [--comparar --umbral 0.2 --minimo-ms 2]
+
+La aplicación corre en el mismo proceso a través de httpx.ASGITransport
+(requiere httpx, ver requirements-dev.txt), así que se mide el servidor sin
+la red. Reporta p50/p95/p99 por etapa, el throughput y el RSS máximo del
+proceso y de los procesos de renderizado. Los gráficos, la historia y las
+estadísticas se escriben en un directorio temporal.
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.lineas_base import finalizar
+
+ETAPAS = ("nombre", "edad", "sexo", "peso", "talla")
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano de una lista de tiempos."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def _turnos(rng: random.Random, numero: int) -> List[str]:
+    """Mensajes de una conversación con datos plausibles y variados."""
+    edad = rng.randint(1, 18)
+    talla = round(0.75 + 0.06 * edad + rng.uniform(-0.05, 0.05), 2)
+    peso = round(rng.uniform(14, 25) * talla ** 2, 1)
+    return [f"Menor {numero}", str(edad), rng.choice(["niño", "niña"]), str(peso), str(talla)]
+
+
+async def _conversacion(cliente: httpx.AsyncClient, rng: random.Random, numero: int,
+                        latencias: Dict[str, List[float]], graficos: bool) -> None:
+    session_id = (await cliente.get("/bienvenida")).json()["session_id"]
+    graph_id = None
+    for etapa, texto in zip(ETAPAS, _turnos(rng, numero)):
+        inicio = time.perf_counter()
+        respuesta = await cliente.post("/mensaje", json={"texto": texto, "session_id": session_id})
+        latencias[etapa].append(time.perf_counter() - inicio)
+        respuesta.raise_for_status()
+        graph_id = respuesta.json()["graph_id"]
+
+    if graficos and graph_id:
+        inicio = time.perf_counter()
+        respuesta = await cliente.get(f"/grafico/{graph_id}")
+        # 202 significa que el gráfico no terminó dentro de GRAFICO_ESPERA
+        while respuesta.status_code == 202:
+            await asyncio.sleep(0.05)
+            respuesta = await cliente.get(f"/grafico/{graph_id}")
+        latencias["grafico"].append(time.perf_counter() - inicio)
+        respuesta.raise_for_status()
+
+
+async def _correr(args: argparse.Namespace) -> Dict[str, float]:
+    # Todas las conversaciones llegan desde la misma IP: sin límite por cliente
+    os.environ.setdefault("MENSAJES_POR_SEGUNDO", "0")
+    import main
+
+    latencias: Dict[str, List[float]] = {etapa: [] for etapa in ETAPAS + ("grafico",)}
+    rng = random.Random(args.semilla)
+    pendientes = iter(range(args.conversaciones))
+
+    async def trabajador(cliente: httpx.AsyncClient) -> None:
+        for numero in pendientes:
+            await _conversacion(cliente, rng, numero, latencias, not args.sin_graficos)
+
+    await main.app.router.startup()
+    try:
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://carga") as cliente:
+            inicio = time.perf_counter()
+            await asyncio.gather(*(trabajador(cliente) for _ in range(args.concurrencia)))
+            duracion = time.perf_counter() - inicio
+    finally:
+        await main.app.router.shutdown()
+
+    mensajes = args.conversaciones * len(ETAPAS)
+    print(f"{args.conversaciones} conversaciones ({mensajes} mensajes) con concurrencia "
+          f"{args.concurrencia} en {duracion:.2f} s: {mensajes / duracion:.1f} mensajes/s\n")
+    print(f"{'etapa':<10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+
+    metricas: Dict[str, float] = {"segundos_por_mensaje": duracion / mensajes}
+    for etapa, valores in latencias.items():
+        if not valores:
+            continue
+        fila = {p: _percentil(valores, p) for p in (50, 95, 99)}
+        print(f"{etapa:<10} {fila[50] * 1000:10.2f} {fila[95] * 1000:10.2f} {fila[99] * 1000:10.2f}")
+        for p, valor in fila.items():
+            metricas[f"{etapa}_p{p}"] = valor
+
+    # ru_maxrss está en KB en Linux; los hijos cuentan una vez terminado el pool
+    propio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"\nRSS máximo: {propio:.1f} MB (proceso), {hijos:.1f} MB (mayor proceso de renderizado)")
+    return metricas
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversaciones", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--sin-graficos", action="store_true", help="No descarga los gráficos")
+    parser.add_argument("--guardar", action="store_true", help="Guarda el resultado como línea base")
+    parser.add_argument("--comparar", action="store_true", help="Compara con la línea base guardada")
+    parser.add_argument("--umbral", type=float, default=0.2,
+                        help="Fracción de empeoramiento tolerada al comparar")
+    parser.add_argument("--minimo-ms", type=float, default=2.0,
+                        help="Empeoramiento absoluto mínimo para contar como regresión")
+    args = parser.parse_args()
+
+    # Se corre en un directorio temporal que ve las tablas reales a través de enlaces;
+    # la historia y las estadísticas sintéticas quedan en el data/ temporal
+    datos = os.path.abspath("data")
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as directorio:
+        os.makedirs(os.path.join(directorio, "data"))
+        for nombre in ("tablas_percentiles.json", "grilla_meses.npz"):
+            os.symlink(os.path.join(datos, nombre), os.path.join(directorio, "data", nombre))
+        os.chdir(directorio)
+        try:
+            metricas = asyncio.run(_correr(args))
+        finally:
+            os.chdir(directorio_original)
+
+    return finalizar("carga", metricas, args.guardar, args.comparar, args.umbral, args.minimo_ms / 1000)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Compara el renderizado completo del gráfico con el renderizado sobre el fondo
+precalculado: tiempo por gráfico y diferencia de píxeles entre ambos.
+
+Uso (desde backend/):
+    python -m benchmarks.fondos [--repeticiones 20] [--tolerancia 0.001]
+
+Termina con código 1 si algún gráfico compuesto difiere del completo en más
+de la fracción de píxeles indicada por --tolerancia.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+import numpy as np
+from PIL import Image
+
+from tablas import RUTA_TABLAS, TablaPercentiles, cargar_tablas
+from utils import precalentar_fondos, renderizar_completo, renderizar_sobre_fondo
+
+
+def _casos(tablas: TablaPercentiles) -> List[tuple]:
+    """Un caso por sexo, edad y categoría (dentro de las curvas)."""
+    casos = []
+    for sexo in tablas.sexos:
+        edades, *_ = tablas.serie(sexo)
+        for edad in edades:
+            p5, p85, p95 = tablas.umbrales(sexo, edad)
+            for categoria, imc in enumerate((p5 - 0.3, (p5 + p85) / 2, (p85 + p95) / 2, p95 + 0.3)):
+                casos.append((round(imc, 1), edad, sexo, categoria))
+    return casos
+
+
+def _medir(funcion: Callable[[], object], repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+
+def _leer_rgb(graph_id: str) -> np.ndarray:
+    with Image.open(os.path.join("graficos", f"grafico_{graph_id}.png")) as imagen:
+        return np.asarray(imagen.convert("RGB"), dtype=np.int16)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--tolerancia", type=float, default=0.001,
+                        help="Fracción máxima de píxeles distintos permitida")
+    args = parser.parse_args()
+
+    tablas = cargar_tablas(RUTA_TABLAS)
+    casos = _casos(tablas)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        os.chdir(directorio)
+
+        inicio = time.perf_counter()
+        precalentar_fondos(tablas)
+        print(f"Fondos precalculados en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+        # Caso típico: peso normal a media edad, siempre dentro de las curvas
+        sexo, edad = tablas.sexos[0], 7
+        p5, p85, _ = tablas.umbrales(sexo, edad)
+        imc = round((p5 + p85) / 2, 1)
+        t_completo = _medir(lambda: renderizar_completo(imc, edad, sexo, 1, tablas, "completo"), args.repeticiones)
+        t_fondo = _medir(lambda: renderizar_sobre_fondo(imc, edad, sexo, 1, tablas, "fondo"), args.repeticiones)
+        print(f"Completo:    {t_completo * 1000:7.1f} ms/gráfico (mediana)")
+        print(f"Sobre fondo: {t_fondo * 1000:7.1f} ms/gráfico (mediana)")
+        print(f"Aceleración: {t_completo / t_fondo:7.1f}x")
+
+        peor = 0.0
+        compuestos = 0
+        for imc, edad, sexo, categoria in casos:
+            if not renderizar_sobre_fondo(imc, edad, sexo, categoria, tablas, "fondo"):
+                continue
+            compuestos += 1
+            renderizar_completo(imc, edad, sexo, categoria, tablas, "completo")
+            diferencia = np.abs(_leer_rgb("fondo") - _leer_rgb("completo")).max(axis=2)
+            fraccion = float((diferencia > 8).mean())
+            if fraccion > peor:
+                peor = fraccion
+            if fraccion > args.tolerancia:
+                print(f"DIFERENTE: {sexo}, {edad} años, IMC {imc}: {fraccion:.4%} de píxeles")
+
+    print(f"Casos compuestos: {compuestos}/{len(casos)}; peor diferencia: {peor:.4%} de píxeles")
+    return 0 if peor <= args.tolerancia else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
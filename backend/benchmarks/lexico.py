@@ -0,0 +1,121 @@
+"""
+Compara el léxico (lexico.py) con las funciones que usaba antes cada etapa
+del chat: normalización, búsqueda de sexo y de comandos de reinicio en
+listas, y extracción del primer número ignorando la unidad.
+
+Uso (desde backend/):
+    python -m benchmarks.lexico [--rondas 7] [--guardar] [--comparar --umbral 0.2]
+
+Muestra el tiempo por llamada de cada par (anterior / léxico) sobre un
+corpus de respuestas típicas y la lectura de mensajes con unidades, donde la
+extracción anterior daba valores equivocados. La línea base guarda solo los
+tiempos del léxico.
+"""
+import argparse
+import re
+import sys
+import unicodedata
+from typing import Callable, Dict, List, Optional
+
+import lexico
+from benchmarks.lineas_base import finalizar
+from benchmarks.micro import _por_llamada
+
+# Respuestas típicas a cada etapa, con y sin tildes
+CORPUS = ["Ana", "7", "7 años", "niña", "Niño", "masculino", "F", "25,5", "25 kg", "1.20", "120 cm",
+          "reiniciar", "Calcular otro", "sí", "no", "¿Qué?"]
+
+UNIDADES = ["80 lb", "4 pies", "5 pies 4 pulgadas", "5'4\"", "2500 g", "110 cm", "7 años y 6 meses", "18 meses"]
+
+
+def _normalizar_anterior(texto: str) -> str:
+    texto = texto.lower().strip()
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', texto)
+        if unicodedata.category(c) != 'Mn'
+    )
+
+
+_SEXO_MASCULINO = ["nino", "niño", "masculino", "varon", "m", "hombre", "chico"]
+_SEXO_FEMENINO = ["nina", "niña", "femenino", "f", "mujer", "chica"]
+_COMANDOS_REINICIO = ["reiniciar", "nuevo", "calcular otro", "empezar", "comenzar", "cancelar", "inicio",
+                      "otro calculo", "reset", "volver"]
+
+
+def _sexo_anterior(texto: str) -> Optional[str]:
+    normalizado = _normalizar_anterior(texto)
+    if normalizado in _SEXO_MASCULINO:
+        return "niño"
+    if normalizado in _SEXO_FEMENINO:
+        return "niña"
+    return None
+
+
+def _reinicio_anterior(texto: str) -> bool:
+    return _normalizar_anterior(texto) in _COMANDOS_REINICIO
+
+
+def _numero_anterior(texto: str) -> Optional[float]:
+    match = re.search(r'\d+\.?\d*', texto.strip().replace(',', '.'))
+    return float(match.group()) if match else None
+
+
+def _reinicio(texto: str) -> bool:
+    intencion = lexico.intencion_de(texto)
+    return intencion is not None and intencion.tipo == "reinicio"
+
+
+def _medida(texto: str) -> Optional[float]:
+    medida = lexico.extraer_medida(texto, "talla")
+    return medida.valor if medida is not None else None
+
+
+def _sobre_corpus(funcion: Callable[[str], object]) -> Callable[[], None]:
+    def recorrer() -> None:
+        for texto in CORPUS:
+            funcion(texto)
+    return recorrer
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rondas", type=int, default=7)
+    parser.add_argument("--guardar", action="store_true", help="Guarda el resultado como línea base")
+    parser.add_argument("--comparar", action="store_true", help="Compara con la línea base guardada")
+    parser.add_argument("--umbral", type=float, default=0.2,
+                        help="Fracción de empeoramiento tolerada al comparar")
+    args = parser.parse_args()
+
+    pares = {
+        "normalizar_texto": (_normalizar_anterior, lexico.normalizar_texto),
+        "normalizar_sin_cache": (_normalizar_anterior, lexico._normalizar),
+        "sexo": (_sexo_anterior, lexico.sexo_de),
+        "reinicio": (_reinicio_anterior, _reinicio),
+        "numero": (_numero_anterior, _medida),
+    }
+
+    print(f"Tiempo por respuesta del corpus ({len(CORPUS)} respuestas):\n")
+    print(f"{'función':<24} {'anterior µs':>12} {'léxico µs':>12} {'aceleración':>12}")
+    metricas: Dict[str, float] = {}
+    for nombre, (anterior, nueva) in pares.items():
+        antes = _por_llamada(_sobre_corpus(anterior), args.rondas) / len(CORPUS)
+        ahora = _por_llamada(_sobre_corpus(nueva), args.rondas) / len(CORPUS)
+        metricas[nombre] = ahora
+        print(f"{nombre:<24} {antes * 1e6:12.3f} {ahora * 1e6:12.3f} {antes / ahora:11.1f}x")
+
+    print(f"\n{'mensaje':<24} {'anterior':>12} {'léxico':>12}")
+    diferencias: List[str] = []
+    for texto in UNIDADES:
+        campo = lexico.UNIDADES.get(texto.split()[-1], ("talla",))[0]
+        medida = lexico.extraer_medida(texto, campo)
+        valor = f"{medida.valor:g} {'kg' if campo == 'peso' else 'años' if campo == 'edad' else 'm'}"
+        print(f"{texto:<24} {_numero_anterior(texto):12g} {valor:>12}")
+        if medida.valor != _numero_anterior(texto):
+            diferencias.append(texto)
+    print(f"\n{len(diferencias)} de {len(UNIDADES)} mensajes con unidad: la extracción anterior daba el número sin convertir")
+
+    return finalizar("lexico", metricas, args.guardar, args.comparar, args.umbral)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
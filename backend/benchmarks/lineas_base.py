@@ -0,0 +1,102 @@
+"""
+Líneas base de los benchmarks: guarda las métricas de una corrida en JSON y
+compara corridas posteriores contra ellas.
+
+Todas las métricas comparadas son tiempos (menos es mejor). Las líneas base
+dependen de la máquina, así que se guardan en benchmarks/lineas_base/ y no se
+versionan: hay que guardar una en la misma máquina donde se va a comparar.
+"""
+import json
+import os
+import platform
+import sys
+import time
+from typing import Dict, List
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lineas_base")
+
+
+def ruta_linea_base(nombre: str) -> str:
+    return os.path.join(DIRECTORIO, f"{nombre}.json")
+
+
+def guardar_linea_base(nombre: str, metricas: Dict[str, float]) -> str:
+    """
+    Guarda las métricas de una corrida como línea base.
+
+    Args:
+        nombre: Nombre del benchmark (micro, carga, ...)
+        metricas: Tiempos en segundos por métrica
+
+    Returns:
+        str: Ruta del archivo escrito
+    """
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    ruta = ruta_linea_base(nombre)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "maquina": platform.node(),
+            "metricas": metricas,
+        }, f, ensure_ascii=False, indent=2)
+    return ruta
+
+
+def comparar_con_linea_base(nombre: str, metricas: Dict[str, float], umbral: float,
+                            minimo: float = 0.0) -> List[str]:
+    """
+    Compara una corrida con la línea base guardada.
+
+    Args:
+        nombre: Nombre del benchmark
+        metricas: Tiempos en segundos de la corrida actual
+        umbral: Fracción de empeoramiento tolerada (0.2 = 20% más lento)
+        minimo: Empeoramiento absoluto en segundos por debajo del cual no se
+            considera regresión, para no fallar por ruido en tiempos muy cortos
+
+    Returns:
+        List[str]: Una descripción por cada métrica que empeoró más que el umbral
+
+    Raises:
+        FileNotFoundError: Si no hay línea base guardada
+    """
+    with open(ruta_linea_base(nombre), encoding="utf-8") as f:
+        base = json.load(f)["metricas"]
+
+    regresiones = []
+    for metrica, valor in metricas.items():
+        anterior = base.get(metrica)
+        if not anterior:
+            continue
+        cambio = valor / anterior - 1
+        empeoro = cambio > umbral and valor - anterior > minimo
+        estado = "REGRESIÓN" if empeoro else "ok"
+        print(f"  {metrica:<40} {anterior * 1e6:12.1f} µs -> {valor * 1e6:12.1f} µs ({cambio:+.1%}) {estado}")
+        if empeoro:
+            regresiones.append(f"{metrica}: {cambio:+.1%}")
+    return regresiones
+
+
+def finalizar(nombre: str, metricas: Dict[str, float], guardar: bool, comparar: bool, umbral: float,
+              minimo: float = 0.0) -> int:
+    """
+    Guarda y/o compara la corrida según las opciones de la línea de comandos.
+
+    Returns:
+        int: Código de salida (1 si hubo regresiones o falta la línea base)
+    """
+    if comparar:
+        print(f"\nComparación con la línea base '{nombre}' (umbral {umbral:.0%}):")
+        try:
+            regresiones = comparar_con_linea_base(nombre, metricas, umbral, minimo)
+        except FileNotFoundError:
+            print(f"No hay línea base en {ruta_linea_base(nombre)}; guárdala con --guardar")
+            return 1
+        if regresiones:
+            print(f"{len(regresiones)} métrica(s) empeoraron más de {umbral:.0%}: {', '.join(regresiones)}")
+            return 1
+        print("Sin regresiones")
+    if guardar:
+        print(f"\nLínea base guardada en {guardar_linea_base(nombre, metricas)}")
+    return 0
@@ -0,0 +1,120 @@
+"""
+Microbenchmarks de las funciones del camino de cada mensaje: normalización,
+extracción de números con unidad, clasificación, reporte y gráfico.
+
+Uso (desde backend/):
+    python -m benchmarks.micro [--rondas 7] [--guardar] [--comparar --umbral 0.2]
+
+Cada métrica es la mediana, entre rondas, del tiempo por llamada. Con
+--comparar termina con código 1 si alguna función es más lenta que la línea
+base en más del umbral.
+"""
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+from benchmarks.lineas_base import finalizar
+from chatbot import generar_reporte_resumen
+from lexico import _normalizar, extraer_medida, normalizar_texto
+from tablas import RUTA_TABLAS, cargar_tablas
+from grilla import categoria_de_z, obtener_grilla
+from utils import CATEGORIAS, generar_grafico_percentil, precalentar_fondos
+
+# Tiempo mínimo de cada ronda; las llamadas por ronda se calibran para alcanzarlo
+DURACION_RONDA = 0.2
+
+
+def _por_llamada(funcion: Callable[[], object], rondas: int) -> float:
+    """
+    Mide el tiempo por llamada de una función rápida.
+
+    Args:
+        funcion: Función sin argumentos a medir
+        rondas: Número de rondas; se reporta la mediana
+
+    Returns:
+        float: Segundos por llamada
+    """
+    llamadas = 1
+    while True:
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            funcion()
+        duracion = time.perf_counter() - inicio
+        if duracion >= DURACION_RONDA / 10:
+            break
+        llamadas *= 10
+    llamadas = max(1, int(llamadas * DURACION_RONDA / duracion))
+
+    tiempos = []
+    for _ in range(rondas):
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            funcion()
+        tiempos.append((time.perf_counter() - inicio) / llamadas)
+    return statistics.median(tiempos)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rondas", type=int, default=7)
+    parser.add_argument("--guardar", action="store_true", help="Guarda el resultado como línea base")
+    parser.add_argument("--comparar", action="store_true", help="Compara con la línea base guardada")
+    parser.add_argument("--umbral", type=float, default=0.2,
+                        help="Fracción de empeoramiento tolerada al comparar")
+    args = parser.parse_args()
+
+    tablas = cargar_tablas(RUTA_TABLAS)
+    sexo, edad, peso, talla = "niña", 7, 25.0, 1.2
+    meses = edad * 12
+    imc = peso / talla ** 2
+    grilla = obtener_grilla(tablas)
+
+    def clasificar() -> int:
+        return categoria_de_z(grilla.puntaje_z(imc, sexo, meses))
+
+    categoria = clasificar()
+    clasificacion = CATEGORIAS[categoria]
+
+    # normalizar_texto guarda en caché los textos cortos: la normalización se mide
+    # sin caché sobre textos distintos (con y sin tildes), y la caché aparte
+    textos = itertools.cycle(["  Niña ", "NIÑO", "Sí, es correcto", "masculino", "Ana María", "7 años y 6 meses",
+                              "1,20 m", "Reiniciar", "mide 1.25 metros", "José Ángel"])
+
+    casos: Dict[str, Callable[[], object]] = {
+        "normalizar_texto": lambda: _normalizar(next(textos)),
+        "normalizar_texto_en_cache": lambda: normalizar_texto("  Niña "),
+        "extraer_medida": lambda: extraer_medida("25,5 kg", "peso"),
+        "clasificar": clasificar,
+        "generar_reporte_resumen": lambda: generar_reporte_resumen(imc, edad, peso, talla, clasificacion, "Ana"),
+    }
+
+    metricas: Dict[str, float] = {}
+    for nombre, funcion in casos.items():
+        metricas[nombre] = _por_llamada(funcion, args.rondas)
+        print(f"{nombre:<28} {metricas[nombre] * 1e6:10.2f} µs/llamada")
+
+    # El gráfico escribe en graficos/: se dibuja en un directorio temporal
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as directorio:
+        os.chdir(directorio)
+        try:
+            precalentar_fondos(tablas)
+            metricas["generar_grafico_percentil"] = _por_llamada(
+                lambda: generar_grafico_percentil(imc, meses / 12, sexo, categoria, tablas, "micro"),
+                args.rondas
+            )
+        finally:
+            os.chdir(directorio_original)
+    print(f"{'generar_grafico_percentil':<28} {metricas['generar_grafico_percentil'] * 1000:10.2f} ms/llamada")
+
+    return finalizar("micro", metricas, args.guardar, args.comparar, args.umbral)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
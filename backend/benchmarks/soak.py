@@ -0,0 +1,169 @@
+"""
+Prueba de resistencia de memoria: decenas de miles de conversaciones
+completas con su gráfico, midiendo cada tanto el RSS del servidor y de los
+procesos de renderizado, las figuras de matplotlib vivas, los artistas en
+los fondos en caché y las líneas de código que más memoria ganan.
+
+Uso (desde backend/):
+    python -m benchmarks.soak [--conversaciones 20000] [--muestra 1000] [--concurrencia 20]
+        [--top 5] [--max-crecimiento-mb 20] [--calentamiento 0.3]
+
+Corre la aplicación en el mismo proceso (como benchmarks.carga) con
+DIAGNOSTICO=1, y toma cada muestra de /diagnostico/memoria. El trazado de
+tracemalloc hace todo más lento y ocupa memoria propia, así que los tiempos
+de esta prueba no sirven como referencia. Las cachés acotadas (sesiones e
+índice de gráficos) se achican a 1000 entradas, salvo que se fijen
+SESSION_MAX o GRAFICOS_MAX, para que se llenen pronto: mientras se llenan el
+RSS sube sin que sea una fuga, por eso las muestras de la primera fracción
+--calentamiento no entran en la estimación. Termina con código 1 si, pasado
+el calentamiento, el RSS crece más de --max-crecimiento-mb por cada 10 000
+conversaciones o si aumentan las figuras o los artistas de los fondos.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.carga import ETAPAS, _conversacion
+
+
+def _pendiente(xs: List[float], ys: List[float]) -> float:
+    """Pendiente de la recta de mínimos cuadrados (0 con menos de dos puntos)."""
+    if len(xs) < 2:
+        return 0.0
+    media_x = sum(xs) / len(xs)
+    media_y = sum(ys) / len(ys)
+    varianza = sum((x - media_x) ** 2 for x in xs)
+    if varianza == 0:
+        return 0.0
+    return sum((x - media_x) * (y - media_y) for x, y in zip(xs, ys)) / varianza
+
+
+def _resumir(conversaciones: int, diagnostico: Dict[str, Any]) -> Dict[str, Any]:
+    servidor = diagnostico["servidor"]
+    procesos = diagnostico["renderizado"]
+    return {
+        "conversaciones": conversaciones,
+        "rss_servidor": servidor["rss_mb"],
+        "rss_renderizado": max((p["rss_mb"] for p in procesos), default=0.0),
+        "figuras": sum(p["figuras"] + p["pyplot"] for p in procesos) + servidor["figuras"] + servidor["pyplot"],
+        "artistas": max((n for p in procesos for n in p["artistas_en_fondos"].values()), default=0),
+        "trazada": servidor.get("trazada_mb", 0.0) + sum(p.get("trazada_mb", 0.0) for p in procesos),
+    }
+
+
+async def _correr(args: argparse.Namespace) -> int:
+    # Todas las conversaciones llegan desde la misma IP: sin límite por cliente
+    os.environ.setdefault("MENSAJES_POR_SEGUNDO", "0")
+    # Cachés acotadas que llegan a su tamaño máximo al principio de la prueba
+    os.environ.setdefault("SESSION_MAX", "1000")
+    os.environ.setdefault("GRAFICOS_MAX", "1000")
+    # Antes de importar main, para que el servidor y los procesos de renderizado tracen desde el arranque
+    os.environ["DIAGNOSTICO"] = "1"
+    import main
+
+    latencias: Dict[str, List[float]] = {etapa: [] for etapa in ETAPAS + ("grafico",)}
+    rng = random.Random(args.semilla)
+    muestras: List[Dict[str, Any]] = []
+    # Las muestras tomadas antes de este número de conversaciones no cuentan
+    calentamiento = int(args.conversaciones * args.calentamiento)
+    # Línea de código -> KB ganados, sumando las muestras posteriores al calentamiento
+    crecimiento: Dict[str, float] = defaultdict(float)
+
+    await main.app.router.startup()
+    try:
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://soak", timeout=60) as cliente:
+            print(f"{'conv.':>8} {'RSS serv. MB':>13} {'RSS rend. MB':>13} {'figuras':>8} {'artistas':>9} "
+                  f"{'trazada MB':>11} {'s':>7}")
+            inicio = time.perf_counter()
+            hechas = 0
+            while True:
+                diagnostico = (await cliente.get("/diagnostico/memoria", params={"top": args.top})).json()
+                muestra = _resumir(hechas, diagnostico)
+                muestras.append(muestra)
+                if hechas > calentamiento:
+                    for informe in [diagnostico["servidor"], *diagnostico["renderizado"]]:
+                        for asignacion in informe.get("asignaciones", []):
+                            crecimiento[asignacion["lugar"]] += asignacion.get("kb_diferencia", 0.0)
+                print(f"{hechas:8d} {muestra['rss_servidor']:13.1f} {muestra['rss_renderizado']:13.1f} "
+                      f"{muestra['figuras']:8d} {muestra['artistas']:9d} {muestra['trazada']:11.1f} "
+                      f"{time.perf_counter() - inicio:7.0f}", flush=True)
+                if hechas >= args.conversaciones:
+                    break
+
+                lote = iter(range(hechas, min(hechas + args.muestra, args.conversaciones)))
+
+                async def trabajador() -> None:
+                    for numero in lote:
+                        await _conversacion(cliente, rng, numero, latencias, True)
+
+                await asyncio.gather(*(trabajador() for _ in range(args.concurrencia)))
+                hechas = min(hechas + args.muestra, args.conversaciones)
+    finally:
+        await main.app.router.shutdown()
+
+    # Desde que termina el calentamiento (arranque, fondos y cachés llenándose)
+    estables = [m for m in muestras if m["conversaciones"] >= calentamiento]
+    if len(estables) < 2:
+        estables = muestras[-2:]
+    xs = [m["conversaciones"] / 10000 for m in estables]
+    por_10k = {clave: _pendiente(xs, [m[clave] for m in estables]) for clave in ("rss_servidor", "rss_renderizado")}
+    trazada = _pendiente(xs, [m["trazada"] for m in estables])
+    print(f"\nCrecimiento del RSS por cada 10 000 conversaciones: servidor {por_10k['rss_servidor']:+.1f} MB, "
+          f"renderizado {por_10k['rss_renderizado']:+.1f} MB (memoria trazada {trazada:+.1f} MB)")
+
+    if crecimiento:
+        print(f"\nLíneas que más memoria ganaron (suma de los top {args.top} de cada muestra):")
+        for lugar, kb in sorted(crecimiento.items(), key=lambda item: -item[1])[:args.top * 2]:
+            print(f"  {kb:10.1f} KB  {lugar}")
+
+    fallas: List[str] = []
+    for clave, valor in por_10k.items():
+        if valor > args.max_crecimiento_mb:
+            fallas.append(f"{clave} crece {valor:.1f} MB cada 10 000 conversaciones")
+    if len(estables) >= 2:
+        for clave in ("figuras", "artistas"):
+            if estables[-1][clave] > estables[0][clave]:
+                fallas.append(f"{clave}: {estables[0][clave]} -> {estables[-1][clave]}")
+    for falla in fallas:
+        print(f"POSIBLE FUGA: {falla}")
+    return 1 if fallas else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversaciones", type=int, default=20000)
+    parser.add_argument("--muestra", type=int, default=1000, help="Conversaciones entre dos muestras")
+    parser.add_argument("--concurrencia", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--top", type=int, default=5, help="Líneas de código por proceso en cada muestra")
+    parser.add_argument("--calentamiento", type=float, default=0.3,
+                        help="Fracción inicial de las conversaciones que no entra en la estimación")
+    parser.add_argument("--max-crecimiento-mb", type=float, default=20.0,
+                        help="Crecimiento del RSS tolerado por cada 10 000 conversaciones")
+    args = parser.parse_args()
+
+    # Como benchmarks.carga: gráficos, historia y estadísticas en un directorio temporal
+    datos = os.path.abspath("data")
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as directorio:
+        os.makedirs(os.path.join(directorio, "data"))
+        for nombre in ("tablas_percentiles.json", "grilla_meses.npz"):
+            os.symlink(os.path.join(datos, nombre), os.path.join(directorio, "data", nombre))
+        os.chdir(directorio)
+        try:
+            return asyncio.run(_correr(args))
+        finally:
+            os.chdir(directorio_original)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
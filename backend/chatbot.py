@@ -1,69 +1,107 @@
-import json
 import os
-import re
 import random
-import unicodedata
+import threading
+import time
+import zlib
 from typing import Dict, Tuple, Optional, Any
-from utils import calcular_imc, generar_grafico_percentil, clasificar_por_percentil
-
-estado: Dict[str, Optional[Any]] = {
-    "nombre": None,
-    "edad": None,
-    "sexo": None,
-    "peso": None,
-    "talla": None,
-    "graph_id": None,
-    "intentos_fallidos": 0
-}
+from utils import CATEGORIAS, calcular_imc
+from graficos import solicitar_grafico
+from historial import historial
+from estadisticas import estadisticas
+from sesiones import AlmacenSesiones, crear_almacen, estado_inicial
+from tablas import obtener_tablas
+from grilla import categoria_de_z, meses_de, obtener_grilla, percentil_de_z
+from lexico import cantidades, extraer_medida, intencion_de, sexo_de, sexo_en
+from metricas import (
+    IDEMPOTENCIA, INTENTOS_FALLIDOS, LATENCIA_ETAPA, TIEMPO_CLASIFICACION, TIEMPO_PERCENTILES,
+    TIEMPO_SESION, TIEMPO_SOLICITUD_GRAFICO, medir
+)
 
-def reiniciar_estado() -> None:
-    """
-    Reinicia el estado conversacional del chatbot a valores iniciales.
-    """
-    global estado
-    for key in estado:
-        estado[key] = None
-    estado["intentos_fallidos"] = 0
+almacen: AlmacenSesiones = crear_almacen()
+
+SESION_POR_DEFECTO = "default"
+
+# Respuestas recientes que cada sesión guarda por Idempotency-Key, y segundos
+# durante los que un reintento con la misma clave recibe la respuesta guardada
+IDEMPOTENCIA_MAX = int(os.getenv("IDEMPOTENCIA_MAX", "16"))
+IDEMPOTENCIA_TTL = float(os.getenv("IDEMPOTENCIA_TTL", "600"))
+
+# Largo máximo de una Idempotency-Key
+MAX_CLAVE_IDEMPOTENCIA = 128
+
+# Los mensajes se procesan en el threadpool: dos de la misma sesión no deben
+# leer y guardar su estado a la vez (se pisarían, y un reintento que llega
+# antes de que termine el original no encontraría su respuesta). Un lock por
+# franja de sesiones acota la memoria; sesiones distintas rara vez comparten franja.
+_locks_sesion = tuple(threading.Lock() for _ in range(64))
+
+def _lock_sesion(session_id: str) -> threading.Lock:
+    return _locks_sesion[zlib.crc32(session_id.encode()) % len(_locks_sesion)]
 
-def normalizar_texto(texto: str) -> str:
+def reiniciar_estado(session_id: str = SESION_POR_DEFECTO) -> None:
     """
-    Normaliza texto removiendo tildes y convirtiendo a minúsculas.
+    Reinicia el estado conversacional de una sesión a valores iniciales.
     
     Args:
-        texto: Texto a normalizar
-    
-    Returns:
-        str: Texto normalizado sin tildes y en minúsculas
+        session_id: Identificador de la sesión a reiniciar
     """
-    texto = texto.lower().strip()
-    # Remover tildes
-    texto = ''.join(
-        c for c in unicodedata.normalize('NFD', texto)
-        if unicodedata.category(c) != 'Mn'
-    )
-    return texto
+    almacen.eliminar(session_id)
+
+# Campos que el chat necesita para calcular el IMC, en el orden en que los pregunta
+DATOS = ("edad", "sexo", "peso", "talla")
 
-def extraer_numero(texto: str) -> Optional[float]:
+PREGUNTAS = {
+    "edad": "¿Qué edad tiene? (en años)",
+    "sexo": "¿Es niño o niña?",
+    "peso": "¿Cuánto pesa? (en kg, ejemplo: 15.5)",
+    "talla": "¿Cuál es su estatura? (en metros ej: 1.10, o en cm ej: 110)",
+}
+
+def extraer_campos(mensaje: str, faltantes: Tuple[str, ...] = ("nombre",) + DATOS) -> Dict[str, Any]:
     """
-    Extrae un número de un texto, ignorando unidades como 'kg', 'm', 'cm'.
+    Extrae todos los datos que pueda de un mensaje libre, por ejemplo
+    "Ana, 7 años, niña, 25 kg, 1.20 m". Los números se distinguen por su
+    unidad o por la palabra que los precede ("pesa 25"); los que no tienen
+    ninguna de las dos se asignan a los campos faltantes en el orden del chat.
+    Las unidades (kg, g, lb, m, cm, pies, pulgadas, años, meses) se convierten.
     
     Args:
-        texto: Texto que puede contener un número con unidades
+        mensaje: Texto enviado por el usuario
+        faltantes: Campos que aún no tiene la conversación
     
     Returns:
-        Optional[float]: Número extraído o None si no se encuentra
+        Dict[str, Any]: Campos encontrados (nombre, edad, sexo, peso, talla), sin validar.
+            Peso en kilogramos y talla en metros cuando la unidad lo indica.
     """
-    # Remover espacios y reemplazar coma por punto
-    texto = texto.strip().replace(',', '.')
-    
-    # Buscar patrón de número (entero o decimal)
-    match = re.search(r'\d+\.?\d*', texto)
-    if match:
-        try:
-            return float(match.group())
-        except ValueError:
-            return None
-    return None
+    campos: Dict[str, Any] = {}
+    sin_unidad = []
+
+    for cantidad in cantidades(mensaje):
+        if cantidad.campo is None:
+            sin_unidad.append(cantidad.valor)
+        else:
+            campos.setdefault(cantidad.campo, cantidad.valor)
+
+    for valor in sin_unidad:
+        # Un decimal menor a 2.5 solo puede ser una talla en metros
+        if valor != int(valor) and valor < 2.5 and "talla" in faltantes and "talla" not in campos:
+            campos["talla"] = valor
+            continue
+        campo = next((c for c in ("edad", "peso", "talla") if c in faltantes and c not in campos), None)
+        if campo is not None:
+            campos[campo] = valor
+
+    sexo = sexo_en(mensaje)
+    if sexo is not None:
+        campos["sexo"] = sexo
+
+    # El nombre, si viene, es el primer segmento sin números: "Ana, 7 años, ..."
+    primero = mensaje.split(',')[0].strip()
+    if ("nombre" in faltantes and primero and len(primero) <= 50
+            and not any(c.isdigit() for c in primero) and sexo_de(primero) is None):
+        campos["nombre"] = primero
+
+    return campos
 
 def generar_reporte_resumen(imc: float, edad: int, peso: float, talla: float, clasificacion: str, nombre: Optional[str] = None) -> str:
     """
@@ -130,22 +168,309 @@ def generar_reporte_resumen(imc: float, edad: int, peso: float, talla: float, cl
 
     return resumen + consejos
 
-def procesar_mensaje(mensaje: str) -> Tuple[str, bool, Optional[str]]:
+def _calcular_resultado(estado: Dict[str, Optional[Any]], confirmacion: str = "") -> Tuple[str, bool, Optional[str]]:
+    """
+    Calcula el IMC con los datos completos del estado, lo clasifica y solicita el gráfico.
+    
+    Args:
+        estado: Estado conversacional con edad, sexo, peso y talla completos
+        confirmacion: Texto a anteponer a la respuesta (por ejemplo, una conversión de unidades)
+    
+    Returns:
+        Tuple[str, bool, Optional[str]]: (respuesta_texto, mostrar_grafico, graph_id)
+    """
+    try:
+        imc = calcular_imc(estado["peso"], estado["talla"])
+        edad = estado["edad"]
+        sexo = estado["sexo"]
+
+        try:
+            tablas = obtener_tablas()
+        except FileNotFoundError:
+            return "❌ Error: No se encontró el archivo de tabla de percentiles (tablas_percentiles.json).", False, None
+        except PermissionError:
+            return "❌ Error: No se tienen permisos para leer el archivo de percentiles.", False, None
+        except ValueError:
+            return "❌ Error: El archivo de percentiles tiene un formato inválido.", False, None
+
+        # Las sesiones guardadas antes de registrar los meses solo tienen años
+        meses = estado.get("edad_meses") or edad * 12
+        with medir(TIEMPO_PERCENTILES, "percentiles"):
+            umbrales = tablas.umbrales(sexo, edad)
+            if umbrales is not None:
+                puntaje_z = obtener_grilla(tablas).puntaje_z(imc, sexo, meses)
+        if umbrales is None:
+            return f"📊 No hay datos de percentiles para {sexo} de {edad} años. Solo disponible para edades 1-18.", False, None
+
+        # Del mismo puntaje z que el percentil informado, para que no se contradigan
+        with medir(TIEMPO_CLASIFICACION, "clasificacion"):
+            categoria = categoria_de_z(puntaje_z)
+            clasificacion = CATEGORIAS[categoria]
+        estadisticas.registrar(sexo, edad, clasificacion, imc)
+        with medir(TIEMPO_SOLICITUD_GRAFICO, "grafico"):
+            graph_id = solicitar_grafico(imc, meses, sexo, categoria, tablas)
+        estado["graph_id"] = graph_id
+        # Para la historia del menor; procesar_mensaje lo retira antes de guardar la sesión
+        estado["medicion"] = {
+            "edad_meses": meses, "sexo": sexo, "peso": estado["peso"], "talla": estado["talla"],
+            "imc": round(imc, 2), "percentil": round(percentil_de_z(puntaje_z), 1),
+            "puntaje_z": round(puntaje_z, 2), "clasificacion": clasificacion,
+        }
+
+        nombre = estado.get("nombre")
+        # Frases de transición aleatorias
+        transiciones = [
+            "✨ ¡Listo! Déjame calcular...",
+            "📊 Perfecto. Procesando datos...",
+            "✅ ¡Entendido! Calculando el IMC..."
+        ]
+        mensaje_resultado = confirmacion
+        mensaje_resultado += (
+            f"{random.choice(transiciones)}\n\n"
+            f"✅ El IMC es: {round(imc, 2)} - Categoría: *{clasificacion.upper()}*\n"
+            f"📈 Percentil {percentil_de_z(puntaje_z):.1f} para su edad ({_texto_edad(meses)}), puntaje z {puntaje_z:+.2f}\n"
+        )
+        mensaje_resultado += generar_reporte_resumen(imc, edad, estado["peso"], estado["talla"], clasificacion, nombre)
+        mensaje_resultado += "\n\n🔁 ¿Deseas calcular otro IMC? Escribe 'reiniciar'."
+
+        return mensaje_resultado, graph_id is not None, graph_id
+
+    except ValueError:
+        estado["intentos_fallidos"] += 1
+        return "🚫 Talla no válida. Usa formato como 1.20 (en metros).", False, None
+    except Exception as e:
+        return f"❌ Error inesperado al procesar los datos: {str(e)}", False, None
+
+def _texto_edad(meses: int) -> str:
+    """Describe una edad en meses como '7 años' o '7 años y 6 meses'."""
+    anios, resto = divmod(meses, 12)
+    return f"{anios} años y {resto} meses" if resto else f"{anios} años"
+
+def _validar_campo(campo: str, valor: Any, estado: Dict[str, Optional[Any]]) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    Valida un dato extraído de un mensaje libre con los mismos criterios que cada etapa del chat.
+    
+    Args:
+        campo: Nombre del campo (edad, sexo, peso o talla)
+        valor: Valor extraído
+        estado: Estado conversacional, para validar el peso contra la edad
+    
+    Returns:
+        Tuple: (valor normalizado, None) o (None, motivo del rechazo)
+    """
+    if campo == "edad":
+        edad = int(valor)
+        if edad < 1 or edad > 18:
+            return None, "la edad debe estar entre 1 y 18 años"
+        return edad, None
+    if campo == "peso":
+        if valor <= 0 or valor > 200:
+            return None, "el peso está fuera de rango razonable (0-200 kg)"
+        # Un peso alto para la edad se acepta si el usuario ya lo confirmó
+        if (estado["edad"] is not None and estado["edad"] <= 5 and valor > 30
+                and valor != estado.get("peso_pendiente")):
+            estado["peso_pendiente"] = valor
+            return None, f"{valor:g} kg parece alto para {estado['edad']} años; si es correcto, envíalo de nuevo"
+        return valor, None
+    if campo == "talla":
+        # Igual que en la etapa de talla, un número mayor a 2.5 se interpreta en centímetros
+        talla = valor / 100 if 2.5 < valor <= 250 else valor
+        if talla <= 0 or talla > 2.5:
+            return None, "la talla debe estar entre 0 y 2.5 metros"
+        return talla, None
+    return valor, None
+
+def _siguiente_paso(estado: Dict[str, Optional[Any]], prefijo: str) -> Tuple[str, bool, Optional[str]]:
+    """
+    Pregunta por el primer dato que falta o, si ya están todos, calcula el resultado.
+    
+    Args:
+        estado: Estado conversacional de la sesión
+        prefijo: Texto a anteponer a la pregunta o al resultado
+    
+    Returns:
+        Tuple[str, bool, Optional[str]]: (respuesta_texto, mostrar_grafico, graph_id)
+    """
+    faltante = next((campo for campo in DATOS if estado[campo] is None), None)
+    if faltante is None:
+        return _calcular_resultado(estado, prefijo)
+    return prefijo + PREGUNTAS[faltante], False, None
+
+def _completar_estado(estado: Dict[str, Optional[Any]], campos: Dict[str, Any]) -> Tuple[str, bool, Optional[str]]:
+    """
+    Llena en un solo paso los datos faltantes que vinieron en un mensaje libre
+    y pregunta solo por los que siguen faltando.
+    
+    Args:
+        estado: Estado conversacional de la sesión (se modifica en sitio)
+        campos: Datos extraídos con extraer_campos
+    
+    Returns:
+        Tuple[str, bool, Optional[str]]: (respuesta_texto, mostrar_grafico, graph_id)
+    """
+    anotados = []
+    rechazos = []
+    if estado["nombre"] is None:
+        # Sin nombre en el mensaje se sigue sin él: el reporte usa un texto genérico
+        estado["nombre"] = campos.get("nombre", "")
+        if estado["nombre"]:
+            anotados.append(estado["nombre"])
+
+    for campo in DATOS:
+        if estado[campo] is not None or campo not in campos:
+            continue
+        valor, motivo = _validar_campo(campo, campos[campo], estado)
+        if motivo is not None:
+            rechazos.append(motivo)
+            continue
+        estado[campo] = valor
+        if campo == "edad":
+            estado["edad_meses"] = meses_de(campos["edad"])
+            anotados.append(_texto_edad(estado["edad_meses"]))
+        elif campo == "peso":
+            anotados.append(f"{valor:g} kg")
+        elif campo == "talla":
+            anotados.append(f"{valor:.2f} m")
+        else:
+            anotados.append(valor)
+
+    estado["intentos_fallidos"] = 0
+    prefijo = f"📝 Anoté: {', '.join(anotados)}.\n" if anotados else ""
+    if rechazos:
+        prefijo += f"⚠️ No pude usar todos los datos: {'; '.join(rechazos)}.\n"
+    return _siguiente_paso(estado, prefijo + ("\n" if prefijo else ""))
+
+def _etapa(estado: Dict[str, Optional[Any]], mensaje: str) -> str:
+    """
+    Nombra la etapa de la conversación que atiende un mensaje, para las métricas.
+    
+    Args:
+        estado: Estado conversacional antes de procesar el mensaje
+        mensaje: Texto enviado por el usuario
+    
+    Returns:
+        str: nombre, edad, sexo, peso, talla, reinicio o terminada
+    """
+    for campo in ("nombre",) + DATOS:
+        if estado[campo] is None:
+            return campo
+    intencion = intencion_de(mensaje)
+    return "reinicio" if intencion is not None and intencion.tipo == "reinicio" else "terminada"
+
+def _respuesta_guardada(respuestas: Dict[str, list], clave: str, mensaje: str,
+                        ahora: float) -> Optional[Tuple[str, bool, Optional[str]]]:
+    """
+    Busca la respuesta ya enviada a un mensaje con la misma Idempotency-Key,
+    descartando de paso las que vencieron.
+
+    Args:
+        respuestas: Clave -> [instante, mensaje, respuesta_texto, mostrar_grafico, graph_id]
+        clave: Idempotency-Key del mensaje
+        mensaje: Texto del mensaje; si difiere del guardado con la clave, no es un reintento
+        ahora: Instante actual (time.time(), compartido entre workers)
+
+    Returns:
+        Optional[Tuple]: La respuesta guardada, o None si hay que procesar el mensaje
+    """
+    for vieja in [c for c, (instante, *_) in respuestas.items() if instante + IDEMPOTENCIA_TTL <= ahora]:
+        del respuestas[vieja]
+    guardada = respuestas.get(clave)
+    if guardada is None or guardada[1] != mensaje:
+        return None
+    _, _, respuesta, mostrar_grafico, graph_id = guardada
+    return respuesta, mostrar_grafico, graph_id
+
+def procesar_mensaje(mensaje: str, session_id: str = SESION_POR_DEFECTO,
+                     nino_id: Optional[str] = None,
+                     clave: Optional[str] = None) -> Tuple[str, bool, Optional[str]]:
     """
     Procesa el mensaje del usuario y gestiona el flujo conversacional del chatbot.
     
+    Si se indica una clave de idempotencia y la sesión ya respondió un mensaje
+    igual con esa clave hace menos de IDEMPOTENCIA_TTL segundos, devuelve la
+    misma respuesta sin avanzar la conversación, registrar el resultado ni
+    pedir otro gráfico. Las respuestas se guardan en el estado de la sesión
+    (las IDEMPOTENCIA_MAX más recientes), así que un reintento que llega a
+    otro worker también las encuentra con SESSION_BACKEND=sqlite.
+    
+    Hace E/S bloqueante (sesión en SQLite, historia): desde el event loop hay
+    que llamarla con run_in_threadpool. Los mensajes de una misma sesión se
+    procesan de a uno en este proceso.
+    
     Args:
         mensaje: Texto enviado por el usuario
+        session_id: Identificador de la conversación
+        nino_id: Identificador del menor; si se indica, el resultado se agrega a su historia
+        clave: Idempotency-Key elegida por el cliente para este mensaje
     
     Returns:
         Tuple[str, bool, Optional[str]]: (respuesta_texto, mostrar_grafico, graph_id)
     """
-    global estado
+    with _lock_sesion(session_id):
+        return _procesar_en_sesion(mensaje, session_id, nino_id, clave)
 
+def _procesar_en_sesion(mensaje: str, session_id: str, nino_id: Optional[str],
+                        clave: Optional[str]) -> Tuple[str, bool, Optional[str]]:
+    with medir(TIEMPO_SESION, "sesion", operacion="obtener"):
+        estado = almacen.obtener(session_id)
+    # Fuera del estado mientras se procesa: un cálculo nuevo lo vacía
+    respuestas: Dict[str, list] = estado.pop("respuestas", None) or {}
+    ahora = time.time()
+    if clave is not None:
+        guardada = _respuesta_guardada(respuestas, clave, mensaje, ahora)
+        IDEMPOTENCIA.incrementar(resultado="fallo" if guardada is None else "acierto")
+        if guardada is not None:
+            return guardada
+    etapa = _etapa(estado, mensaje)
+    fallidos = estado["intentos_fallidos"]
+    resultado: Optional[Tuple[str, bool, Optional[str]]] = None
+    try:
+        with medir(LATENCIA_ETAPA, "chat", etapa=etapa):
+            resultado = _procesar(estado, mensaje)
+        return resultado
+    finally:
+        if estado["intentos_fallidos"] > fallidos:
+            INTENTOS_FALLIDOS.incrementar(etapa=etapa)
+        medicion = estado.pop("medicion", None)
+        if medicion is not None and nino_id:
+            historial.registrar(nino_id, medicion)
+        if clave is not None and resultado is not None:
+            respuestas.pop(clave, None)
+            respuestas[clave] = [ahora, mensaje, *resultado]
+            # Los dict conservan el orden de inserción: la primera es la más antigua
+            while len(respuestas) > IDEMPOTENCIA_MAX:
+                del respuestas[next(iter(respuestas))]
+        if respuestas:
+            estado["respuestas"] = respuestas
+        with medir(TIEMPO_SESION, "guardado", operacion="guardar"):
+            almacen.guardar(session_id, estado)
+
+def _procesar(estado: Dict[str, Optional[Any]], mensaje: str) -> Tuple[str, bool, Optional[str]]:
+    """
+    Avanza el flujo conversacional modificando el estado recibido.
+    
+    Args:
+        estado: Estado conversacional de la sesión (se modifica en sitio)
+        mensaje: Texto enviado por el usuario
+    
+    Returns:
+        Tuple[str, bool, Optional[str]]: (respuesta_texto, mostrar_grafico, graph_id)
+    """
     mensaje = mensaje.strip()
     if not mensaje:
         return "No recibí nada 😅. Por favor, escribe un dato válido.", False, None
 
+    # Atajo: un mensaje con dos o más datos ("Ana, 7 años, niña, 25 kg, 1.20 m")
+    # llena el estado de una vez. Tras un resultado, empieza un cálculo nuevo.
+    terminado = estado["talla"] is not None
+    faltantes = ("nombre",) + DATOS if terminado else tuple(c for c in ("nombre",) + DATOS if estado[c] is None)
+    campos = extraer_campos(mensaje, faltantes)
+    if sum(campo in campos for campo in DATOS) >= 2:
+        if terminado:
+            estado.clear()
+            estado.update(estado_inicial())
+        return _completar_estado(estado, campos)
+
     # Etapa 0: Nombre (opcional)
     if estado["nombre"] is None:
         nombre = mensaje.strip()
@@ -156,38 +481,42 @@ def procesar_mensaje(mensaje: str) -> Tuple[str, bool, Optional[str]]:
 
     # Etapa 1: Edad
     elif estado["edad"] is None:
-        numero = extraer_numero(mensaje)
-        if numero is None:
+        medida = extraer_medida(mensaje, "edad")
+        if medida is None:
             estado["intentos_fallidos"] += 1
             if estado["intentos_fallidos"] >= 3:
                 return "🤔 Parece que hay confusión. La edad debe ser un número entero. Por ejemplo, si tiene 5 años, escribe solo '5'. ¿Quieres reiniciar? Escribe 'reiniciar'.", False, None
             return "⚠️ La edad debe ser un número entero. Ejemplo: 5", False, None
         
+        # "7 años y 6 meses" o "18 meses" llegan ya convertidos a años
+        numero = medida.valor
         edad = int(numero)
         if edad < 1 or edad > 18:
             estado["intentos_fallidos"] += 1
             return "📆 Por favor, ingresa una edad entre 1 y 18 años.", False, None
         
         estado["edad"] = edad
+        # Con decimales (7.5 años) se conservan los meses para el percentil exacto
+        estado["edad_meses"] = meses_de(numero)
         estado["intentos_fallidos"] = 0
+        texto_edad = _texto_edad(estado["edad_meses"])
+        if estado["sexo"] is not None:
+            return _siguiente_paso(estado, f"Entendido, {texto_edad}. ")
         
         # Respuestas variadas
         respuestas = [
-            f"Entendido, {edad} años. ¿Es niño o niña?",
-            f"Perfecto, {edad} años. Ahora dime, ¿cuál es su sexo? (niño/niña)",
-            f"Muy bien. {estado['nombre']} tiene {edad} años. ¿Es niño o niña?"
+            f"Entendido, {texto_edad}. ¿Es niño o niña?",
+            f"Perfecto, {texto_edad}. Ahora dime, ¿cuál es su sexo? (niño/niña)",
+            f"Muy bien. {estado['nombre'] or 'El menor'} tiene {texto_edad}. ¿Es niño o niña?"
         ]
         return random.choice(respuestas), False, None
 
     # Etapa 2: Sexo
     elif estado["sexo"] is None:
-        sexo_normalizado = normalizar_texto(mensaje)
-        
-        # Aceptar variaciones: niño, nino, masculino, varon, m, niña, nina, femenino, f
-        if sexo_normalizado in ["nino", "niño", "masculino", "varon", "m", "hombre", "chico"]:
-            estado["sexo"] = "niño"
-        elif sexo_normalizado in ["nina", "niña", "femenino", "f", "mujer", "chica"]:
-            estado["sexo"] = "niña"
+        # Aceptar variaciones: niño, nino, masculino, varon, m, niña, nina, femenino, f, "es niña"
+        sexo = sexo_en(mensaje)
+        if sexo is not None:
+            estado["sexo"] = sexo
         else:
             estado["intentos_fallidos"] += 1
             if estado["intentos_fallidos"] >= 3:
@@ -195,6 +524,8 @@ def procesar_mensaje(mensaje: str) -> Tuple[str, bool, Optional[str]]:
             return "🚻 Por favor, responde con 'niño' o 'niña'.", False, None
         
         estado["intentos_fallidos"] = 0
+        if estado["peso"] is not None:
+            return _siguiente_paso(estado, f"Ok, {estado['sexo']}. ")
         
         # Respuestas variadas con confirmación sutil
         sexo_confirmado = "niño" if estado["sexo"] == "niño" else "niña"
@@ -207,27 +538,44 @@ def procesar_mensaje(mensaje: str) -> Tuple[str, bool, Optional[str]]:
 
     # Etapa 3: Peso
     elif estado["peso"] is None:
-        numero = extraer_numero(mensaje)
-        if numero is None:
-            estado["intentos_fallidos"] += 1
-            if estado["intentos_fallidos"] >= 3:
-                return "🤔 El peso debe ser un número. Por ejemplo, si pesa 15 kilos y medio, escribe '15.5'. ¿Necesitas reiniciar? Escribe 'reiniciar'.", False, None
-            return "🚫 El peso debe ser un número. Puedes usar decimales (ejemplo: 15.5).", False, None
-        
-        peso = numero
-        
-        # Validación de rango razonable según edad
-        edad = estado["edad"]
-        if peso <= 0 or peso > 200:
-            estado["intentos_fallidos"] += 1
-            return "⚠️ Peso fuera de rango razonable (0-200 kg). Verifica el dato.", False, None
-        
-        # Advertencia si el peso parece inusual para la edad
-        if edad <= 5 and peso > 30:
-            return f"⚠️ ¿{peso} kg para {edad} años? Parece alto. Si es correcto, envíalo de nuevo para confirmar.", False, None
-        
+        # Peso alto para la edad que se advirtió en el mensaje anterior
+        pendiente = estado.get("peso_pendiente")
+        intencion = intencion_de(mensaje) if pendiente is not None else None
+        confirmacion = ""
+        if intencion is not None and intencion.tipo == "confirmar":
+            peso = pendiente
+        elif intencion is not None and intencion.tipo == "negar":
+            estado["peso_pendiente"] = None
+            return "De acuerdo. ¿Cuánto pesa entonces? (en kg, ejemplo: 15.5)", False, None
+        else:
+            medida = extraer_medida(mensaje, "peso")
+            if medida is None:
+                estado["intentos_fallidos"] += 1
+                if estado["intentos_fallidos"] >= 3:
+                    return "🤔 El peso debe ser un número. Por ejemplo, si pesa 15 kilos y medio, escribe '15.5'. ¿Necesitas reiniciar? Escribe 'reiniciar'.", False, None
+                return "🚫 El peso debe ser un número. Puedes usar decimales (ejemplo: 15.5).", False, None
+
+            peso = medida.valor
+            if medida.convertido:
+                confirmacion = f"⚖️ Detecté {medida.texto}, lo convertí a {peso:g} kg. "
+
+            # Validación de rango razonable según edad
+            edad = estado["edad"]
+            if peso <= 0 or peso > 200:
+                estado["intentos_fallidos"] += 1
+                return "⚠️ Peso fuera de rango razonable (0-200 kg). Verifica el dato.", False, None
+
+            # Advertencia si el peso parece inusual para la edad; se acepta si lo
+            # confirma o lo envía de nuevo
+            if edad <= 5 and peso > 30 and peso != pendiente:
+                estado["peso_pendiente"] = peso
+                return f"⚠️ ¿{peso:g} kg para {edad} años? Parece alto. Si es correcto, responde 'sí' o envíalo de nuevo.", False, None
+
         estado["peso"] = peso
+        estado["peso_pendiente"] = None
         estado["intentos_fallidos"] = 0
+        if estado["talla"] is not None:
+            return _siguiente_paso(estado, f"{confirmacion}Anotado, {peso} kg. ")
         
         # Respuestas variadas con opción de cm o metros
         respuestas = [
@@ -235,30 +583,32 @@ def procesar_mensaje(mensaje: str) -> Tuple[str, bool, Optional[str]]:
             f"Perfecto, {peso} kg. Ahora la talla (en metros: 1.15 o en cm: 115)",
             f"Entendido, {peso} kg. ¿Y la estatura? (puedes usar metros como 1.20 o cm como 120)"
         ]
-        return random.choice(respuestas), False, None
+        return confirmacion + random.choice(respuestas), False, None
 
     # Etapa 4: Talla
     elif estado["talla"] is None:
-        numero = extraer_numero(mensaje)
-        if numero is None:
+        medida = extraer_medida(mensaje, "talla")
+        if medida is None:
             estado["intentos_fallidos"] += 1
             if estado["intentos_fallidos"] >= 3:
                 return "🤔 La talla debe ser un número. Por ejemplo, si mide 1 metro y 10 centímetros, escribe '1.10' o '110'. ¿Reiniciamos? Escribe 'reiniciar'.", False, None
             return "📐 La talla debe ser un número en metros (ej: 1.15) o en cm (ej: 115).", False, None
         
-        talla = numero
-        
-        # Si el número es muy grande, probablemente lo ingresó en cm
-        if talla > 2.5:
+        numero = talla = medida.valor
+        confirmacion = ""
+
+        if medida.convertido:
+            # Con unidad ("110 cm", "4 pies") ya viene en metros
+            confirmacion = f"📏 Detecté {medida.texto}. Lo convertí a {talla:g} metros. "
+        # Si el número sin unidad es muy grande, probablemente lo ingresó en cm
+        elif talla > 2.5 and not medida.unidad:
             if talla <= 250:  # Probablemente en cm
                 talla = talla / 100
                 confirmacion = f"📏 Detecté {numero} cm. Lo convertí a {talla} metros. "
             else:
                 estado["intentos_fallidos"] += 1
                 return "📐 Talla fuera de rango. Ingresa en metros (ejemplo: 1.15).", False, None
-        else:
-            confirmacion = ""
-        
+
         if talla <= 0 or talla > 2.5:
             estado["intentos_fallidos"] += 1
             return "📐 Talla no válida. Debe estar entre 0 y 2.5 metros. Ejemplo: 1.15", False, None
@@ -266,55 +616,13 @@ def procesar_mensaje(mensaje: str) -> Tuple[str, bool, Optional[str]]:
         estado["talla"] = talla
         estado["intentos_fallidos"] = 0
         
-        try:
-            imc = calcular_imc(estado["peso"], estado["talla"])
-            edad = estado["edad"]
-            sexo = estado["sexo"]
-
-            ruta_tabla = os.path.join("data", "tablas_percentiles.json")
-            try:
-                with open(ruta_tabla, "r", encoding="utf-8") as f:
-                    tablas = json.load(f)
-            except FileNotFoundError:
-                return "❌ Error: No se encontró el archivo de tabla de percentiles (tablas_percentiles.json).", False, None
-            except json.JSONDecodeError:
-                return "❌ Error: El archivo de percentiles tiene un formato JSON inválido.", False, None
-            except PermissionError:
-                return "❌ Error: No se tienen permisos para leer el archivo de percentiles.", False, None
-
-            if str(edad) not in tablas.get(sexo, {}):
-                return f"📊 No hay datos de percentiles para {sexo} de {edad} años. Solo disponible para edades 1-18.", False, None
-
-            clasificacion = clasificar_por_percentil(imc, edad, sexo, tablas)
-            graph_id = generar_grafico_percentil(imc, edad, sexo, tablas)
-            estado["graph_id"] = graph_id
-
-            nombre = estado.get("nombre")
-            # Frases de transición aleatorias
-            transiciones = [
-                "✨ ¡Listo! Déjame calcular...",
-                "📊 Perfecto. Procesando datos...",
-                "✅ ¡Entendido! Calculando el IMC..."
-            ]
-            mensaje_resultado = confirmacion if 'confirmacion' in locals() else ""
-            mensaje_resultado += (
-                f"{random.choice(transiciones)}\n\n"
-                f"✅ El IMC es: {round(imc, 2)} - Categoría: *{clasificacion.upper()}*\n"
-            )
-            mensaje_resultado += generar_reporte_resumen(imc, edad, estado["peso"], estado["talla"], clasificacion, nombre)
-            mensaje_resultado += "\n\n🔁 ¿Deseas calcular otro IMC? Escribe 'reiniciar'."
-
-            return mensaje_resultado, True, graph_id
-
-        except ValueError:
-            estado["intentos_fallidos"] += 1
-            return "🚫 Talla no válida. Usa formato como 1.20 (en metros).", False, None
-        except Exception as e:
-            return f"❌ Error inesperado al procesar los datos: {str(e)}", False, None
+        return _calcular_resultado(estado, confirmacion)
 
     # Comando: Reiniciar
-    if normalizar_texto(mensaje) in ["reiniciar", "nuevo", "calcular otro", "empezar", "comenzar", "cancelar", "inicio", "otro calculo", "reset", "volver"]:
-        reiniciar_estado()
+    intencion = intencion_de(mensaje)
+    if intencion is not None and intencion.tipo == "reinicio":
+        estado.clear()
+        estado.update(estado_inicial())
         return "🔄 ¡Perfecto! Comenzamos de nuevo. ¿Cómo se llama el menor?", False, None
 
     # Cualquier otro texto no esperado
@@ -0,0 +1,118 @@
+"""
+Introspección de memoria para encontrar fugas en procesos de larga vida:
+RSS, figuras de matplotlib vivas, artistas acumulados en los fondos de los
+gráficos y diferencias entre instantáneas de tracemalloc.
+
+Se activa con DIAGNOSTICO=1 (expone /diagnostico/memoria y traza las
+asignaciones del servidor y de los procesos de renderizado, lo que los hace
+más lentos); no debe quedar activo en producción más allá de la búsqueda.
+"""
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+DIAGNOSTICO = os.getenv("DIAGNOSTICO", "0") == "1"
+
+# Marcos de pila que guarda tracemalloc por asignación (más marcos, más memoria)
+DIAGNOSTICO_MARCOS = int(os.getenv("DIAGNOSTICO_MARCOS", "1"))
+
+# Asignaciones propias del trazado, que no interesan al buscar fugas
+_FILTROS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_anterior: Optional[tracemalloc.Snapshot] = None
+_lock = threading.Lock()
+
+
+def iniciar_trazado() -> None:
+    """Empieza a trazar las asignaciones de este proceso, si aún no se hace."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(DIAGNOSTICO_MARCOS)
+
+
+def rss_mb() -> float:
+    """Memoria residente actual del proceso, en MB (la máxima si no hay /proc)."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss está en KB en Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def figuras_vivas() -> Dict[str, Any]:
+    """
+    Cuenta las figuras de matplotlib que siguen en memoria en este proceso.
+
+    Returns:
+        Dict con las figuras alcanzables por el recolector, las registradas
+        en pyplot y los artistas de los ejes de cada fondo en caché (debe
+        mantenerse constante: si crece, quedan artistas de gráficos anteriores)
+    """
+    if "matplotlib.figure" not in sys.modules:
+        return {"figuras": 0, "pyplot": 0, "artistas_en_fondos": {}}
+    from matplotlib.figure import Figure
+
+    # Solo cuentan las que siguen alcanzables, no las que esperan al recolector de ciclos
+    gc.collect()
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    utils = sys.modules.get("utils")
+    fondos = getattr(utils, "_fondos", {})
+    return {
+        "figuras": sum(1 for objeto in gc.get_objects() if isinstance(objeto, Figure)),
+        "pyplot": len(pyplot.get_fignums()) if pyplot is not None else 0,
+        "artistas_en_fondos": {sexo: len(fondo[2].get_children()) for sexo, fondo in list(fondos.items())},
+    }
+
+
+def _asignaciones(instantanea: tracemalloc.Snapshot, anterior: Optional[tracemalloc.Snapshot],
+                  top: int) -> List[Dict[str, Any]]:
+    if anterior is None:
+        estadisticas = instantanea.statistics("lineno")
+        return [{"lugar": str(e.traceback), "kb": round(e.size / 1024, 1), "bloques": e.count}
+                for e in estadisticas[:top]]
+    diferencias = instantanea.compare_to(anterior, "lineno")
+    return [{"lugar": str(d.traceback), "kb": round(d.size / 1024, 1), "kb_diferencia": round(d.size_diff / 1024, 1),
+             "bloques_diferencia": d.count_diff}
+            for d in diferencias[:top]]
+
+
+def informe(top: int = 10, espera: float = 0.0) -> Dict[str, Any]:
+    """
+    Estado de memoria de este proceso. Si se está trazando, incluye las
+    líneas que más memoria ganaron desde el informe anterior del mismo
+    proceso (en el primero, las que más ocupan).
+
+    Args:
+        top: Cuántas líneas de código incluir
+        espera: Segundos que el proceso queda ocupado después, para que un
+            mismo lote de informes se reparta entre los procesos de un pool
+
+    Returns:
+        Dict con pid, RSS, figuras vivas, memoria trazada y asignaciones
+    """
+    global _anterior
+    resultado: Dict[str, Any] = {"pid": os.getpid(), "rss_mb": round(rss_mb(), 1), **figuras_vivas(),
+                                 "objetos_gc": len(gc.get_objects()), "trazado": tracemalloc.is_tracing()}
+    if tracemalloc.is_tracing():
+        actual, pico = tracemalloc.get_traced_memory()
+        with _lock:
+            instantanea = tracemalloc.take_snapshot().filter_traces(_FILTROS)
+            resultado["asignaciones"] = _asignaciones(instantanea, _anterior, top)
+            resultado["desde_anterior"] = _anterior is not None
+            _anterior = instantanea
+        resultado["trazada_mb"] = round(actual / (1024 * 1024), 1)
+        resultado["pico_trazado_mb"] = round(pico / (1024 * 1024), 1)
+    if espera > 0:
+        time.sleep(espera)
+    return resultado
@@ -0,0 +1,214 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from utils import CATEGORIAS
+
+logger = logging.getLogger(__name__)
+
+# Ancho (en puntos de IMC) de las barras del histograma
+ANCHO_BARRA_IMC = 0.5
+
+# Segundos entre dos volcados de los contadores a disco
+ESTADISTICAS_VOLCADO = float(os.getenv("ESTADISTICAS_VOLCADO", "5"))
+
+# (tipo, sexo, edad, clave): tipo 'categoria' con la categoría como clave, o
+# 'imc' con el índice de la barra del histograma (IMC // ANCHO_BARRA_IMC)
+Clave = Tuple[str, str, int, str]
+
+
+class Estadisticas:
+    """
+    Distribución de los resultados por categoría, edad y sexo, e histograma
+    de IMC, mantenidos con contadores.
+
+    Cada resultado suma 1 a dos contadores en memoria (O(1)). Un hilo vuelca
+    periódicamente esos incrementos a SQLite sumándolos a los totales
+    (INSERT ... ON CONFLICT DO UPDATE), así que varios workers pueden
+    volcar al mismo archivo sin pisarse, y al terminar relee los totales. La
+    consulta combina esos totales con lo que este worker aún no volcó, sin
+    recorrer resultados guardados: los de otros workers se ven tras su
+    siguiente volcado.
+    """
+
+    def __init__(self, ruta: str) -> None:
+        self.ruta = ruta
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Incrementos de este worker aún no volcados
+        self._pendientes: Counter = Counter()
+        # Totales de todos los workers leídos en el último volcado
+        self._totales: Dict[Clave, int] = {}
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.execute(
+                "CREATE TABLE IF NOT EXISTS conteos ("
+                "tipo TEXT NOT NULL, sexo TEXT NOT NULL, edad INTEGER NOT NULL, clave TEXT NOT NULL, "
+                "n INTEGER NOT NULL, PRIMARY KEY (tipo, sexo, edad, clave)) WITHOUT ROWID"
+            )
+            self._local.conexion = conexion
+        return conexion
+
+    def registrar(self, sexo: str, edad: int, categoria: str, imc: float) -> None:
+        """
+        Cuenta un resultado. Un IMC no finito (NaN o infinito) se ignora.
+
+        Args:
+            sexo: Sexo del menor ('niño' o 'niña')
+            edad: Edad del menor en años
+            categoria: Categoría de CATEGORIAS
+            imc: IMC calculado
+        """
+        # Las estadísticas nunca deben interrumpir la respuesta: un IMC no finito no se cuenta
+        if not math.isfinite(imc):
+            return
+        barra = str(math.floor(imc / ANCHO_BARRA_IMC))
+        with self._lock:
+            self._pendientes["categoria", sexo, edad, categoria] += 1
+            self._pendientes["imc", sexo, edad, barra] += 1
+
+    def registrar_lote(self, sexos: Iterable[str], edades: Iterable[int], categorias: Iterable[int],
+                       imcs: Iterable[float]) -> None:
+        """
+        Cuenta los resultados de un bloque de /imc/lote tomando el lock una sola
+        vez. Las filas con IMC no finito se ignoran.
+
+        Args:
+            sexos: Sexo de cada fila
+            edades: Edad en años de cada fila
+            categorias: Índice en CATEGORIAS de cada fila
+            imcs: IMC de cada fila
+        """
+        conteo: Counter = Counter()
+        for sexo, edad, categoria, imc in zip(sexos, edades, categorias, imcs):
+            if not math.isfinite(imc):
+                continue
+            conteo["categoria", sexo, int(edad), CATEGORIAS[categoria]] += 1
+            conteo["imc", sexo, int(edad), str(math.floor(imc / ANCHO_BARRA_IMC))] += 1
+        with self._lock:
+            self._pendientes.update(conteo)
+
+    def volcar(self) -> None:
+        """
+        Suma a disco los incrementos pendientes y relee los totales de todos
+        los workers. Si la escritura falla, los incrementos se conservan para
+        el siguiente volcado.
+        """
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, Counter()
+        try:
+            # Abrir la base también puede fallar (directorio inaccesible)
+            conexion = self._conexion()
+            if pendientes:
+                conexion.execute("BEGIN IMMEDIATE")
+                try:
+                    conexion.executemany(
+                        "INSERT INTO conteos (tipo, sexo, edad, clave, n) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (tipo, sexo, edad, clave) DO UPDATE SET n = n + excluded.n",
+                        [(*clave, n) for clave, n in pendientes.items()]
+                    )
+                    conexion.execute("COMMIT")
+                except BaseException:
+                    conexion.execute("ROLLBACK")
+                    raise
+            totales = {
+                (tipo, sexo, edad, clave): n
+                for tipo, sexo, edad, clave, n in conexion.execute("SELECT tipo, sexo, edad, clave, n FROM conteos")
+            }
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("No se pudieron volcar las estadísticas: %s", e)
+            with self._lock:
+                self._pendientes.update(pendientes)
+            return
+        with self._lock:
+            self._totales = totales
+
+    def resumen(self) -> Dict[str, Any]:
+        """
+        Distribución actual, a partir de los contadores.
+
+        Returns:
+            Dict con el total de resultados, la cuenta por categoría, por sexo
+            y edad, y el histograma de IMC por sexo
+        """
+        with self._lock:
+            conteos = Counter(self._totales)
+            conteos.update(self._pendientes)
+
+        categorias = dict.fromkeys(CATEGORIAS, 0)
+        por_sexo_y_edad: Dict[str, Dict[str, Dict[str, int]]] = {}
+        # sexo -> índice de la barra -> resultados, sumando todas las edades
+        barras: Dict[str, Counter] = {}
+        for (tipo, sexo, edad, clave), n in sorted(conteos.items()):
+            if tipo == "categoria":
+                categorias[clave] = categorias.get(clave, 0) + n
+                edades = por_sexo_y_edad.setdefault(sexo, {})
+                edades.setdefault(str(edad), dict.fromkeys(CATEGORIAS, 0))[clave] = n
+            else:
+                barras.setdefault(sexo, Counter())[int(clave)] += n
+        histograma = {
+            sexo: {f"{barra * ANCHO_BARRA_IMC:g}": n for barra, n in sorted(cuenta.items())}
+            for sexo, cuenta in barras.items()
+        }
+        return {
+            "total": sum(categorias.values()),
+            "categorias": categorias,
+            "por_sexo_y_edad": por_sexo_y_edad,
+            "histograma_imc": {"ancho": ANCHO_BARRA_IMC, **histograma},
+        }
+
+
+estadisticas = Estadisticas(os.getenv("ESTADISTICAS_DB", os.path.join("data", "estadisticas.db")))
+
+_volcado_parar = threading.Event()
+_volcado_hilo: Optional[threading.Thread] = None
+
+
+def _volcar_periodicamente(intervalo: float) -> None:
+    while not _volcado_parar.wait(intervalo):
+        try:
+            estadisticas.volcar()
+        except Exception:
+            logger.exception("Falló el volcado de las estadísticas")
+
+
+def iniciar_volcado(intervalo: float = ESTADISTICAS_VOLCADO) -> None:
+    """
+    Lee los totales guardados y arranca el hilo que vuelca los contadores.
+
+    Args:
+        intervalo: Segundos entre volcados
+    """
+    global _volcado_hilo
+    if _volcado_hilo is not None:
+        return
+    estadisticas.volcar()
+    _volcado_parar.clear()
+    _volcado_hilo = threading.Thread(
+        target=_volcar_periodicamente, args=(intervalo,), name="volcado-estadisticas", daemon=True
+    )
+    _volcado_hilo.start()
+
+
+def detener_volcado() -> None:
+    """
+    Detiene el hilo de volcado y vuelca lo que quede pendiente.
+    """
+    global _volcado_hilo
+    _volcado_parar.set()
+    if _volcado_hilo is not None:
+        _volcado_hilo.join()
+        _volcado_hilo = None
+    estadisticas.volcar()
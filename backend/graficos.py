@@ -0,0 +1,928 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from diagnostico import DIAGNOSTICO, iniciar_trazado, informe
+from metricas import DESCARTES, ERRORES_RENDERIZADO, TIEMPO_RENDERIZADO
+from tablas import TablaPercentiles, obtener_tablas
+from utils import (
+    CATEGORIAS, generar_grafico_percentil, generar_grafico_trayectoria, generar_variante,
+    precalentar_renderizado, texto_recomendacion
+)
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_GRAFICOS = "graficos"
+
+# Procesos dedicados a renderizar gráficos (matplotlib no es seguro entre hilos).
+# Dibujar es CPU puro: más procesos que núcleos no da más throughput y hace
+# que los procesos compitan al arrancar
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(2, os.cpu_count() or 1))))
+
+# Gráficos que pueden estar encolados o renderizándose a la vez; con la cola
+# llena los resultados se entregan sin gráfico en lugar de esperar a matplotlib
+GRAFICOS_COLA_MAX = int(os.getenv("GRAFICOS_COLA_MAX", "32"))
+
+# Presupuesto del directorio de gráficos
+GRAFICOS_MAX_MB = float(os.getenv("GRAFICOS_MAX_MB", "200"))
+GRAFICOS_MAX = int(os.getenv("GRAFICOS_MAX", "5000"))
+GRAFICOS_TTL = float(os.getenv("GRAFICOS_TTL", str(7 * 24 * 3600)))
+GRAFICOS_BARRIDO = float(os.getenv("GRAFICOS_BARRIDO", "300"))
+
+# Si está activo, el PNG solo se renderiza cuando alguien lo pide
+PNG_DIFERIDO = os.getenv("GRAFICO_PNG_DIFERIDO", "0") == "1"
+
+# Cambiar al modificar el aspecto del gráfico para no servir imágenes viejas
+VERSION_GRAFICO = 3
+VERSION_TRAYECTORIA = 1
+
+# Segundos mínimos entre dos actualizaciones del mtime de un gráfico usado
+INTERVALO_TOQUE = 60
+
+# Ancho en píxeles del PNG original (figura de 10 pulgadas a 100 dpi)
+ANCHO_ORIGINAL = 1000
+PULGADAS_ANCHO = 10
+
+# Anchos en que se sirven las variantes: un ancho pedido se sube al siguiente,
+# para que la caché guarde pocas variantes por gráfico
+ANCHOS_VARIANTE = (320, 480, 640, 800)
+
+# Formato -> tipo MIME y extensión del archivo
+FORMATOS = {"png": ("image/png", "png"), "png8": ("image/png", "png"), "webp": ("image/webp", "webp")}
+
+
+class Variante(NamedTuple):
+    """Tamaño y formato en que se sirve un gráfico."""
+    ancho: int
+    formato: str
+
+    @property
+    def tipo(self) -> str:
+        return FORMATOS[self.formato][0]
+
+
+ORIGINAL = Variante(ANCHO_ORIGINAL, "png")
+
+# Se genera junto con cada gráfico: la que piden los celulares (unas 3 veces más liviana)
+VARIANTE_MOVIL = Variante(640, "webp")
+
+VARIANTES = (ORIGINAL,) + tuple(Variante(ancho, formato) for ancho in ANCHOS_VARIANTE + (ANCHO_ORIGINAL,)
+                                for formato in FORMATOS if (ancho, formato) != ORIGINAL)
+
+
+class ColaLlena(RuntimeError):
+    """La cola de renderizado alcanzó GRAFICOS_COLA_MAX."""
+
+
+def ruta_grafico(graph_id: str, variante: Variante = ORIGINAL) -> str:
+    """
+    Retorna la ruta en disco del PNG de un gráfico o de una de sus variantes.
+
+    Args:
+        graph_id: ID del gráfico
+        variante: Tamaño y formato (por defecto, el PNG original)
+
+    Returns:
+        str: Ruta del archivo, 'grafico_<id>.png' o 'grafico_<id>_<ancho>_<formato>.<ext>'
+    """
+    if variante == ORIGINAL:
+        return os.path.join(DIRECTORIO_GRAFICOS, f"grafico_{graph_id}.png")
+    extension = FORMATOS[variante.formato][1]
+    return os.path.join(DIRECTORIO_GRAFICOS, f"grafico_{graph_id}_{variante.ancho}_{variante.formato}.{extension}")
+
+
+def elegir_variante(ancho: Optional[int], dpi: Optional[int], formato: Optional[str], accept: str) -> Variante:
+    """
+    Decide qué variante servir. El ancho se puede pedir en píxeles o en dpi
+    (sobre las 10 pulgadas de la figura) y se sube al siguiente ancho de
+    ANCHOS_VARIANTE; nunca se amplía el original. Sin formato explícito se
+    sirve WebP a quien lo acepte y PNG a los demás.
+
+    Args:
+        ancho: Ancho pedido en píxeles
+        dpi: Resolución pedida, si no se indica el ancho
+        formato: 'png', 'png8' o 'webp'
+        accept: Cabecera Accept de la petición
+
+    Returns:
+        Variante: Tamaño y formato a servir
+    """
+    if ancho is None and dpi is not None:
+        ancho = dpi * PULGADAS_ANCHO
+    if ancho is not None:
+        ancho = next((permitido for permitido in ANCHOS_VARIANTE if ancho <= permitido), ANCHO_ORIGINAL)
+    if formato is None:
+        formato = "webp" if "image/webp" in accept else "png"
+    return Variante(ancho or ANCHO_ORIGINAL, formato)
+
+
+def ruta_datos(graph_id: str) -> str:
+    """
+    Retorna la ruta en disco de los datos JSON de un gráfico.
+
+    Args:
+        graph_id: ID del gráfico
+
+    Returns:
+        str: Ruta del archivo JSON
+    """
+    return os.path.join(DIRECTORIO_GRAFICOS, f"grafico_{graph_id}.json")
+
+
+def _id_de_archivo(nombre: str) -> Optional[str]:
+    """
+    Extrae el ID de gráfico de un nombre como 'grafico_<id>.png'. Las
+    trayectorias ('trayectoria_<clave>_<n>.png') se agrupan por menor con el
+    ID 'trayectoria_<clave>', para que el barrido las trate como un gráfico más.
+    """
+    for prefijo in ("grafico_", "trayectoria_"):
+        if nombre.startswith(prefijo):
+            graph_id = nombre[len(prefijo):].split(".", 1)[0].split("_", 1)[0]
+            return graph_id if prefijo == "grafico_" else prefijo + graph_id
+    return None
+
+
+def _tamano_en_disco(graph_id: str) -> int:
+    """Suma el tamaño de todos los archivos guardados de un gráfico, con sus variantes."""
+    total = 0
+    for ruta in _rutas(graph_id):
+        try:
+            total += os.stat(ruta).st_size
+        except OSError:
+            pass
+    return total
+
+
+def _rutas(graph_id: str) -> List[str]:
+    return [ruta_datos(graph_id)] + [ruta_grafico(graph_id, variante) for variante in VARIANTES]
+
+
+def datos_grafico(imc: float, meses: int, sexo: str, categoria: int, tablas: TablaPercentiles) -> Dict[str, Any]:
+    """
+    Reúne lo necesario para que un cliente dibuje el gráfico por su cuenta:
+    las tres curvas de percentiles, el punto del menor y la recomendación.
+
+    Args:
+        imc: IMC calculado del menor
+        meses: Edad del menor en meses cumplidos; el punto va en meses / 12 años
+        sexo: Sexo del menor ('niño' o 'niña')
+        categoria: Índice en CATEGORIAS informado al usuario (grilla.categoria_de_z)
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+
+    Returns:
+        Dict con las series, el punto y los textos del gráfico
+    """
+    edades, p5, p85, p95 = tablas.serie(sexo)
+    imc = round(imc, 1)
+    return {
+        "sexo": sexo,
+        "edad": round(meses / 12, 4),
+        "meses": meses,
+        "imc": imc,
+        "edades": edades,
+        "p5": p5,
+        "p85": p85,
+        "p95": p95,
+        "categoria": categoria,
+        "clasificacion": CATEGORIAS[categoria],
+        "recomendacion": texto_recomendacion(categoria),
+    }
+
+
+def leer_datos(graph_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Lee los datos guardados de un gráfico.
+
+    Args:
+        graph_id: ID del gráfico
+
+    Returns:
+        Optional[Dict]: Datos del gráfico, o None si no existen
+    """
+    try:
+        with open(ruta_datos(graph_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _guardar_datos(graph_id: str, datos: Dict[str, Any]) -> None:
+    os.makedirs(DIRECTORIO_GRAFICOS, exist_ok=True)
+    ruta = ruta_datos(graph_id)
+    ruta_temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(ruta_temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(ruta_temporal, ruta)
+
+
+def id_grafico(imc: float, meses: int, sexo: str, categoria: int, tablas: TablaPercentiles) -> str:
+    """
+    Calcula el ID de un gráfico a partir de los datos que lo determinan.
+    El IMC se redondea a la precisión con la que se muestra en el gráfico;
+    la categoría entra en la clave porque se calcula con el IMC sin redondear.
+
+    Args:
+        imc: IMC calculado del menor
+        meses: Edad del menor en meses cumplidos
+        sexo: Sexo del menor ('niño' o 'niña')
+        categoria: Índice en CATEGORIAS informado al usuario
+        tablas: Tablas de percentiles usadas para el gráfico
+
+    Returns:
+        str: ID hexadecimal del gráfico
+    """
+    clave = f"{VERSION_GRAFICO}|{tablas.version}|{sexo}|{int(meses)}|{categoria}|{imc:.1f}"
+    return hashlib.sha256(clave.encode("utf-8")).hexdigest()[:32]
+
+
+class InfoPNG(NamedTuple):
+    """Metadatos del PNG de un gráfico para servirlo con caché HTTP."""
+    tamano: int
+    mtime: float
+    etag: str
+
+
+class CacheGraficos:
+    """
+    Índice LRU de los gráficos guardados en disco, con límite de bytes y de
+    entradas, expiración por TTL y contadores de aciertos, fallos y expulsiones.
+
+    El índice solo conoce los gráficos vistos por este proceso; el barrido
+    periódico recorre el directorio completo, que es compartido por todos los
+    workers.
+    """
+
+    def __init__(self, directorio: str, max_bytes: int, max_entradas: int, ttl: float) -> None:
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self._bytes = 0
+        # graph_id -> (tamaño en bytes, último toque del mtime)
+        self._indice: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        # Metadatos de los PNG (y sus variantes) ya vistos, para no tocar el disco en cada petición
+        self._png: Dict[str, Dict[Variante, InfoPNG]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._indice)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def buscar(self, graph_id: str) -> bool:
+        """
+        Comprueba si los datos de un gráfico están en disco y lo marca como
+        usado recientemente.
+
+        Args:
+            graph_id: ID del gráfico
+
+        Returns:
+            bool: True si el gráfico ya existe
+        """
+        ahora = time.time()
+        with self._lock:
+            entrada = self._indice.get(graph_id)
+        if entrada is None:
+            # Pudo generarlo otro worker
+            if not os.path.exists(ruta_datos(graph_id)):
+                return False
+            self.registrar(graph_id, _tamano_en_disco(graph_id))
+            return True
+
+        tamano, tocado = entrada
+        if ahora - tocado > INTERVALO_TOQUE:
+            try:
+                os.utime(ruta_datos(graph_id))
+            except OSError:
+                self._olvidar(graph_id)
+                return False
+            tocado = ahora
+        with self._lock:
+            if graph_id in self._indice:
+                self._indice[graph_id] = (tamano, tocado)
+                self._indice.move_to_end(graph_id)
+        return True
+
+    def registrar(self, graph_id: str, tamano: int) -> None:
+        """
+        Añade un gráfico recién guardado al índice, expulsando los menos usados
+        si se supera el presupuesto.
+
+        Args:
+            graph_id: ID del gráfico
+            tamano: Tamaño del archivo en bytes
+        """
+        with self._lock:
+            anterior = self._indice.pop(graph_id, None)
+            if anterior is not None:
+                self._bytes -= anterior[0]
+            self._png.pop(graph_id, None)
+            self._indice[graph_id] = (tamano, time.time())
+            self._bytes += tamano
+            expulsados = []
+            while len(self._indice) > 1 and (
+                len(self._indice) > self.max_entradas or self._bytes > self.max_bytes
+            ):
+                viejo, (tamano_viejo, _) = self._indice.popitem(last=False)
+                self._png.pop(viejo, None)
+                self._bytes -= tamano_viejo
+                expulsados.append(viejo)
+        for viejo in expulsados:
+            self._borrar_grafico(viejo)
+
+    def contar(self, acierto: bool) -> None:
+        """
+        Cuenta una solicitud de gráfico como acierto o fallo de la caché.
+        Se llama desde varios hilos a la vez, por eso toma el lock.
+
+        Args:
+            acierto: True si el gráfico se reutilizó, False si hubo que generarlo
+        """
+        with self._lock:
+            if acierto:
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+
+    def _contar_expulsion(self) -> None:
+        with self._lock:
+            self.expulsiones += 1
+
+    def info_png(self, graph_id: str, variante: Variante = ORIGINAL) -> Optional[InfoPNG]:
+        """
+        Obtiene tamaño, fecha y ETag del PNG de un gráfico o de una variante.
+        Solo se consulta el disco (y se calcula el hash del contenido) la
+        primera vez.
+
+        Args:
+            graph_id: ID del gráfico
+            variante: Tamaño y formato (por defecto, el PNG original)
+
+        Returns:
+            Optional[InfoPNG]: Metadatos del archivo, o None si no está en disco
+        """
+        info = self._png.get(graph_id, {}).get(variante)
+        if info is not None:
+            return info
+        ruta = ruta_grafico(graph_id, variante)
+        try:
+            with open(ruta, "rb") as f:
+                contenido = f.read()
+            mtime = os.stat(ruta).st_mtime
+        except OSError:
+            return None
+        info = InfoPNG(len(contenido), mtime, f'"{hashlib.sha256(contenido).hexdigest()[:32]}"')
+        if graph_id not in self._indice:
+            self.registrar(graph_id, _tamano_en_disco(graph_id))
+        with self._lock:
+            if graph_id in self._indice:
+                self._png.setdefault(graph_id, {})[variante] = info
+        return info
+
+    def sumar(self, graph_id: str, tamano: int) -> None:
+        """
+        Suma al tamaño de un gráfico indexado el de un archivo nuevo (una
+        variante), sin olvidar los metadatos de los que ya tiene.
+
+        Args:
+            graph_id: ID del gráfico
+            tamano: Bytes del archivo nuevo
+        """
+        with self._lock:
+            entrada = self._indice.get(graph_id)
+            if entrada is not None:
+                self._indice[graph_id] = (entrada[0] + tamano, entrada[1])
+                self._bytes += tamano
+
+    def olvidar(self, graph_id: str) -> None:
+        """
+        Quita un gráfico del índice, por ejemplo si otro worker lo borró.
+
+        Args:
+            graph_id: ID del gráfico
+        """
+        self._olvidar(graph_id)
+
+    def _olvidar(self, graph_id: str) -> None:
+        with self._lock:
+            self._png.pop(graph_id, None)
+            entrada = self._indice.pop(graph_id, None)
+            if entrada is not None:
+                self._bytes -= entrada[0]
+
+    def _borrar(self, ruta: str) -> bool:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.warning("No se pudo borrar %s: %s", ruta, e)
+            return False
+        return True
+
+    def _borrar_grafico(self, graph_id: str) -> None:
+        borrados = [self._borrar(ruta) for ruta in _rutas(graph_id)]
+        if any(borrados):
+            self._contar_expulsion()
+
+    def barrer(self) -> None:
+        """
+        Recorre el directorio de gráficos y borra los expirados por TTL y los
+        menos usados recientemente hasta cumplir el presupuesto.
+        """
+        ahora = time.time()
+        # graph_id -> [último uso, bytes, rutas]; un gráfico puede tener varios archivos
+        graficos: Dict[str, list] = {}
+        try:
+            with os.scandir(self.directorio) as it:
+                for entrada in it:
+                    try:
+                        info = entrada.stat()
+                    except OSError:
+                        continue
+                    if entrada.name.endswith(".tmp"):
+                        # Temporales huérfanos de un renderizado interrumpido
+                        if ahora - info.st_mtime > 3600:
+                            self._borrar(entrada.path)
+                        continue
+                    graph_id = _id_de_archivo(entrada.name)
+                    if graph_id is None:
+                        continue
+                    grafico = graficos.setdefault(graph_id, [0.0, 0, []])
+                    grafico[0] = max(grafico[0], info.st_mtime)
+                    grafico[1] += info.st_size
+                    grafico[2].append(entrada.path)
+        except FileNotFoundError:
+            return
+
+        ordenados = sorted(graficos.items(), key=lambda item: item[1][0])
+        total_bytes = sum(grafico[1] for _, grafico in ordenados)
+        total = len(ordenados)
+        for graph_id, (mtime, tamano, rutas) in ordenados:
+            if mtime > ahora - self.ttl and total <= self.max_entradas and total_bytes <= self.max_bytes:
+                break
+            self._olvidar(graph_id)
+            if any([self._borrar(ruta) for ruta in rutas]):
+                self._contar_expulsion()
+            total -= 1
+            total_bytes -= tamano
+
+    def estadisticas(self) -> Dict[str, int]:
+        """
+        Retorna los contadores de la caché de este proceso.
+
+        Returns:
+            Dict con aciertos, fallos, expulsiones, entradas y bytes indexados
+        """
+        with self._lock:
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+                "entradas": len(self._indice),
+                "bytes": self._bytes,
+            }
+
+
+cache = CacheGraficos(
+    DIRECTORIO_GRAFICOS,
+    max_bytes=int(GRAFICOS_MAX_MB * 1024 * 1024),
+    max_entradas=GRAFICOS_MAX,
+    ttl=GRAFICOS_TTL
+)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pendientes: Dict[str, "Future[str]"] = {}
+_lock = threading.Lock()
+_barrido_parar = threading.Event()
+_barrido_hilo: Optional[threading.Thread] = None
+
+
+def _iniciar_proceso_renderizado(tablas: TablaPercentiles) -> None:
+    # Con DIAGNOSTICO=1 se traza desde antes de importar matplotlib
+    if DIAGNOSTICO:
+        iniciar_trazado()
+    precalentar_renderizado(tablas)
+
+
+def iniciar_renderizado(workers: int = RENDER_WORKERS) -> None:
+    """
+    Crea el pool de procesos de renderizado si aún no existe.
+
+    Args:
+        workers: Número de procesos del pool
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            # 'spawn' evita heredar hilos y estado de matplotlib del proceso del servidor;
+            # cada proceso importa matplotlib y dibuja los fondos de las curvas al arrancar
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_proceso_renderizado,
+                initargs=(obtener_tablas(),)
+            )
+            # El pool crea los procesos al recibir tareas: se lanzan ya, en segundo
+            # plano, para que el primer gráfico no espere su arranque
+            for _ in range(workers):
+                _executor.submit(os.getpid)
+
+
+def detener_renderizado() -> None:
+    """
+    Detiene el pool de renderizado esperando los gráficos en curso.
+    """
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _barrer_periodicamente(intervalo: float) -> None:
+    while not _barrido_parar.wait(intervalo):
+        try:
+            cache.barrer()
+        except Exception:
+            logger.exception("Falló el barrido del directorio de gráficos")
+
+
+def iniciar_barrido(intervalo: float = GRAFICOS_BARRIDO) -> None:
+    """
+    Arranca el hilo que aplica periódicamente el presupuesto de disco.
+
+    Args:
+        intervalo: Segundos entre barridos
+    """
+    global _barrido_hilo
+    if _barrido_hilo is not None:
+        return
+    cache.barrer()
+    _barrido_parar.clear()
+    _barrido_hilo = threading.Thread(
+        target=_barrer_periodicamente, args=(intervalo,), name="barrido-graficos", daemon=True
+    )
+    _barrido_hilo.start()
+
+
+def detener_barrido() -> None:
+    """
+    Detiene el hilo de barrido del directorio de gráficos.
+    """
+    global _barrido_hilo
+    _barrido_parar.set()
+    if _barrido_hilo is not None:
+        _barrido_hilo.join()
+        _barrido_hilo = None
+
+
+def _fallo_renderizado(clave: str, tipo: str, futuro: Future) -> bool:
+    """
+    Indica si un renderizado no terminó bien; si el proceso lanzó una
+    excepción la registra en el log y en imc_renderizado_errores_total.
+
+    Args:
+        clave: ID o nombre de la imagen
+        tipo: 'grafico', 'variante' o 'trayectoria'
+        futuro: Futuro ya terminado del pool
+
+    Returns:
+        bool: True si se canceló o falló
+    """
+    if futuro.cancelled():
+        return True
+    error = futuro.exception()
+    if error is None:
+        return False
+    ERRORES_RENDERIZADO.incrementar(tipo=tipo)
+    logger.error("Falló el renderizado de %s %s", tipo, clave, exc_info=error)
+    return True
+
+
+def _renderizado_terminado(graph_id: str, inicio: float, futuro: "Future[str]") -> None:
+    with _lock:
+        _pendientes.pop(graph_id, None)
+    if _fallo_renderizado(graph_id, "grafico", futuro):
+        return
+    TIEMPO_RENDERIZADO.observar(time.monotonic() - inicio)
+    cache.registrar(graph_id, _tamano_en_disco(graph_id))
+    # Se calcula aquí el ETag para que la primera petición no lea el archivo
+    cache.info_png(graph_id)
+    # Sin pool (el servidor se está deteniendo) no se crea uno nuevo para la variante
+    if _executor is None or os.path.exists(ruta_grafico(graph_id, VARIANTE_MOVIL)):
+        return
+    try:
+        asegurar_variante(graph_id, VARIANTE_MOVIL)
+    except ColaLlena:
+        # Se generará cuando alguien la pida
+        pass
+
+
+def diagnosticar_renderizado(top: int = 10, espera: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    Pide un informe de memoria (diagnostico.informe) a los procesos de
+    renderizado. Cada informe deja ocupado a su proceso `espera` segundos
+    para que los demás tomen los siguientes; aun así, con el pool muy
+    ocupado algún proceso puede no responder.
+
+    Args:
+        top: Cuántas líneas de código incluir por proceso
+        espera: Segundos que cada informe ocupa a su proceso
+
+    Returns:
+        List[Dict]: Un informe por proceso que respondió, ordenados por pid
+    """
+    iniciar_renderizado()
+    with _lock:
+        executor = _executor
+    if executor is None:
+        return []
+    futuros = [executor.submit(informe, top, espera) for _ in range(RENDER_WORKERS)]
+    informes: Dict[int, Dict[str, Any]] = {}
+    for futuro in futuros:
+        try:
+            resultado = futuro.result(timeout=30)
+        except Exception as e:
+            logger.warning("Un proceso de renderizado no entregó su informe: %s", e)
+            continue
+        informes.setdefault(resultado["pid"], resultado)
+    return [informes[pid] for pid in sorted(informes)]
+
+
+def profundidad_cola() -> int:
+    """Gráficos encolados o renderizándose en este momento."""
+    with _lock:
+        return len(_pendientes)
+
+
+def _enviar(clave: str, al_terminar: Callable[[str, float, Future], None], funcion: Callable[..., Any],
+            *args: Any) -> Optional[Future]:
+    """
+    Envía un renderizado al pool, salvo que el de la misma clave ya esté en curso.
+
+    Args:
+        clave: Identificador del archivo a renderizar
+        al_terminar: Se llama con (clave, inicio, futuro) al terminar
+        funcion: Función de renderizado que corre en el pool
+        args: Argumentos de la función
+
+    Returns:
+        Optional[Future]: Futuro del renderizado, o None si no se pudo encolar
+
+    Raises:
+        ColaLlena: Si ya hay GRAFICOS_COLA_MAX gráficos pendientes
+    """
+    iniciar_renderizado()
+    with _lock:
+        # Otro hilo pudo encolarlo mientras se consultaba el disco
+        futuro = _pendientes.get(clave)
+        if futuro is not None:
+            return futuro
+        if len(_pendientes) >= GRAFICOS_COLA_MAX:
+            DESCARTES.incrementar(motivo="cola_graficos")
+            raise ColaLlena(f"hay {len(_pendientes)} gráficos pendientes")
+        inicio = time.monotonic()
+        try:
+            futuro = _executor.submit(funcion, *args)
+        except RuntimeError as e:
+            # Incluye BrokenProcessPool y un pool ya detenido
+            logger.error("No se pudo encolar el gráfico %s: %s", clave, e)
+            return None
+        _pendientes[clave] = futuro
+    futuro.add_done_callback(lambda f: al_terminar(clave, inicio, f))
+    return futuro
+
+
+def _encolar(graph_id: str, imc: float, meses: int, sexo: str, categoria: int,
+             tablas: TablaPercentiles) -> "Optional[Future[str]]":
+    """
+    Encola el renderizado del PNG de un gráfico, salvo que ya esté en curso.
+
+    Returns:
+        Optional[Future[str]]: Futuro del renderizado, o None si no se pudo encolar
+
+    Raises:
+        ColaLlena: Si ya hay GRAFICOS_COLA_MAX gráficos pendientes
+    """
+    return _enviar(graph_id, _renderizado_terminado, generar_grafico_percentil,
+                   imc, meses / 12, sexo, categoria, tablas, graph_id)
+
+
+def solicitar_grafico(imc: float, meses: int, sexo: str, categoria: int,
+                      tablas: TablaPercentiles) -> Optional[str]:
+    """
+    Retorna el ID del gráfico para estos datos. Si ya existe o se está
+    generando se reutiliza; si no, se guardan sus datos y se encola el
+    renderizado del PNG sin esperar (o se deja para cuando se pida, con
+    GRAFICO_PNG_DIFERIDO=1). Con la cola de renderizado llena no hay
+    gráfico: el resultado se entrega solo con texto.
+
+    Args:
+        imc: IMC calculado del menor
+        meses: Edad del menor en meses cumplidos
+        sexo: Sexo del menor ('niño' o 'niña')
+        categoria: Índice en CATEGORIAS informado al usuario (grilla.categoria_de_z),
+            para que el gráfico diga lo mismo que el texto
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+
+    Returns:
+        Optional[str]: ID del gráfico, o None si no se pudo encolar
+    """
+    meses = int(meses)
+    graph_id = id_grafico(imc, meses, sexo, categoria, tablas)
+    with _lock:
+        en_curso = graph_id in _pendientes
+        cola_llena = len(_pendientes) >= GRAFICOS_COLA_MAX
+    if en_curso or cache.buscar(graph_id):
+        cache.contar(acierto=True)
+        return graph_id
+    if cola_llena and not PNG_DIFERIDO:
+        # Se descarta antes de escribir en disco
+        DESCARTES.incrementar(motivo="cola_graficos")
+        return None
+
+    cache.contar(acierto=False)
+    try:
+        _guardar_datos(graph_id, datos_grafico(imc, meses, sexo, categoria, tablas))
+    except OSError as e:
+        logger.error("No se pudieron guardar los datos del gráfico %s: %s", graph_id, e)
+        return None
+    cache.registrar(graph_id, _tamano_en_disco(graph_id))
+
+    if PNG_DIFERIDO:
+        return graph_id
+    try:
+        futuro = _encolar(graph_id, round(imc, 1), meses, sexo, categoria, tablas)
+    except ColaLlena:
+        # Otro hilo llenó la cola; los datos quedan y /grafico podrá renderizarlo después
+        return None
+    return graph_id if futuro is not None else None
+
+
+def grafico_pendiente(graph_id: str) -> "Optional[Future[str]]":
+    """
+    Obtiene el renderizado en curso de un gráfico.
+
+    Args:
+        graph_id: ID del gráfico
+
+    Returns:
+        Optional[Future[str]]: Futuro del renderizado, o None si no está pendiente
+    """
+    with _lock:
+        return _pendientes.get(graph_id)
+
+
+def asegurar_png(graph_id: str) -> "Optional[Future[str]]":
+    """
+    Obtiene el renderizado del PNG de un gráfico que aún no está en disco,
+    encolándolo a partir de sus datos guardados si hace falta.
+
+    Args:
+        graph_id: ID del gráfico
+
+    Returns:
+        Optional[Future[str]]: Futuro del renderizado, o None si el gráfico no existe
+
+    Raises:
+        ColaLlena: Si hay que renderizarlo y la cola está llena
+    """
+    pendiente = grafico_pendiente(graph_id)
+    if pendiente is not None:
+        return pendiente
+    datos = leer_datos(graph_id)
+    # Los datos de la versión 2 del gráfico no guardaban los meses ni la categoría
+    if datos is None or "categoria" not in datos:
+        return None
+    return _encolar(graph_id, datos["imc"], datos["meses"], datos["sexo"], datos["categoria"], obtener_tablas())
+
+
+def _variante_terminada(graph_id: str, variante: Variante, clave: str, futuro: "Future[str]") -> None:
+    with _lock:
+        _pendientes.pop(clave, None)
+    if _fallo_renderizado(clave, "variante", futuro):
+        return
+    try:
+        cache.sumar(graph_id, os.stat(ruta_grafico(graph_id, variante)).st_size)
+    except OSError:
+        return
+    cache.info_png(graph_id, variante)
+
+
+def asegurar_variante(graph_id: str, variante: Variante) -> "Optional[Future[str]]":
+    """
+    Encola la creación de una variante de un gráfico a partir de su PNG
+    original, que ya debe estar en disco.
+
+    Args:
+        graph_id: ID del gráfico
+        variante: Tamaño y formato
+
+    Returns:
+        Optional[Future[str]]: Futuro de la variante, o None si no se pudo encolar
+
+    Raises:
+        ColaLlena: Si la cola de renderizado está llena
+    """
+    nombre = os.path.basename(ruta_grafico(graph_id, variante))
+    return _enviar(
+        nombre, lambda clave, _, futuro: _variante_terminada(graph_id, variante, clave, futuro),
+        generar_variante, ruta_grafico(graph_id), nombre, variante.ancho, variante.formato
+    )
+
+
+def nombre_trayectoria(nino_id: str, puntos: int, tablas: TablaPercentiles) -> str:
+    """
+    Nombre del PNG de la trayectoria de un menor con cierto número de mediciones.
+    Como la historia solo crece, el número de mediciones identifica la imagen.
+
+    Args:
+        nino_id: Identificador del menor
+        puntos: Número de mediciones dibujadas
+        tablas: Tablas de percentiles usadas para el gráfico
+
+    Returns:
+        str: Nombre del archivo dentro de graficos/
+    """
+    clave = hashlib.sha256(f"{VERSION_TRAYECTORIA}|{tablas.version}|{nino_id}".encode("utf-8")).hexdigest()[:32]
+    return f"trayectoria_{clave}_{puntos}.png"
+
+
+def _trayectorias_anteriores(nombre: str) -> List[Tuple[str, int]]:
+    """Imágenes en disco de la misma trayectoria con menos puntos: (ruta, puntos), de menos a más."""
+    prefijo, puntos = nombre[:-len(".png")].rsplit("_", 1)
+    anteriores: List[Tuple[str, int]] = []
+    try:
+        with os.scandir(DIRECTORIO_GRAFICOS) as it:
+            for entrada in it:
+                if not (entrada.name.startswith(prefijo + "_") and entrada.name.endswith(".png")):
+                    continue
+                previos = entrada.name[len(prefijo) + 1:-len(".png")]
+                if previos.isdigit() and int(previos) < int(puntos):
+                    anteriores.append((entrada.path, int(previos)))
+    except FileNotFoundError:
+        pass
+    return sorted(anteriores, key=lambda anterior: anterior[1])
+
+
+def _trayectoria_terminada(nombre: str, inicio: float, futuro: "Future[bool]") -> None:
+    with _lock:
+        _pendientes.pop(nombre, None)
+    if _fallo_renderizado(nombre, "trayectoria", futuro):
+        return
+    TIEMPO_RENDERIZADO.observar(time.monotonic() - inicio)
+    # Solo se conserva la imagen más reciente de cada menor
+    for ruta, _ in _trayectorias_anteriores(nombre):
+        cache._borrar(ruta)
+
+
+def solicitar_trayectoria(nino_id: str, mediciones: List[Dict[str, Any]],
+                          tablas: TablaPercentiles) -> Tuple[str, Optional[Future]]:
+    """
+    Obtiene el PNG de la trayectoria de un menor, encolando su renderizado
+    si no está en disco. Si hay una imagen de la misma trayectoria con menos
+    mediciones, solo se dibujan sobre ella los tramos nuevos.
+
+    Args:
+        nino_id: Identificador del menor
+        mediciones: Historia del menor, de la más antigua a la más reciente
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+
+    Returns:
+        Tuple: (nombre del archivo, futuro del renderizado o None si ya está en disco)
+
+    Raises:
+        ColaLlena: Si hay que renderizarla y la cola está llena
+    """
+    # Las curvas son las del sexo de la última medición
+    sexo = mediciones[-1]["sexo"]
+    puntos = [(m["edad_meses"] / 12, round(m["imc"], 1)) for m in mediciones if m["sexo"] == sexo]
+    nombre = nombre_trayectoria(nino_id, len(mediciones), tablas)
+    if os.path.exists(os.path.join(DIRECTORIO_GRAFICOS, nombre)):
+        return nombre, None
+    anterior: Optional[Tuple[str, int]] = None
+    anteriores = _trayectorias_anteriores(nombre)
+    if anteriores:
+        ruta, previas = anteriores[-1]
+        # Sirve si se dibujó con las curvas del mismo sexo; sus puntos son los de ese sexo
+        if mediciones[previas - 1]["sexo"] == sexo:
+            anterior = (ruta, sum(1 for m in mediciones[:previas] if m["sexo"] == sexo))
+    futuro = _enviar(nombre, _trayectoria_terminada, generar_grafico_trayectoria,
+                     puntos, sexo, tablas, nombre, anterior)
+    if futuro is None:
+        raise RuntimeError("No se pudo encolar la trayectoria")
+    return nombre, futuro
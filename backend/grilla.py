@@ -0,0 +1,333 @@
+"""
+Grilla mensual de parámetros LMS (edades 1 a 18 años, ambos sexos) para dar
+el percentil exacto, el puntaje z y la categoría de cada menor por mes de edad.
+
+Las tablas de percentiles tienen una fila por año con p5, p85 y p95. En cada
+año se ajusta una distribución LMS (Box-Cox) que pasa exactamente por esos
+tres percentiles, y los parámetros se interpolan mes a mes. La grilla se
+genera fuera de línea con:
+
+    python grilla.py
+
+y se guarda en data/grilla_meses.npz, que se carga al arrancar.
+"""
+import logging
+import math
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from tablas import TablaPercentiles
+
+logger = logging.getLogger(__name__)
+
+RUTA_GRILLA = os.path.join("data", "grilla_meses.npz")
+
+# Puntajes z de los percentiles 5, 85 y 95 de la normal estándar
+Z_PERCENTILES = (-1.6448536269514722, 1.0364333894937898, 1.6448536269514722)
+
+# El ajuste reproduce p5, p85 y p95 salvo por redondeo: un IMC igual a un
+# umbral de las tablas puede quedar a esta distancia por debajo de su z
+TOLERANCIA_Z = 1e-9
+
+# Rango de búsqueda del parámetro L (asimetría) y precisión del ajuste
+LIMITE_L = 10.0
+ITERACIONES = 100
+
+# Por debajo de este |L| se usa el límite logarítmico de Box-Cox
+EPSILON_L = 1e-9
+
+
+def meses_de(edad: float) -> int:
+    """
+    Convierte una edad en años (con decimales) a meses cumplidos.
+
+    Args:
+        edad: Edad del menor en años, por ejemplo 7.5
+
+    Returns:
+        int: Edad en meses cumplidos
+    """
+    return int(edad * 12 + 1e-6)
+
+
+def _box_cox(x: np.ndarray, L: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(np.abs(L) < EPSILON_L, np.log(x), (x ** L - 1) / L)
+
+
+def ajustar_lms(p5: np.ndarray, p85: np.ndarray, p95: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Ajusta por cada fila los parámetros LMS que reproducen exactamente p5, p85 y p95.
+
+    Con el L correcto, la transformación Box-Cox de los tres percentiles queda
+    alineada con sus puntajes z; L se busca por bisección (vectorizada) y M y S
+    salen de esa recta.
+
+    Args:
+        p5: Percentil 5 de cada fila
+        p85: Percentil 85 de cada fila
+        p95: Percentil 95 de cada fila
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (L, M, S) por fila
+
+    Raises:
+        ValueError: Si algún trío de percentiles no admite un ajuste LMS
+    """
+    z5, z85, z95 = Z_PERCENTILES
+    referencia = np.asarray(p85, dtype=float)
+    x = np.column_stack([p5, p85, p95]).astype(float) / referencia[:, None]
+
+    def desajuste(L: np.ndarray) -> np.ndarray:
+        y = _box_cox(x, L[:, None])
+        return (y[:, 2] - y[:, 1]) / (z95 - z85) - (y[:, 1] - y[:, 0]) / (z85 - z5)
+
+    bajo = np.full(len(x), -LIMITE_L)
+    alto = np.full(len(x), LIMITE_L)
+    f_bajo = desajuste(bajo)
+    if np.any(np.sign(f_bajo) == np.sign(desajuste(alto))):
+        raise ValueError("Los percentiles no admiten un ajuste LMS en el rango de L permitido.")
+    for _ in range(ITERACIONES):
+        medio = (bajo + alto) / 2
+        f_medio = desajuste(medio)
+        mismo_lado = np.sign(f_medio) == np.sign(f_bajo)
+        bajo = np.where(mismo_lado, medio, bajo)
+        f_bajo = np.where(mismo_lado, f_medio, f_bajo)
+        alto = np.where(mismo_lado, alto, medio)
+    L = (bajo + alto) / 2
+
+    # Recta y = a + b·z por los percentiles transformados; (M/ref)^L = 1 + L·a y S = b / (1 + L·a)
+    y = _box_cox(x, L[:, None])
+    b = (y[:, 2] - y[:, 0]) / (z95 - z5)
+    a = y[:, 0] - b * z5
+    base = 1 + L * a
+    with np.errstate(divide="ignore", invalid="ignore"):
+        M = referencia * np.where(np.abs(L) < EPSILON_L, np.exp(a), base ** (1 / L))
+    S = b / base
+    return L, M, S
+
+
+class GrillaLMS:
+    """
+    Parámetros LMS por sexo y mes de edad, en un array (sexo, mes, 3).
+
+    La fila de un mes se encuentra por índice directo (mes - mes_min), así que
+    cada consulta es de tiempo constante.
+    """
+
+    def __init__(self, sexos: Tuple[str, ...], mes_min: int, lms: np.ndarray, version: str) -> None:
+        self.sexos = tuple(sexos)
+        self.mes_min = mes_min
+        self.lms = lms
+        self.version = version
+        self._indices: Dict[str, int] = {sexo: i for i, sexo in enumerate(self.sexos)}
+
+    @property
+    def mes_max(self) -> int:
+        return self.mes_min + self.lms.shape[1] - 1
+
+    def parametros(self, sexo: str, meses: int) -> Tuple[float, float, float]:
+        """
+        Obtiene los parámetros LMS de un sexo y mes. Las edades fuera de la
+        grilla usan el mes más cercano.
+
+        Args:
+            sexo: Sexo del menor ('niño' o 'niña')
+            meses: Edad del menor en meses cumplidos
+
+        Returns:
+            Tuple[float, float, float]: (L, M, S)
+        """
+        mes = min(max(meses, self.mes_min), self.mes_max)
+        L, M, S = self.lms[self._indices[sexo], mes - self.mes_min]
+        return float(L), float(M), float(S)
+
+    def puntaje_z(self, imc: float, sexo: str, meses: int) -> float:
+        """
+        Calcula el puntaje z del IMC de un menor.
+
+        Args:
+            imc: IMC calculado del menor
+            sexo: Sexo del menor ('niño' o 'niña')
+            meses: Edad del menor en meses cumplidos
+
+        Returns:
+            float: Puntaje z (0 es la mediana)
+        """
+        L, M, S = self.parametros(sexo, meses)
+        if abs(L) < EPSILON_L:
+            return math.log(imc / M) / S
+        return ((imc / M) ** L - 1) / (L * S)
+
+    def puntajes_z(self, imcs: np.ndarray, sexos: np.ndarray, meses: np.ndarray) -> np.ndarray:
+        """
+        Calcula el puntaje z de muchos menores en una sola pasada.
+
+        Args:
+            imcs: IMC de cada menor
+            sexos: Sexo de cada menor ('niño' o 'niña')
+            meses: Edad de cada menor en meses cumplidos
+
+        Returns:
+            np.ndarray: Puntaje z por menor
+        """
+        filas = np.empty(len(imcs), dtype=int)
+        for sexo, i in self._indices.items():
+            filas[sexos == sexo] = i
+        columnas = np.clip(meses, self.mes_min, self.mes_max) - self.mes_min
+        L, M, S = self.lms[filas, columnas].T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(np.abs(L) < EPSILON_L, np.log(imcs / M) / S, ((imcs / M) ** L - 1) / (L * S))
+
+
+def percentil_de_z(z: float) -> float:
+    """
+    Convierte un puntaje z en percentil (0-100) con la normal estándar.
+
+    Args:
+        z: Puntaje z
+
+    Returns:
+        float: Percentil
+    """
+    return 50 * (1 + math.erf(z / math.sqrt(2)))
+
+
+def percentiles_de_z(z: np.ndarray) -> np.ndarray:
+    """
+    percentil_de_z para un array. No es vectorizada: aplica math.erf valor por
+    valor (numpy no trae erf y scipy no es dependencia del proyecto). Cuesta
+    unos 0.08 µs por valor, alrededor de 80 µs por bloque de /imc/lote, poco
+    frente a validar y serializar las filas; una aproximación de erf en numpy
+    con la misma precisión resultó más lenta en bloques de ese tamaño.
+
+    Args:
+        z: Puntajes z
+
+    Returns:
+        np.ndarray: Percentil por valor, iguales a los de percentil_de_z
+    """
+    valores = (np.asarray(z, dtype=float) / math.sqrt(2)).tolist()
+    return 50 * (1 + np.fromiter(map(math.erf, valores), dtype=float, count=len(valores)))
+
+
+def categoria_de_z(z: float) -> int:
+    """
+    Clasifica un puntaje z en las categorías de utils.CATEGORIAS, con los
+    mismos cortes (percentiles 5, 85 y 95) que el percentil que se informa.
+
+    Args:
+        z: Puntaje z del IMC del menor
+
+    Returns:
+        int: Índice en CATEGORIAS (cuántos de los tres percentiles alcanza)
+    """
+    return sum(z >= limite - TOLERANCIA_Z for limite in Z_PERCENTILES)
+
+
+def categorias_de_z(z: np.ndarray) -> np.ndarray:
+    """Versión vectorizada de categoria_de_z."""
+    return (np.asarray(z)[:, None] >= np.array(Z_PERCENTILES) - TOLERANCIA_Z).sum(axis=1)
+
+
+def generar_grilla(tablas: TablaPercentiles) -> GrillaLMS:
+    """
+    Ajusta los parámetros LMS de cada año de las tablas y los interpola mes a mes.
+
+    Args:
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+
+    Returns:
+        GrillaLMS: Grilla de todos los sexos sobre el rango de edades común
+    """
+    series = {sexo: tablas.serie(sexo) for sexo in tablas.sexos}
+    mes_min = 12 * max(edades[0] for edades, *_ in series.values())
+    mes_max = 12 * min(edades[-1] for edades, *_ in series.values())
+    meses = np.arange(mes_min, mes_max + 1)
+
+    lms = np.empty((len(series), len(meses), 3))
+    for i, (edades, p5, p85, p95) in enumerate(series.values()):
+        parametros = ajustar_lms(np.array(p5), np.array(p85), np.array(p95))
+        for j, valores in enumerate(parametros):
+            lms[i, :, j] = np.interp(meses, np.array(edades) * 12, valores)
+    return GrillaLMS(tuple(series), mes_min, lms, tablas.version)
+
+
+def guardar_grilla(grilla: GrillaLMS, ruta: str = RUTA_GRILLA) -> None:
+    """
+    Guarda la grilla en un archivo .npz.
+
+    Args:
+        grilla: Grilla a guardar
+        ruta: Ruta del archivo
+    """
+    np.savez(ruta, sexos=np.array(grilla.sexos), mes_min=grilla.mes_min, lms=grilla.lms,
+             version=np.array(grilla.version))
+
+
+def cargar_grilla(ruta: str = RUTA_GRILLA) -> GrillaLMS:
+    """
+    Lee una grilla guardada con guardar_grilla.
+
+    Args:
+        ruta: Ruta del archivo
+
+    Returns:
+        GrillaLMS: Grilla lista para consultar
+    """
+    with np.load(ruta) as archivo:
+        return GrillaLMS(tuple(archivo["sexos"].tolist()), int(archivo["mes_min"]), archivo["lms"],
+                         str(archivo["version"]))
+
+
+_grilla: Optional[GrillaLMS] = None
+
+
+def obtener_grilla(tablas: TablaPercentiles, ruta: str = RUTA_GRILLA) -> GrillaLMS:
+    """
+    Retorna la grilla que corresponde a las tablas vigentes. Usa el archivo
+    precalculado si se generó con esas mismas tablas; si no (por ejemplo, tras
+    una recarga de las tablas), la genera en memoria.
+
+    Raises:
+        ValueError: Si no hay grilla anterior y las tablas no admiten un ajuste LMS
+
+    Args:
+        tablas: Tablas de percentiles vigentes
+        ruta: Ruta del archivo de la grilla
+
+    Returns:
+        GrillaLMS: Grilla de las tablas recibidas
+    """
+    global _grilla
+    grilla = _grilla
+    if grilla is not None and grilla.version == tablas.version:
+        return grilla
+    try:
+        grilla = cargar_grilla(ruta)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("No se pudo leer la grilla mensual: %s", e)
+        grilla = None
+    if grilla is None or grilla.version != tablas.version:
+        logger.info("La grilla mensual no corresponde a las tablas %s; se genera en memoria", tablas.version)
+        try:
+            grilla = generar_grilla(tablas)
+        except ValueError as e:
+            # Igual que con las tablas, tras una recarga inválida se sigue con la grilla anterior
+            if _grilla is None:
+                raise
+            logger.warning("No se pudo generar la grilla mensual: %s", e)
+            return _grilla
+    _grilla = grilla
+    return grilla
+
+
+if __name__ == "__main__":
+    from tablas import cargar_tablas
+
+    grilla = generar_grilla(cargar_tablas())
+    guardar_grilla(grilla)
+    print(f"Grilla de {grilla.lms.shape[1]} meses ({grilla.mes_min}-{grilla.mes_max}) por sexo "
+          f"para las tablas {grilla.version}, guardada en {RUTA_GRILLA}")
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Datos de cada medición, en el orden de las columnas de la tabla
+CAMPOS = ("edad_meses", "sexo", "peso", "talla", "imc", "percentil", "puntaje_z", "clasificacion")
+
+# Largo máximo del identificador de un menor elegido por el cliente
+MAX_NINO_ID = 64
+
+
+class Historial:
+    """
+    Mediciones de cada menor a lo largo del tiempo, en SQLite (modo WAL) para
+    que todos los workers de uvicorn compartan la misma historia.
+
+    La tabla solo recibe inserciones: una medición nunca se modifica. El
+    índice (nino_id, fecha) hace que leer la historia de un menor no recorra
+    la de los demás.
+    """
+
+    def __init__(self, ruta: str) -> None:
+        self.ruta = ruta
+        self._local = threading.local()
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            # El archivo se crea con la primera medición, no al importar el módulo
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.execute(
+                "CREATE TABLE IF NOT EXISTS mediciones ("
+                "id INTEGER PRIMARY KEY, nino_id TEXT NOT NULL, fecha REAL NOT NULL, "
+                "edad_meses INTEGER NOT NULL, sexo TEXT NOT NULL, peso REAL NOT NULL, talla REAL NOT NULL, "
+                "imc REAL NOT NULL, percentil REAL NOT NULL, puntaje_z REAL NOT NULL, clasificacion TEXT NOT NULL)"
+            )
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_mediciones_nino_fecha ON mediciones (nino_id, fecha)")
+            self._local.conexion = conexion
+        return conexion
+
+    def registrar(self, nino_id: str, medicion: Dict[str, Any], fecha: Optional[float] = None) -> None:
+        """
+        Agrega una medición a la historia de un menor.
+
+        Args:
+            nino_id: Identificador del menor elegido por el cliente
+            medicion: Valores de CAMPOS
+            fecha: Momento de la medición (por defecto, ahora)
+        """
+        self._conexion().execute(
+            f"INSERT INTO mediciones (nino_id, fecha, {', '.join(CAMPOS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(CAMPOS))})",
+            (nino_id, time.time() if fecha is None else fecha, *(medicion[campo] for campo in CAMPOS))
+        )
+
+    def mediciones(self, nino_id: str) -> List[Dict[str, Any]]:
+        """
+        Obtiene la historia de un menor.
+
+        Args:
+            nino_id: Identificador del menor
+
+        Returns:
+            List[Dict]: Mediciones con su id y fecha, de la más antigua a la más reciente
+        """
+        filas = self._conexion().execute(
+            f"SELECT id, fecha, {', '.join(CAMPOS)} FROM mediciones WHERE nino_id = ? ORDER BY fecha, id",
+            (nino_id,)
+        ).fetchall()
+        return [dict(zip(("id", "fecha") + CAMPOS, fila)) for fila in filas]
+
+
+historial = Historial(os.getenv("HISTORIAL_DB", os.path.join("data", "historial.db")))
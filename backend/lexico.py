@@ -0,0 +1,231 @@
+"""
+Léxico del chat: normalización de texto, intenciones (sexo, reinicio,
+confirmar, negar) y extracción de números con unidad, convertidos a años,
+kilogramos o metros.
+
+Todas las etapas de la conversación y el procesamiento por lotes leen la
+entrada con estas funciones, así que un sinónimo o una unidad nueva se
+agrega en un solo lugar.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+# Textos más largos que esto se normalizan sin pasar por la caché, para que un
+# mensaje enorme no la ocupe; las respuestas de cada etapa son mucho más cortas
+LARGO_MAXIMO_CACHE = 64
+
+
+class Intencion(NamedTuple):
+    tipo: str  # sexo, reinicio, confirmar o negar
+    valor: str
+
+
+# Variantes aceptadas para el sexo, ya normalizadas (sin tildes, en minúsculas)
+SEXO_MASCULINO = ("nino", "masculino", "varon", "m", "hombre", "chico")
+SEXO_FEMENINO = ("nina", "femenino", "f", "mujer", "chica")
+
+# Comandos que, tras un resultado, empiezan una conversación nueva
+COMANDOS_REINICIO = ("reiniciar", "nuevo", "calcular otro", "empezar", "comenzar", "cancelar", "inicio",
+                     "otro calculo", "reset", "volver")
+
+CONFIRMACIONES = ("si", "sip", "correcto", "es correcto", "si es correcto", "confirmo", "confirmar",
+                  "exacto", "asi es", "claro", "ok", "vale", "de acuerdo")
+NEGACIONES = ("no", "incorrecto", "no es correcto", "me equivoque", "corregir")
+
+# Texto completo normalizado -> intención
+INTENCIONES: Dict[str, Intencion] = {
+    **{texto: Intencion("sexo", "niño") for texto in SEXO_MASCULINO},
+    **{texto: Intencion("sexo", "niña") for texto in SEXO_FEMENINO},
+    **{texto: Intencion("reinicio", "") for texto in COMANDOS_REINICIO},
+    **{texto: Intencion("confirmar", "") for texto in CONFIRMACIONES},
+    **{texto: Intencion("negar", "") for texto in NEGACIONES},
+}
+
+# Unidades reconocidas tras un número, ya normalizadas: unidad -> (campo, factor a años, kg o metros)
+LIBRA = 0.45359237
+PIE = 0.3048
+PULGADA = 0.0254
+UNIDADES: Dict[str, Tuple[str, float]] = {
+    "ano": ("edad", 1), "anos": ("edad", 1), "mes": ("edad", 1 / 12), "meses": ("edad", 1 / 12),
+    "kg": ("peso", 1), "kgs": ("peso", 1), "kilo": ("peso", 1), "kilos": ("peso", 1),
+    "kilogramo": ("peso", 1), "kilogramos": ("peso", 1),
+    "g": ("peso", 0.001), "gr": ("peso", 0.001), "gramos": ("peso", 0.001),
+    "lb": ("peso", LIBRA), "lbs": ("peso", LIBRA), "libra": ("peso", LIBRA), "libras": ("peso", LIBRA),
+    "m": ("talla", 1), "mt": ("talla", 1), "mts": ("talla", 1), "metro": ("talla", 1), "metros": ("talla", 1),
+    "cm": ("talla", 0.01), "cms": ("talla", 0.01), "centimetros": ("talla", 0.01),
+    "ft": ("talla", PIE), "pie": ("talla", PIE), "pies": ("talla", PIE), "'": ("talla", PIE),
+    "in": ("talla", PULGADA), "pulgada": ("talla", PULGADA), "pulgadas": ("talla", PULGADA),
+    '"': ("talla", PULGADA), "’": ("talla", PIE), "”": ("talla", PULGADA),
+}
+
+# Decimales con que se guarda un valor convertido (una libra no da un número redondo de kg)
+DECIMALES = {"edad": 4, "peso": 2, "talla": 3}
+
+# Palabras que, justo antes de un número sin unidad, indican a qué campo corresponde
+CONTEXTO = {
+    "edad": "edad", "tiene": "edad",
+    "pesa": "peso", "peso": "peso",
+    "mide": "talla", "talla": "talla", "estatura": "talla", "altura": "talla",
+}
+
+# Número con la palabra que lo precede y la unidad que lo sigue (texto ya normalizado).
+# La coma es decimal ("25,5 kg") salvo entre números de una lista separada por
+# comas ("Ana,7,25,1.20" son edad 7, peso 25 y talla 1.20, no edad 7.25)
+PATRON_DATO = re.compile(
+    r"(?:([a-z]+)\s*:?\s*)?"
+    r"((?<!\d,)(?<!\d, )\d+,\d+(?![\d.]|\s*,\s*\d)|\d+(?:\.\d+)?)"
+    r"\s*([a-z]+|['\"’”])?"
+)
+
+# Respuesta que es solo un número, lo más común en cada etapa ("7", "25,5")
+PATRON_NUMERO = re.compile(r"\s*(\d+(?:[.,]\d+)?)\s*")
+
+PATRON_PALABRA = re.compile(r"[a-z]+")
+
+# Signos que se ignoran alrededor de una respuesta corta ("¡Sí!", "niña.")
+SIGNOS = " .,;:!¡?¿"
+
+
+class Cantidad(NamedTuple):
+    valor: float  # en años, kilogramos o metros si tiene unidad
+    texto: str  # número y unidad tal como se escribieron ("80 lb")
+    unidad: str  # unidad normalizada, "" si no tiene
+    campo: Optional[str]  # campo por la unidad o por la palabra previa, None si no se sabe
+    convertido: bool  # si el valor difiere del número escrito (otra unidad o partes sumadas)
+
+
+def _normalizar(texto: str) -> str:
+    texto = texto.lower().strip()
+    if texto.isascii():
+        return texto
+    # Remover tildes
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', texto)
+        if unicodedata.category(c) != 'Mn'
+    )
+
+
+_normalizar_en_cache = lru_cache(maxsize=1024)(_normalizar)
+
+
+def normalizar_texto(texto: str) -> str:
+    """
+    Normaliza texto removiendo tildes y convirtiendo a minúsculas. Los textos
+    cortos (respuestas de cada etapa, columnas de un CSV) se guardan en caché.
+
+    Args:
+        texto: Texto a normalizar
+
+    Returns:
+        str: Texto normalizado sin tildes y en minúsculas
+    """
+    if len(texto) > LARGO_MAXIMO_CACHE:
+        return _normalizar(texto)
+    return _normalizar_en_cache(texto)
+
+
+def intencion_de(texto: str) -> Optional[Intencion]:
+    """
+    Reconoce una respuesta corta completa: un sexo, un comando de reinicio,
+    una confirmación o una negación.
+
+    Args:
+        texto: Mensaje del usuario
+
+    Returns:
+        Optional[Intencion]: Intención reconocida o None
+    """
+    if len(texto) > LARGO_MAXIMO_CACHE:
+        return None
+    clave = normalizar_texto(texto).strip(SIGNOS)
+    intencion = INTENCIONES.get(clave)
+    if intencion is None and " " in clave:
+        intencion = INTENCIONES.get(" ".join(clave.split()))
+    return intencion
+
+
+def sexo_de(texto: str) -> Optional[str]:
+    """Traduce una respuesta completa ('Niña', 'masculino') a 'niño' o 'niña', o None si no indica sexo."""
+    intencion = intencion_de(texto)
+    return intencion.valor if intencion is not None and intencion.tipo == "sexo" else None
+
+
+def sexo_en(texto: str) -> Optional[str]:
+    """
+    Busca el sexo en un texto: primero como respuesta completa ('m', 'niña')
+    y si no, en sus palabras ('es niña'). Dentro de una frase se ignoran
+    'm' y 'f' solas, que son ambiguas (metros, iniciales).
+
+    Args:
+        texto: Mensaje del usuario
+
+    Returns:
+        Optional[str]: 'niño', 'niña' o None
+    """
+    sexo = sexo_de(texto)
+    if sexo is not None:
+        return sexo
+    for palabra in PATRON_PALABRA.findall(normalizar_texto(texto)):
+        intencion = INTENCIONES.get(palabra) if len(palabra) > 1 else None
+        if intencion is not None and intencion.tipo == "sexo":
+            return intencion.valor
+    return None
+
+
+def cantidades(texto: str) -> Iterator[Cantidad]:
+    """
+    Recorre los números de un texto con su unidad, convertidos a años,
+    kilogramos o metros. Las partes seguidas de un mismo dato en unidades
+    distintas se suman: "7 años y 3 meses", "5 pies 4 pulgadas", "1 m 20 cm".
+
+    Args:
+        texto: Mensaje del usuario
+
+    Yields:
+        Cantidad: Cada número en el orden del texto
+    """
+    anterior: Optional[Cantidad] = None
+    for coincidencia in PATRON_DATO.finditer(normalizar_texto(texto)):
+        previa, numero, unidad = coincidencia.groups()
+        valor = float(numero.replace(',', '.'))
+        escrito = coincidencia.group(0)[coincidencia.start(2) - coincidencia.start():]
+        if unidad in UNIDADES:
+            campo, factor = UNIDADES[unidad]
+            valor = round(valor * factor, DECIMALES[campo]) if factor != 1 else valor
+            if anterior is not None and anterior.campo == campo and anterior.unidad not in ("", unidad):
+                anterior = Cantidad(round(anterior.valor + valor, DECIMALES[campo]),
+                                    f"{anterior.texto} {escrito}", anterior.unidad, campo, True)
+                continue
+            actual = Cantidad(valor, escrito, unidad, campo, factor != 1)
+        else:
+            # Una palabra que no es unidad no forma parte del número ("7 y pesa 25")
+            actual = Cantidad(valor, numero, "", CONTEXTO.get(previa or ""), False)
+        if anterior is not None:
+            yield anterior
+        anterior = actual
+    if anterior is not None:
+        yield anterior
+
+
+def extraer_medida(texto: str, campo: str) -> Optional[Cantidad]:
+    """
+    Extrae el dato de una etapa del chat: el primer número sin unidad o con
+    una unidad del campo ("80 lb" para el peso, "4 pies" para la talla).
+
+    Args:
+        texto: Mensaje del usuario
+        campo: Campo que pregunta la etapa (edad, peso o talla)
+
+    Returns:
+        Optional[Cantidad]: Número convertido a las unidades del campo, o None si no hay
+    """
+    solo_numero = PATRON_NUMERO.fullmatch(texto)
+    if solo_numero is not None:
+        numero = solo_numero.group(1)
+        return Cantidad(float(numero.replace(',', '.')), numero, "", None, False)
+    for cantidad in cantidades(texto):
+        if not cantidad.unidad or cantidad.campo == campo:
+            return cantidad
+    return None
@@ -0,0 +1,270 @@
+import codecs
+import csv
+import json
+import math
+import tempfile
+from typing import IO, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from estadisticas import estadisticas
+from graficos import solicitar_grafico
+from grilla import categorias_de_z, meses_de, obtener_grilla, percentiles_de_z
+from lexico import normalizar_texto, sexo_de
+from tablas import TablaPercentiles
+from utils import CATEGORIAS
+
+# Filas que se clasifican juntas; acota la memoria sin importar el tamaño del lote
+TAMANO_BLOQUE = 1000
+
+# Bytes del cuerpo que se guardan en memoria antes de pasar a un archivo temporal
+MAX_CUERPO_EN_MEMORIA = 1024 * 1024
+
+FilaValida = Tuple[int, Optional[str], int, int, str, float, float, bool]
+
+
+def clasificar_lote(sexos: np.ndarray, meses: np.ndarray, pesos: np.ndarray, tallas: np.ndarray,
+                    tablas: TablaPercentiles) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calcula el IMC, el puntaje z y la categoría de muchas filas en una sola
+    pasada vectorizada. Da los mismos resultados que el chat y /imc: la
+    categoría sale del mismo puntaje z que el percentil informado.
+
+    Args:
+        sexos: Sexos ('niño' o 'niña')
+        meses: Edades en meses cumplidos
+        pesos: Pesos en kilogramos
+        tallas: Tallas en metros
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (IMC, puntaje z, índice en CATEGORIAS) por fila
+    """
+    imc = pesos / (tallas ** 2)
+    puntajes_z = obtener_grilla(tablas).puntajes_z(imc, sexos, meses)
+    return imc, puntajes_z, categorias_de_z(puntajes_z)
+
+
+def validar_fila(numero: int, fila: Dict[str, Any], tablas: TablaPercentiles) -> Tuple[Optional[FilaValida], Optional[str]]:
+    """
+    Convierte y valida una fila de entrada con los mismos criterios que el chat.
+
+    Args:
+        numero: Posición de la fila en el lote
+        fila: Valores recibidos (nombre, edad, sexo, peso, talla, grafico)
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+
+    Returns:
+        Tuple: (fila válida, None) o (None, mensaje de error). La edad se
+            devuelve en años cumplidos y en meses, para el percentil exacto
+    """
+    try:
+        edad_anios = float(str(fila["edad"]).replace(",", "."))
+        peso = float(str(fila["peso"]).replace(",", "."))
+        talla = float(str(fila["talla"]).replace(",", "."))
+        sexo = sexo_de(str(fila["sexo"]))
+    except KeyError as e:
+        return None, f"Falta el campo {e.args[0]}."
+    except (TypeError, ValueError):
+        return None, "Edad, peso y talla deben ser números."
+    # float() acepta "nan" e "inf", que pasarían los controles de rango
+    if not (math.isfinite(edad_anios) and math.isfinite(peso) and math.isfinite(talla)):
+        return None, "Edad, peso y talla deben ser números."
+    edad = int(edad_anios)
+
+    if sexo is None:
+        return None, "El sexo debe ser 'niño' o 'niña'."
+
+    if edad < 1 or edad > 18 or tablas.umbrales(sexo, edad) is None:
+        return None, "La edad debe estar entre 1 y 18 años."
+    if peso <= 0 or peso > 200:
+        return None, "Peso fuera de rango razonable (0-200 kg)."
+    # Igual que en el chat, una talla mayor a 2.5 se interpreta en centímetros
+    if 2.5 < talla <= 250:
+        talla = talla / 100
+    if talla <= 0 or talla > 2.5:
+        return None, "Talla no válida. Debe estar entre 0 y 2.5 metros."
+
+    grafico = str(fila.get("grafico", "")).strip().lower() in ("1", "true", "si", "sí")
+    nombre = fila.get("nombre")
+    return (numero, str(nombre) if nombre else None, edad, meses_de(edad_anios), sexo, peso, talla, grafico), None
+
+
+def _procesar_bloque(bloque: List[Tuple[int, Dict[str, Any]]], tablas: TablaPercentiles) -> List[str]:
+    """
+    Valida y clasifica un bloque de filas.
+
+    Args:
+        bloque: Pares (número de fila, valores recibidos)
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+
+    Returns:
+        List[str]: Una línea NDJSON por fila, en el orden recibido
+    """
+    salida: Dict[int, Dict[str, Any]] = {}
+    validas: List[FilaValida] = []
+    for numero, fila in bloque:
+        valida, error = validar_fila(numero, fila, tablas)
+        if valida is None:
+            salida[numero] = {"fila": numero, "error": error}
+        else:
+            validas.append(valida)
+
+    if validas:
+        numeros, nombres, edades, meses, sexos, pesos, tallas, graficos = zip(*validas)
+        sexos_array = np.array(sexos)
+        imcs, puntajes_z, categorias = clasificar_lote(
+            sexos_array, np.array(meses), np.array(pesos), np.array(tallas), tablas
+        )
+        estadisticas.registrar_lote(sexos, edades, categorias.tolist(), imcs.tolist())
+        percentiles = percentiles_de_z(puntajes_z)
+        for i, numero in enumerate(numeros):
+            imc = float(imcs[i])
+            resultado = {
+                "fila": numero,
+                "nombre": nombres[i],
+                "edad": edades[i],
+                "sexo": sexos[i],
+                "imc": imc,
+                "clasificacion": CATEGORIAS[categorias[i]],
+                "percentil": float(percentiles[i]),
+                "puntaje_z": float(puntajes_z[i]),
+            }
+            if graficos[i]:
+                resultado["graph_id"] = solicitar_grafico(imc, meses[i], sexos[i], int(categorias[i]), tablas)
+            salida[numero] = resultado
+
+    return [json.dumps(salida[numero], ensure_ascii=False) + "\n" for numero, _ in bloque]
+
+
+async def procesar_lote(filas: AsyncIterator[Dict[str, Any]], tablas: TablaPercentiles) -> AsyncIterator[str]:
+    """
+    Clasifica un lote de filas por bloques y produce los resultados como NDJSON
+    a medida que avanzan, sin acumular el lote completo en memoria.
+
+    Args:
+        filas: Filas de entrada (nombre, edad, sexo, peso, talla, grafico)
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+
+    Yields:
+        str: Bloques de líneas NDJSON, una por fila
+    """
+    bloque: List[Tuple[int, Dict[str, Any]]] = []
+    numero = 0
+    async for fila in filas:
+        numero += 1
+        bloque.append((numero, fila))
+        if len(bloque) >= TAMANO_BLOQUE:
+            yield "".join(_procesar_bloque(bloque, tablas))
+            bloque = []
+    if bloque:
+        yield "".join(_procesar_bloque(bloque, tablas))
+
+
+async def volcar_cuerpo(stream: AsyncIterator[bytes]) -> IO[bytes]:
+    """
+    Guarda el cuerpo de la petición a medida que llega, en memoria si es
+    pequeño y en un archivo temporal si no, para leerlo después por partes.
+
+    Args:
+        stream: Cuerpo de la petición por partes
+
+    Returns:
+        IO[bytes]: Archivo posicionado al inicio (el llamador debe cerrarlo)
+    """
+    archivo = tempfile.SpooledTemporaryFile(max_size=MAX_CUERPO_EN_MEMORIA)
+    async for parte in stream:
+        archivo.write(parte)
+    archivo.seek(0)
+    return archivo
+
+
+async def leer_por_partes(archivo: IO[bytes], tamano: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """
+    Recorre un archivo por partes y lo cierra al terminar.
+
+    Args:
+        archivo: Archivo a leer
+        tamano: Bytes por parte
+
+    Yields:
+        bytes: Partes del archivo
+    """
+    try:
+        while True:
+            parte = archivo.read(tamano)
+            if not parte:
+                break
+            yield parte
+    finally:
+        archivo.close()
+
+
+async def _lineas(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Divide un cuerpo recibido por partes en líneas de texto UTF-8."""
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+    pendiente = ""
+    async for parte in stream:
+        pendiente += decodificador.decode(parte)
+        *lineas, pendiente = pendiente.split("\n")
+        for linea in lineas:
+            yield linea.rstrip("\r")
+    pendiente += decodificador.decode(b"", final=True)
+    if pendiente.strip():
+        yield pendiente.rstrip("\r")
+
+
+async def filas_csv(stream: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Lee filas CSV (con encabezado nombre,edad,sexo,peso,talla[,grafico]) a
+    medida que llega el cuerpo de la petición.
+
+    Args:
+        stream: Cuerpo de la petición por partes
+
+    Yields:
+        Dict: Valores de cada fila por nombre de columna
+    """
+    encabezado: Optional[List[str]] = None
+    async for linea in _lineas(stream):
+        if not linea.strip():
+            continue
+        valores = next(csv.reader([linea]))
+        if encabezado is None:
+            encabezado = [normalizar_texto(columna) for columna in valores]
+            continue
+        yield dict(zip(encabezado, valores))
+
+
+async def filas_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Lee un objeto JSON por línea a medida que llega el cuerpo de la petición.
+
+    Args:
+        stream: Cuerpo de la petición por partes
+
+    Yields:
+        Dict: Valores de cada fila
+    """
+    async for linea in _lineas(stream):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            fila = {}
+        yield fila if isinstance(fila, dict) else {}
+
+
+async def filas_json(filas: List[Any]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Recorre una lista de filas JSON ya leída.
+
+    Args:
+        filas: Lista de objetos con los datos de cada menor
+
+    Yields:
+        Dict: Valores de cada fila
+    """
+    for fila in filas:
+        yield fila if isinstance(fila, dict) else {}
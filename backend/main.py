@@ -1,12 +1,37 @@
 # backend/main.py
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from chatbot import procesar_mensaje, reiniciar_estado
+from pydantic import BaseModel, Field, ValidationError
+import asyncio
+import base64
+from concurrent.futures import Future
+from chatbot import (
+    almacen, procesar_mensaje, reiniciar_estado, generar_reporte_resumen, MAX_CLAVE_IDEMPOTENCIA
+)
+from tablas import inicializar_tablas, obtener_tablas
+from graficos import (
+    solicitar_grafico, iniciar_renderizado, detener_renderizado, asegurar_png,
+    iniciar_barrido, detener_barrido, cache, ruta_datos, ruta_grafico, leer_datos, InfoPNG,
+    ColaLlena, profundidad_cola, solicitar_trayectoria, DIRECTORIO_GRAFICOS,
+    asegurar_variante, elegir_variante, ORIGINAL, diagnosticar_renderizado
+)
+from historial import historial, MAX_NINO_ID
+from estadisticas import estadisticas, iniciar_volcado, detener_volcado
+from diagnostico import DIAGNOSTICO, iniciar_trazado, informe
+from admision import limitador_mensajes, segundos_retry_after
+from svg import generar_svg
+from lote import validar_fila, procesar_lote, filas_csv, filas_ndjson, filas_json, volcar_cuerpo, leer_por_partes
 import os
-from typing import Dict, Any
+import uuid
+from utils import CATEGORIAS, calcular_imc
+from grilla import categoria_de_z, obtener_grilla, percentil_de_z
+from metricas import DESCARTES, Medidor, ServerTiming, TIPO_CONTENIDO, exponer_metricas, medir
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Any, Literal, Set
 
 app = FastAPI(
     title="API IMC Pediátrico",
@@ -19,79 +44,664 @@ app = FastAPI(
 # Ejemplo: ALLOWED_ORIGINS="https://miapp.com,https://www.miapp.com"
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 
+# Segundos que /grafico espera a un gráfico que aún se está generando
+ESPERA_GRAFICO = float(os.getenv("GRAFICO_ESPERA", "10"))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Para que el cliente web pueda leer el desglose de tiempos del servidor
+    expose_headers=["Server-Timing"],
 )
 
+# Desglose de tiempos del servidor en /mensaje y /grafico
+app.add_middleware(ServerTiming, prefijos=("/mensaje", "/grafico/"))
+
+# Valores que se leen de otros módulos al exponer /metrics (de este worker)
+Medidor("imc_sesiones_activas", "Sesiones conversacionales guardadas", lambda: len(almacen))
+Medidor("imc_graficos_aciertos_total", "Gráficos reutilizados de la caché", lambda: cache.aciertos, tipo="counter")
+Medidor("imc_graficos_fallos_total", "Gráficos que hubo que generar", lambda: cache.fallos, tipo="counter")
+Medidor("imc_graficos_expulsiones_total", "Gráficos borrados por el presupuesto de disco", lambda: cache.expulsiones, tipo="counter")
+Medidor("imc_graficos_entradas", "Gráficos indexados en graficos/", lambda: len(cache))
+Medidor("imc_graficos_bytes", "Bytes ocupados por graficos/", lambda: cache.bytes)
+Medidor("imc_graficos_en_cola", "Gráficos encolados o renderizándose", profundidad_cola)
+
+# Las tablas de percentiles se cargan al arrancar: un archivo inválido
+# detiene el servidor en lugar de fallar en la petición de un usuario
+@app.on_event("startup")
+def cargar_tablas_percentiles() -> None:
+    obtener_grilla(inicializar_tablas())
+
+# Los gráficos se renderizan en un pool de procesos fuera del event loop
+@app.on_event("startup")
+def arrancar_renderizado() -> None:
+    iniciar_renderizado()
+
+@app.on_event("shutdown")
+def parar_renderizado() -> None:
+    detener_renderizado()
+
+# Barrido periódico que mantiene graficos/ dentro de su presupuesto
+@app.on_event("startup")
+def arrancar_barrido() -> None:
+    iniciar_barrido()
+
+@app.on_event("shutdown")
+def parar_barrido() -> None:
+    detener_barrido()
+
+# Con DIAGNOSTICO=1 se trazan las asignaciones desde el arranque
+if DIAGNOSTICO:
+    iniciar_trazado()
+
+# Volcado periódico de las estadísticas de resultados, compartidas entre workers
+@app.on_event("startup")
+def arrancar_volcado() -> None:
+    iniciar_volcado()
+
+@app.on_event("shutdown")
+def parar_volcado() -> None:
+    detener_volcado()
+
 # Modelo de entrada para el chatbot
 class Mensaje(BaseModel):
     texto: str
+    session_id: str | None = None
+    # Si se indica, cada resultado se agrega a la historia de ese menor
+    nino_id: str | None = Field(None, max_length=MAX_NINO_ID)
 
 class RespuestaChat(BaseModel):
     respuesta: str
     grafico: bool
     graph_id: str | None = None
+    session_id: str | None = None
+
+MENSAJE_LIMITE = "⏳ Estás enviando mensajes muy rápido. Espera un momento e inténtalo de nuevo."
+
+def _cliente(conexion: Request | WebSocket) -> str:
+    """IP del cliente para el límite de mensajes (detrás de un proxy, usar --proxy-headers)."""
+    return conexion.client.host if conexion.client is not None else "desconocido"
 
 # Ruta para enviar mensajes
 @app.post("/mensaje", response_model=RespuestaChat)
-async def recibir_mensaje(msg: Mensaje) -> Dict[str, Any]:
+async def recibir_mensaje(
+    msg: Mensaje,
+    request: Request,
+    idempotency_key: str | None = Header(None, min_length=1, max_length=MAX_CLAVE_IDEMPOTENCIA)
+) -> Dict[str, Any]:
     """
     Procesa un mensaje del usuario y retorna la respuesta del chatbot.
     
     Args:
-        msg: Mensaje del usuario
+        msg: Mensaje del usuario, con el ID de sesión obtenido en /bienvenida
+            (sin él se crea una sesión nueva) y, opcionalmente, el ID del menor para guardar el resultado en su historia
+        request: Petición HTTP, para identificar al cliente
+        idempotency_key: Cabecera Idempotency-Key; un reintento con la misma
+            clave y el mismo texto recibe la respuesta original sin avanzar la conversación
+    
+    Returns:
+        Dict con respuesta, indicador de gráfico y ID del gráfico si aplica,
+        o 429 con Retry-After si el cliente superó MENSAJES_POR_SEGUNDO
+    """
+    espera = limitador_mensajes.consumir(_cliente(request))
+    if espera > 0:
+        DESCARTES.incrementar(motivo="limite_mensajes")
+        return JSONResponse(
+            content={"error": MENSAJE_LIMITE},
+            status_code=429,
+            headers={"Retry-After": segundos_retry_after(espera)}
+        )
+    # Sin session_id se crea una sesión nueva, como en /bienvenida; el cliente
+    # debe reenviar el ID de la respuesta para continuar la conversación
+    session_id = msg.session_id or uuid.uuid4().hex
+    # Lee y guarda la sesión y la historia (SQLite): fuera del event loop
+    respuesta, mostrar_grafico, graph_id = await run_in_threadpool(
+        procesar_mensaje, msg.texto, session_id, msg.nino_id, idempotency_key
+    )
+    return {"respuesta": respuesta, "grafico": mostrar_grafico, "graph_id": graph_id, "session_id": session_id}
+
+async def _avisar_grafico(enviar: Callable[[Dict[str, Any]], Awaitable[None]], graph_id: str,
+                          imagen: bool) -> None:
+    """
+    Espera a que termine el renderizado de un gráfico y lo avisa por el WebSocket.
+    
+    Args:
+        enviar: Función que envía un evento JSON por la conexión
+        graph_id: ID del gráfico
+        imagen: Si el evento incluye el PNG en base64
+    """
+    if cache.info_png(graph_id) is None:
+        try:
+            pendiente = asegurar_png(graph_id)
+        except ColaLlena:
+            await enviar({"tipo": "grafico_error", "graph_id": graph_id, "error": "El servidor está ocupado.",
+                          "url": f"/grafico/{graph_id}"})
+            return
+        if pendiente is None:
+            await enviar({"tipo": "grafico_error", "graph_id": graph_id, "error": "Gráfico no disponible."})
+            return
+        try:
+            # shield: si se cierra la conexión no se cancela el renderizado
+            await asyncio.shield(asyncio.wrap_future(pendiente))
+        except Exception:
+            await enviar({"tipo": "grafico_error", "graph_id": graph_id, "error": "No se pudo generar el gráfico."})
+            return
+
+    evento = {"tipo": "grafico_listo", "graph_id": graph_id, "url": f"/grafico/{graph_id}"}
+    if imagen:
+        try:
+            contenido = await run_in_threadpool(_leer_archivo, ruta_grafico(graph_id))
+            evento["imagen"] = base64.b64encode(contenido).decode("ascii")
+        except FileNotFoundError:
+            # Lo borró el barrido: el cliente lo obtiene (y se regenera) con la URL
+            pass
+    await enviar(evento)
+
+# Chat por WebSocket: una conexión por conversación
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, session_id: str | None = None, imagen: bool = False,
+                         nino_id: str | None = None) -> None:
+    """
+    Mantiene una conversación por WebSocket. Cada mensaje del cliente
+    ({"texto": "..."}) recibe de inmediato la respuesta del chat
+    ({"tipo": "respuesta", ...}, con los mismos campos que /mensaje), o un
+    {"tipo": "error", "reintentar_en"} si supera el límite de mensajes. Si hay
+    gráfico, al terminar de renderizarse llega un evento
+    {"tipo": "grafico_listo", "graph_id", "url"}, o {"tipo": "grafico_error"}.
+    
+    Args:
+        websocket: Conexión con el cliente
+        session_id: Sesión a continuar; sin ella se crea una y se envía la bienvenida
+        imagen: Si los eventos grafico_listo incluyen el PNG en base64
+        nino_id: ID del menor en cuya historia se guardan los resultados
+    """
+    if nino_id is not None and len(nino_id) > MAX_NINO_ID:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    envio = asyncio.Lock()
+    avisos: Set["asyncio.Task[None]"] = set()
+
+    async def enviar(evento: Dict[str, Any]) -> None:
+        # La respuesta y los avisos de gráficos se envían desde tareas distintas
+        async with envio:
+            await websocket.send_json(evento)
+
+    if session_id is None:
+        session_id = uuid.uuid4().hex
+        await enviar({"tipo": "respuesta", **await run_in_threadpool(bienvenida, session_id)})
+
+    try:
+        while True:
+            try:
+                texto = Mensaje.model_validate_json(await websocket.receive_text()).texto
+            except ValidationError:
+                await enviar({"tipo": "error", "error": 'Se esperaba un JSON como {"texto": "..."}.'})
+                continue
+            espera = limitador_mensajes.consumir(_cliente(websocket))
+            if espera > 0:
+                DESCARTES.incrementar(motivo="limite_mensajes")
+                await enviar({"tipo": "error", "error": MENSAJE_LIMITE, "reintentar_en": round(espera, 2)})
+                continue
+            respuesta, mostrar_grafico, graph_id = await run_in_threadpool(procesar_mensaje, texto, session_id, nino_id)
+            await enviar({
+                "tipo": "respuesta",
+                "respuesta": respuesta,
+                "grafico": mostrar_grafico,
+                "graph_id": graph_id,
+                "session_id": session_id,
+            })
+            if graph_id is not None:
+                aviso = asyncio.create_task(_avisar_grafico(enviar, graph_id, imagen))
+                avisos.add(aviso)
+                aviso.add_done_callback(avisos.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for aviso in avisos:
+            aviso.cancel()
+
+# Modelo de entrada para el cálculo directo, sin conversación
+class DatosMenor(BaseModel):
+    nombre: str | None = None
+    edad: float
+    sexo: str
+    peso: float
+    talla: float
+    grafico: bool = True
+    nino_id: str | None = Field(None, max_length=MAX_NINO_ID)
+
+class RespuestaIMC(BaseModel):
+    imc: float
+    clasificacion: str
+    percentil: float
+    puntaje_z: float
+    reporte: str
+    grafico: bool
+    graph_id: str | None = None
+
+# Ruta para calcular el IMC con los datos ya estructurados
+@app.post("/imc", response_model=RespuestaIMC)
+def calcular(datos: DatosMenor):
+    """
+    Calcula y clasifica el IMC de un menor en una sola petición, sin sesión.
+    Valida los datos con los mismos criterios que el chat (talla en metros o centímetros).
+    
+    Args:
+        datos: Nombre (opcional), edad, sexo, peso, talla, si se quiere el gráfico
+            y el ID del menor (opcional) para guardar la medición en su historia
+    
+    Returns:
+        Dict con IMC, clasificación, percentil exacto, puntaje z, reporte e ID del gráfico
+        si aplica, o 422 si los datos no son válidos
+    """
+    tablas = obtener_tablas()
+    valida, error = validar_fila(1, datos.model_dump(), tablas)
+    if valida is None:
+        return JSONResponse(content={"error": error}, status_code=422)
+    _, nombre, edad, meses, sexo, peso, talla, grafico = valida
+
+    imc = calcular_imc(peso, talla)
+    puntaje_z = obtener_grilla(tablas).puntaje_z(imc, sexo, meses)
+    percentil = percentil_de_z(puntaje_z)
+    categoria = categoria_de_z(puntaje_z)
+    clasificacion = CATEGORIAS[categoria]
+    estadisticas.registrar(sexo, edad, clasificacion, imc)
+    graph_id = solicitar_grafico(imc, meses, sexo, categoria, tablas) if grafico else None
+    if datos.nino_id:
+        historial.registrar(datos.nino_id, {
+            "edad_meses": meses, "sexo": sexo, "peso": peso, "talla": talla, "imc": round(imc, 2),
+            "percentil": round(percentil, 1), "puntaje_z": round(puntaje_z, 2), "clasificacion": clasificacion,
+        })
+    return {
+        "imc": imc,
+        "clasificacion": clasificacion,
+        "percentil": percentil,
+        "puntaje_z": puntaje_z,
+        "reporte": generar_reporte_resumen(imc, edad, peso, talla, clasificacion, nombre),
+        "grafico": graph_id is not None,
+        "graph_id": graph_id,
+    }
+
+# Los gráficos nunca cambian una vez generados: el cliente puede guardarlos un año
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+
+def _no_modificado(request: Request, info: InfoPNG) -> bool:
+    """
+    Evalúa las cabeceras condicionales de la petición contra el gráfico guardado.
+    If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110).
+    
+    Args:
+        request: Petición HTTP
+        info: Metadatos del PNG del gráfico
     
     Returns:
-        Dict con respuesta, indicador de gráfico y ID del gráfico si aplica
+        bool: True si el cliente ya tiene la versión vigente (responder 304)
     """
-    respuesta, mostrar_grafico, graph_id = procesar_mensaje(msg.texto)
-    return {"respuesta": respuesta, "grafico": mostrar_grafico, "graph_id": graph_id}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etiquetas = [etiqueta.strip().removeprefix("W/") for etiqueta in if_none_match.split(",")]
+        return "*" in etiquetas or info.etag in etiquetas
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            fecha = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(info.mtime) <= fecha.timestamp()
+    return False
+
+def _leer_archivo(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def _esperar_renderizado(pendiente: Future) -> Response | None:
+    """
+    Espera hasta GRAFICO_ESPERA segundos a que termine un renderizado.
+    
+    Returns:
+        None si terminó; si no, la respuesta 202 (sigue en curso) o 500
+    """
+    try:
+        # shield: si vence la espera no se cancela el renderizado
+        with medir(None, "espera"):
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pendiente)), ESPERA_GRAFICO)
+    except asyncio.TimeoutError:
+        return JSONResponse(
+            content={"estado": "pendiente", "mensaje": "El gráfico aún se está generando."},
+            status_code=202,
+            headers={"Retry-After": "1", "Cache-Control": "no-store"}
+        )
+    except Exception:
+        return JSONResponse(content={"error": "No se pudo generar el gráfico."}, status_code=500)
+    return None
+
+def _cola_llena() -> JSONResponse:
+    return JSONResponse(
+        content={"error": "El servidor está ocupado generando otros gráficos."},
+        status_code=503,
+        headers={"Retry-After": "1", "Cache-Control": "no-store"}
+    )
 
 # Ruta para obtener un gráfico específico por su ID
-@app.get("/grafico/{graph_id}")
-async def obtener_grafico(graph_id: str):
+@app.api_route("/grafico/{graph_id}", methods=["GET", "HEAD"])
+async def obtener_grafico(
+    graph_id: str,
+    request: Request,
+    ancho: int | None = Query(None, ge=1, le=10000),
+    dpi: int | None = Query(None, ge=1, le=1000),
+    formato: Literal["png", "png8", "webp"] | None = None,
+):
     """
-    Obtiene un gráfico específico por su ID único.
+    Obtiene un gráfico específico por su ID único, con ETag y caché inmutable.
+    Responde 304 si el cliente ya tiene el gráfico (If-None-Match o
+    If-Modified-Since). Si el gráfico aún se está generando (o se renderiza
+    ahora a partir de sus datos), espera hasta GRAFICO_ESPERA segundos y, si
+    no termina, responde 202 para que el cliente lo reintente. Si hay que
+    renderizarlo y la cola está llena, responde 503 con Retry-After.
+    
+    Con ancho, dpi o formato (o si el cliente acepta WebP) se sirve una
+    variante más liviana, creada una vez a partir del PNG original y
+    guardada junto a él.
     
     Args:
-        graph_id: ID único del gráfico (UUID)
+        graph_id: ID único del gráfico
+        request: Petición HTTP, para las cabeceras condicionales y Accept
+        ancho: Ancho en píxeles (se sube a 320, 480, 640, 800 o el original)
+        dpi: Resolución sobre las 10 pulgadas de la figura, si no se indica el ancho
+        formato: png, png8 (paleta de 256 colores) o webp
     
     Returns:
-        Archivo de imagen PNG del gráfico
+        Imagen del gráfico en el formato elegido
     """
-    path = os.path.join("graficos", f"grafico_{graph_id}.png")
+    variante = elegir_variante(ancho, dpi, formato, request.headers.get("accept", ""))
+    info = cache.info_png(graph_id, variante)
+    if info is None:
+        if cache.info_png(graph_id) is None:
+            try:
+                pendiente = asegurar_png(graph_id)
+            except ColaLlena:
+                return _cola_llena()
+            if pendiente is None:
+                return JSONResponse(content={"error": "Gráfico no disponible."}, status_code=404)
+            error = await _esperar_renderizado(pendiente)
+            if error is not None:
+                return error
+        if variante != ORIGINAL and cache.info_png(graph_id) is not None:
+            try:
+                pendiente = asegurar_variante(graph_id, variante)
+            except ColaLlena:
+                return _cola_llena()
+            if pendiente is None:
+                return JSONResponse(content={"error": "No se pudo generar el gráfico."}, status_code=500)
+            error = await _esperar_renderizado(pendiente)
+            if error is not None:
+                return error
+        info = cache.info_png(graph_id, variante)
+        if info is None:
+            return JSONResponse(content={"error": "Gráfico no disponible."}, status_code=404)
+
+    cabeceras = {
+        "ETag": info.etag,
+        "Cache-Control": CACHE_INMUTABLE,
+        "Last-Modified": formatdate(info.mtime, usegmt=True),
+        # Sin formato explícito, el formato depende de Accept
+        "Vary": "Accept",
+    }
+    if _no_modificado(request, info):
+        return Response(status_code=304, headers=cabeceras)
+    if request.method == "HEAD":
+        return Response(media_type=variante.tipo, headers={**cabeceras, "Content-Length": str(info.tamano)})
+
+    try:
+        with medir(None, "lectura"):
+            contenido = await run_in_threadpool(_leer_archivo, ruta_grafico(graph_id, variante))
+    except FileNotFoundError:
+        # Lo borró el barrido de otro worker: se vuelve a generar desde sus datos
+        cache.olvidar(graph_id)
+        return await obtener_grafico(graph_id, request, ancho, dpi, formato)
+    return Response(content=contenido, media_type=variante.tipo, headers=cabeceras)
+
+# Ruta para obtener los datos de un gráfico, para dibujarlo en el cliente
+@app.get("/grafico/{graph_id}/datos")
+async def obtener_datos_grafico(graph_id: str):
+    """
+    Obtiene las curvas de percentiles, el punto del menor y la recomendación
+    de un gráfico, para que el cliente lo dibuje sin descargar el PNG.
+    
+    Args:
+        graph_id: ID único del gráfico
+    
+    Returns:
+        JSON compacto con los datos del gráfico
+    """
+    path = ruta_datos(graph_id)
     if os.path.exists(path):
-        return FileResponse(path, media_type="image/png")
+        return FileResponse(path, media_type="application/json")
     return JSONResponse(content={"error": "Gráfico no disponible."}, status_code=404)
 
+# Ruta para obtener un gráfico como SVG, generado sin matplotlib
+@app.get("/grafico/{graph_id}/svg")
+def obtener_grafico_svg(graph_id: str):
+    """
+    Obtiene un gráfico en formato SVG, dibujado a partir de sus datos.
+    
+    Args:
+        graph_id: ID único del gráfico
+    
+    Returns:
+        Imagen SVG del gráfico
+    """
+    datos = leer_datos(graph_id)
+    if datos is None:
+        return JSONResponse(content={"error": "Gráfico no disponible."}, status_code=404)
+    return Response(content=generar_svg(datos), media_type="image/svg+xml")
+
+# Ruta con la historia de mediciones de un menor
+@app.get("/historial/{nino_id}")
+def obtener_historial(nino_id: str):
+    """
+    Obtiene todas las mediciones guardadas de un menor, de la más antigua a
+    la más reciente.
+    
+    Args:
+        nino_id: ID del menor usado en /mensaje, /ws/chat o /imc
+    
+    Returns:
+        Dict con las mediciones (fecha ISO 8601 en UTC) y la URL del gráfico
+        de su trayectoria, o 404 si no tiene mediciones
+    """
+    mediciones = historial.mediciones(nino_id)
+    if not mediciones:
+        return JSONResponse(content={"error": "No hay mediciones de este menor."}, status_code=404)
+    for medicion in mediciones:
+        medicion["fecha"] = datetime.fromtimestamp(medicion["fecha"], timezone.utc).isoformat()
+    return {"nino_id": nino_id, "mediciones": mediciones, "grafico": f"/historial/{nino_id}/grafico"}
+
+# Ruta con el gráfico de la trayectoria de un menor
+@app.get("/historial/{nino_id}/grafico")
+async def obtener_grafico_historial(nino_id: str, request: Request):
+    """
+    Obtiene el gráfico con todas las mediciones de un menor sobre las curvas
+    de percentiles. Se renderiza al pedirlo y se guarda hasta la siguiente
+    medición, que solo dibuja el tramo nuevo sobre la imagen anterior. Como
+    cambia con cada medición, el cliente debe revalidarlo con su ETag. Igual
+    que /grafico, responde 202 si no termina en GRAFICO_ESPERA segundos y 503
+    si la cola de renderizado está llena.
+    
+    Args:
+        nino_id: ID del menor
+        request: Petición HTTP, para If-None-Match
+    
+    Returns:
+        Imagen PNG de la trayectoria, o 404 si el menor no tiene mediciones
+    """
+    mediciones = await run_in_threadpool(historial.mediciones, nino_id)
+    if not mediciones:
+        return JSONResponse(content={"error": "No hay mediciones de este menor."}, status_code=404)
+    try:
+        nombre, pendiente = solicitar_trayectoria(nino_id, mediciones, obtener_tablas())
+    except ColaLlena:
+        return _cola_llena()
+    except RuntimeError:
+        return JSONResponse(content={"error": "No se pudo generar el gráfico."}, status_code=500)
+    if pendiente is not None:
+        error = await _esperar_renderizado(pendiente)
+        if error is not None:
+            return error
+
+    # El nombre (trayectoria_<clave del menor>_<mediciones>.png) identifica la imagen
+    etag = '"' + nombre[len("trayectoria_"):-len(".png")].replace("_", "-") + '"'
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [etiqueta.strip().removeprefix("W/") for etiqueta in if_none_match.split(",")]:
+        return Response(status_code=304, headers=cabeceras)
+    try:
+        contenido = await run_in_threadpool(_leer_archivo, os.path.join(DIRECTORIO_GRAFICOS, nombre))
+    except FileNotFoundError:
+        # Lo borró el barrido: se vuelve a dibujar
+        return await obtener_grafico_historial(nino_id, request)
+    return Response(content=contenido, media_type="image/png", headers=cabeceras)
+
+# Ruta con la distribución de los resultados
+@app.get("/estadisticas")
+def obtener_estadisticas() -> Dict[str, Any]:
+    """
+    Distribución de todos los resultados calculados (chat, /imc y /imc/lote):
+    cuenta por categoría, por sexo y edad, e histograma de IMC por sexo.
+    Responde desde contadores en memoria, sin recorrer resultados; los de
+    otros workers se incluyen tras su siguiente volcado (ESTADISTICAS_VOLCADO).
+    
+    Returns:
+        Dict con total, categorias, por_sexo_y_edad e histograma_imc
+    """
+    return estadisticas.resumen()
+
+# Ruta de diagnóstico de memoria, solo con DIAGNOSTICO=1
+if DIAGNOSTICO:
+    @app.get("/diagnostico/memoria")
+    async def diagnostico_memoria(top: int = Query(10, ge=1, le=100), renderizado: bool = True) -> Dict[str, Any]:
+        """
+        Estado de memoria del worker que responde y de sus procesos de
+        renderizado: RSS, figuras de matplotlib vivas, artistas en los fondos
+        y las líneas que más memoria ganaron desde la consulta anterior
+        (tracemalloc). Comparar dos consultas separadas por horas muestra
+        dónde crece un proceso.
+        
+        Args:
+            top: Cuántas líneas de código incluir por proceso
+            renderizado: Si se consulta también a los procesos de renderizado
+        
+        Returns:
+            Dict con el informe del servidor y uno por proceso de renderizado
+        """
+        servidor = await run_in_threadpool(informe, top)
+        procesos = await run_in_threadpool(diagnosticar_renderizado, top) if renderizado else []
+        return {"servidor": servidor, "renderizado": procesos}
+
+# Ruta con los contadores de la caché de gráficos
+@app.get("/graficos/estadisticas")
+def estadisticas_graficos() -> Dict[str, int]:
+    """
+    Retorna los contadores de la caché de gráficos de este worker.
+    
+    Returns:
+        Dict con aciertos, fallos, expulsiones, entradas y bytes indexados,
+        y gráficos en cola de renderizado
+    """
+    return {**cache.estadisticas(), "en_cola": profundidad_cola()}
+
+# Métricas del worker en el formato de texto de Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+def obtener_metricas() -> PlainTextResponse:
+    """
+    Expone las métricas de este worker para Prometheus: latencia por etapa
+    de la conversación, tiempos de búsqueda de percentiles, clasificación y
+    renderizado, intentos fallidos, caché de gráficos y sesiones activas.
+    
+    Returns:
+        Texto en el formato de exposición de Prometheus
+    """
+    return PlainTextResponse(exponer_metricas(), media_type=TIPO_CONTENIDO)
+
+# Ruta para calcular el IMC de muchos menores en una sola petición
+@app.post("/imc/lote")
+async def imc_lote(request: Request):
+    """
+    Calcula y clasifica el IMC de un lote de menores (por ejemplo, un tamizaje
+    escolar). Acepta CSV (text/csv, con encabezado nombre,edad,sexo,peso,talla
+    y una columna opcional grafico), NDJSON (application/x-ndjson) o JSON
+    (application/json, una lista o {"filas": [...]}). CSV y NDJSON se vuelcan a
+    un archivo temporal y se procesan por bloques, así que la memoria no crece
+    con el tamaño del lote.
+    
+    Args:
+        request: Petición HTTP con las filas en el cuerpo
+    
+    Returns:
+        NDJSON con una línea por fila: IMC y clasificación, o el error de validación
+    """
+    tipo = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    # El cuerpo se lee antes de responder: StreamingResponse escucha desconexiones
+    # en el mismo canal y se comería las partes que aún no se han leído
+    if tipo in ("text/csv", "application/csv"):
+        filas = filas_csv(leer_por_partes(await volcar_cuerpo(request.stream())))
+    elif tipo in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        filas = filas_ndjson(leer_por_partes(await volcar_cuerpo(request.stream())))
+    elif tipo == "application/json":
+        try:
+            cuerpo = await request.json()
+        except ValueError:
+            return JSONResponse(content={"error": "JSON inválido."}, status_code=400)
+        lista = cuerpo.get("filas") if isinstance(cuerpo, dict) else cuerpo
+        if not isinstance(lista, list):
+            return JSONResponse(content={"error": "Se esperaba una lista de filas."}, status_code=400)
+        filas = filas_json(lista)
+    else:
+        return JSONResponse(
+            content={"error": "Formato no soportado. Usa text/csv, application/x-ndjson o application/json."},
+            status_code=415
+        )
+    return StreamingResponse(procesar_lote(filas, obtener_tablas()), media_type="application/x-ndjson")
+
 # Ruta para reiniciar el estado conversacional
 @app.get("/reiniciar")
-def reiniciar() -> Dict[str, str]:
+def reiniciar(session_id: str | None = None) -> Dict[str, str]:
     """
     Reinicia el estado conversacional del chatbot.
     
+    Args:
+        session_id: ID de la sesión a reiniciar; sin él no hay estado que reiniciar
+    
     Returns:
         Dict con mensaje de confirmación
     """
-    reiniciar_estado()
+    if session_id:
+        reiniciar_estado(session_id)
     return {"mensaje": "Estado reiniciado correctamente."}
 
 # Ruta de bienvenida inicial
 @app.get("/bienvenida")
-def bienvenida() -> Dict[str, Any]:
+def bienvenida(session_id: str | None = None) -> Dict[str, Any]:
     """
     Retorna el mensaje de bienvenida y reinicia el estado.
+    Si no se indica una sesión, se crea una nueva.
+    
+    Args:
+        session_id: ID de una sesión existente a reiniciar
     
     Returns:
-        Dict con mensaje de bienvenida y estado inicial
+        Dict con mensaje de bienvenida, estado inicial e ID de sesión
     """
-    reiniciar_estado()
+    session_id = session_id or uuid.uuid4().hex
+    reiniciar_estado(session_id)
     return {
         "respuesta": "👋 ¡Hola! Soy tu asistente de IMC para niñas y niños.\n\nVamos a empezar. ¿Cómo se llama el menor?",
         "grafico": False,
-        "graph_id": None
+        "graph_id": None,
+        "session_id": session_id
     }
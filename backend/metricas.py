@@ -0,0 +1,237 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Límites (en segundos) de los histogramas de latencia: de 0.1 ms a 10 s
+LIMITES_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4"
+
+Etiquetas = Tuple[str, ...]
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formato_etiquetas(nombres: Tuple[str, ...], valores: Etiquetas, extra: str = "") -> str:
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formato_numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class Metrica:
+    """
+    Base de las métricas del registro, expuestas en el formato de texto de Prometheus.
+    """
+
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()) -> None:
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._lock = threading.Lock()
+        registro.append(self)
+
+    def _clave(self, etiquetas: Dict[str, str]) -> Etiquetas:
+        return tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+
+    def muestras(self) -> List[str]:
+        raise NotImplementedError
+
+    def exponer(self) -> str:
+        return "\n".join([f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+                         + self.muestras())
+
+
+class Contador(Metrica):
+    """Contador que solo crece, opcionalmente por etiquetas."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()) -> None:
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Etiquetas, float] = {}
+
+    def incrementar(self, cantidad: float = 1, **etiquetas: str) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def valor(self, **etiquetas: str) -> float:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            return self._valores.get(clave, 0)
+
+    def muestras(self) -> List[str]:
+        with self._lock:
+            valores = list(self._valores.items())
+        return [f"{self.nombre}{_formato_etiquetas(self.etiquetas, clave)} {_formato_numero(valor)}"
+                for clave, valor in valores]
+
+
+class Histograma(Metrica):
+    """Histograma de valores (latencias en segundos) con límites fijos, por etiquetas."""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = (),
+                 limites: Tuple[float, ...] = LIMITES_LATENCIA) -> None:
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = limites
+        # etiquetas -> (conteo por cubeta, incluida +Inf al final; suma)
+        self._series: Dict[Etiquetas, Tuple[List[int], List[float]]] = {}
+
+    def observar(self, valor: float, **etiquetas: str) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = ([0] * (len(self.limites) + 1), [0.0])
+            serie[0][bisect_left(self.limites, valor)] += 1
+            serie[1][0] += valor
+
+    def muestras(self) -> List[str]:
+        with self._lock:
+            series = [(clave, list(cubetas), suma[0]) for clave, (cubetas, suma) in self._series.items()]
+        lineas = []
+        for clave, cubetas, suma in series:
+            acumulado = 0
+            for limite, cantidad in zip(self.limites + (float("inf"),), cubetas):
+                acumulado += cantidad
+                le = "+Inf" if limite == float("inf") else _formato_numero(limite)
+                etiquetas = _formato_etiquetas(self.etiquetas, clave, f'le="{le}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_formato_etiquetas(self.etiquetas, clave)} {_formato_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_formato_etiquetas(self.etiquetas, clave)} {acumulado}")
+        return lineas
+
+
+class Medidor(Metrica):
+    """
+    Valor que se lee al exponer las métricas (sesiones activas, bytes en disco...).
+    Con tipo 'counter' sirve para publicar contadores que ya lleva otro módulo.
+    """
+
+    def __init__(self, nombre: str, ayuda: str, funcion: Callable[[], float], tipo: str = "gauge") -> None:
+        super().__init__(nombre, ayuda)
+        self.funcion = funcion
+        self.tipo = tipo
+
+    def muestras(self) -> List[str]:
+        return [f"{self.nombre} {_formato_numero(self.funcion())}"]
+
+
+registro: List[Metrica] = []
+
+LATENCIA_ETAPA = Histograma(
+    "imc_mensaje_segundos", "Tiempo de procesar un mensaje del chat, por etapa de la conversación", ("etapa",)
+)
+TIEMPO_PERCENTILES = Histograma(
+    "imc_busqueda_percentiles_segundos", "Tiempo de buscar los umbrales y el puntaje z del menor"
+)
+TIEMPO_CLASIFICACION = Histograma(
+    "imc_clasificacion_segundos", "Tiempo de clasificar el IMC por percentiles"
+)
+TIEMPO_SOLICITUD_GRAFICO = Histograma(
+    "imc_solicitud_grafico_segundos", "Tiempo de resolver el gráfico en la petición (caché y encolado)"
+)
+TIEMPO_RENDERIZADO = Histograma(
+    "imc_renderizado_grafico_segundos", "Tiempo desde que se encola un gráfico hasta que el PNG está en disco"
+)
+TIEMPO_SESION = Histograma(
+    "imc_sesion_segundos", "Tiempo de leer o guardar el estado de una sesión", ("operacion",)
+)
+DESCARTES = Contador(
+    "imc_descartes_total", "Peticiones rechazadas o degradadas por el control de admisión, por motivo", ("motivo",)
+)
+IDEMPOTENCIA = Contador(
+    "imc_idempotencia_total",
+    "Mensajes con Idempotency-Key: reintentos respondidos desde la sesión (acierto) o procesados (fallo)",
+    ("resultado",)
+)
+ERRORES_RENDERIZADO = Contador(
+    "imc_renderizado_errores_total", "Renderizados que fallaron en el pool, por tipo de imagen", ("tipo",)
+)
+INTENTOS_FALLIDOS = Contador(
+    "imc_intentos_fallidos_total", "Mensajes rechazados por validación, por etapa de la conversación", ("etapa",)
+)
+
+
+def exponer_metricas() -> str:
+    """
+    Genera el texto de todas las métricas registradas en el formato de Prometheus.
+
+    Returns:
+        str: Cuerpo para la respuesta de /metrics
+    """
+    return "\n".join(metrica.exponer() for metrica in registro) + "\n"
+
+
+# Tiempos de la petición en curso para la cabecera Server-Timing: (nombre, segundos)
+_tiempos: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("tiempos_servidor", default=None)
+
+
+@contextmanager
+def medir(histograma: Optional[Histograma], servidor: Optional[str] = None, **etiquetas: str) -> Iterator[None]:
+    """
+    Mide la duración de un bloque en un histograma y, si se indica un nombre,
+    la añade a la cabecera Server-Timing de la petición en curso.
+
+    Args:
+        histograma: Histograma donde se registra la duración (None: solo Server-Timing)
+        servidor: Nombre de la entrada en Server-Timing
+        etiquetas: Valores de las etiquetas del histograma
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        if histograma is not None:
+            histograma.observar(duracion, **etiquetas)
+        tiempos = _tiempos.get()
+        if servidor is not None and tiempos is not None:
+            tiempos.append((servidor, duracion))
+
+
+class ServerTiming:
+    """
+    Middleware ASGI que añade la cabecera Server-Timing a las rutas indicadas:
+    el tiempo total hasta empezar la respuesta y las partes medidas con medir().
+    """
+
+    def __init__(self, app, prefijos: Tuple[str, ...]) -> None:
+        self.app = app
+        self.prefijos = prefijos
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefijos):
+            await self.app(scope, receive, send)
+            return
+
+        tiempos: List[Tuple[str, float]] = []
+        token = _tiempos.set(tiempos)
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje) -> None:
+            if mensaje["type"] == "http.response.start":
+                entradas = [("total", time.perf_counter() - inicio)] + tiempos
+                valor = ", ".join(f"{nombre};dur={segundos * 1000:.2f}" for nombre, segundos in entradas)
+                mensaje = {**mensaje, "headers": list(mensaje.get("headers", [])) + [(b"server-timing", valor.encode())]}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _tiempos.reset(token)
@@ -0,0 +1,216 @@
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+def estado_inicial() -> Dict[str, Optional[Any]]:
+    """
+    Crea un estado conversacional vacío.
+
+    Returns:
+        Dict: Estado con todos los datos del menor sin completar
+    """
+    return {
+        "nombre": None,
+        "edad": None,
+        "edad_meses": None,
+        "sexo": None,
+        "peso": None,
+        "peso_pendiente": None,
+        "talla": None,
+        "graph_id": None,
+        "intentos_fallidos": 0
+    }
+
+
+class AlmacenSesiones:
+    """
+    Interfaz común de los almacenes de estado conversacional por sesión.
+    """
+
+    def obtener(self, session_id: str) -> Dict[str, Optional[Any]]:
+        """
+        Obtiene el estado de una sesión, o un estado inicial si no existe o expiró.
+
+        Args:
+            session_id: Identificador de la sesión
+
+        Returns:
+            Dict: Estado conversacional de la sesión
+        """
+        raise NotImplementedError
+
+    def guardar(self, session_id: str, estado: Dict[str, Optional[Any]]) -> None:
+        """
+        Guarda el estado de una sesión y renueva su tiempo de expiración.
+
+        Args:
+            session_id: Identificador de la sesión
+            estado: Estado conversacional a guardar
+        """
+        raise NotImplementedError
+
+    def eliminar(self, session_id: str) -> None:
+        """
+        Elimina una sesión del almacén.
+
+        Args:
+            session_id: Identificador de la sesión
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class AlmacenMemoria(AlmacenSesiones):
+    """
+    Almacén en memoria del proceso con expulsión LRU y expiración por TTL.
+
+    Las sesiones se mantienen ordenadas por último acceso, así que las más
+    antiguas (y por tanto las primeras en expirar) están siempre al inicio.
+    """
+
+    def __init__(self, max_sesiones: int = 10000, ttl: float = 3600) -> None:
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self._sesiones: "OrderedDict[str, Tuple[float, Dict[str, Optional[Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purgar_expiradas(self, ahora: float) -> None:
+        while self._sesiones:
+            session_id, (expira, _) = next(iter(self._sesiones.items()))
+            if expira > ahora:
+                break
+            del self._sesiones[session_id]
+
+    def obtener(self, session_id: str) -> Dict[str, Optional[Any]]:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._sesiones.get(session_id)
+            if entrada is None or entrada[0] <= ahora:
+                self._sesiones.pop(session_id, None)
+                return estado_inicial()
+            return dict(entrada[1])
+
+    def guardar(self, session_id: str, estado: Dict[str, Optional[Any]]) -> None:
+        ahora = time.monotonic()
+        with self._lock:
+            self._sesiones[session_id] = (ahora + self.ttl, dict(estado))
+            self._sesiones.move_to_end(session_id)
+            self._purgar_expiradas(ahora)
+            while len(self._sesiones) > self.max_sesiones:
+                self._sesiones.popitem(last=False)
+
+    def eliminar(self, session_id: str) -> None:
+        with self._lock:
+            self._sesiones.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purgar_expiradas(time.monotonic())
+            return len(self._sesiones)
+
+
+class AlmacenSQLite(AlmacenSesiones):
+    """
+    Almacén compartido en SQLite (modo WAL) para varios workers de uvicorn.
+
+    Todos los procesos que apunten al mismo archivo ven las mismas sesiones,
+    así que una conversación puede continuar en cualquier worker.
+    """
+
+    # Cada cuántas escrituras se purgan sesiones expiradas o sobrantes
+    INTERVALO_PURGA = 100
+
+    def __init__(self, ruta: str, max_sesiones: int = 10000, ttl: float = 3600) -> None:
+        self.ruta = ruta
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self._local = threading.local()
+        # next() de itertools.count es atómico: los guardados llegan desde varios hilos
+        self._escrituras = itertools.count(1)
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conexion = self._conexion()
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS sesiones ("
+            "session_id TEXT PRIMARY KEY, estado TEXT NOT NULL, actualizado REAL NOT NULL)"
+        )
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_sesiones_actualizado ON sesiones (actualizado)")
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def _purgar(self, ahora: float) -> None:
+        conexion = self._conexion()
+        conexion.execute("DELETE FROM sesiones WHERE actualizado <= ?", (ahora - self.ttl,))
+        conexion.execute(
+            "DELETE FROM sesiones WHERE session_id IN ("
+            "SELECT session_id FROM sesiones ORDER BY actualizado DESC LIMIT -1 OFFSET ?)",
+            (self.max_sesiones,)
+        )
+
+    def obtener(self, session_id: str) -> Dict[str, Optional[Any]]:
+        fila = self._conexion().execute(
+            "SELECT estado FROM sesiones WHERE session_id = ? AND actualizado > ?",
+            (session_id, time.time() - self.ttl)
+        ).fetchone()
+        if fila is None:
+            return estado_inicial()
+        return json.loads(fila[0])
+
+    def guardar(self, session_id: str, estado: Dict[str, Optional[Any]]) -> None:
+        ahora = time.time()
+        self._conexion().execute(
+            "INSERT OR REPLACE INTO sesiones (session_id, estado, actualizado) VALUES (?, ?, ?)",
+            (session_id, json.dumps(estado, ensure_ascii=False), ahora)
+        )
+        if next(self._escrituras) % self.INTERVALO_PURGA == 0:
+            self._purgar(ahora)
+
+    def eliminar(self, session_id: str) -> None:
+        self._conexion().execute("DELETE FROM sesiones WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        fila = self._conexion().execute(
+            "SELECT COUNT(*) FROM sesiones WHERE actualizado > ?", (time.time() - self.ttl,)
+        ).fetchone()
+        return int(fila[0])
+
+
+def crear_almacen() -> AlmacenSesiones:
+    """
+    Crea el almacén de sesiones configurado por variables de entorno.
+
+    Variables:
+        SESSION_BACKEND: 'memoria' (por defecto) o 'sqlite'
+        SESSION_DB: Ruta del archivo SQLite (por defecto 'data/sesiones.db')
+        SESSION_TTL: Segundos de inactividad antes de expirar una sesión
+        SESSION_MAX: Número máximo de sesiones conservadas
+
+    Returns:
+        AlmacenSesiones: Almacén listo para usarse
+    """
+    backend = os.getenv("SESSION_BACKEND", "memoria").lower()
+    ttl = float(os.getenv("SESSION_TTL", "3600"))
+    max_sesiones = int(os.getenv("SESSION_MAX", "10000"))
+
+    if backend == "sqlite":
+        ruta = os.getenv("SESSION_DB", os.path.join("data", "sesiones.db"))
+        return AlmacenSQLite(ruta, max_sesiones=max_sesiones, ttl=ttl)
+    if backend == "memoria":
+        return AlmacenMemoria(max_sesiones=max_sesiones, ttl=ttl)
+    raise ValueError(f"SESSION_BACKEND desconocido: {backend}")
@@ -0,0 +1,140 @@
+import math
+from typing import Any, Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+# Mismas dimensiones y estilo que el PNG de matplotlib (10x6 pulgadas a 100 dpi)
+ANCHO = 1000
+ALTO = 600
+MARGEN_IZQ, MARGEN_DER, MARGEN_SUP, MARGEN_INF = 70, 20, 50, 60
+
+CURVAS = (
+    ("p5", "Límite mínimo saludable", "orange"),
+    ("p85", "Inicio del sobrepeso", "orangered"),
+    ("p95", "Límite de obesidad", "crimson"),
+)
+
+# Ancho aproximado de un carácter en negrita a 13px, para ubicar la recomendación
+ANCHO_CARACTER = 7.6
+
+
+def _marcas(minimo: float, maximo: float, cantidad: int = 7) -> List[float]:
+    """
+    Calcula marcas de eje en pasos redondos (1, 2, 2.5 o 5 por potencia de 10).
+
+    Args:
+        minimo: Límite inferior del eje
+        maximo: Límite superior del eje
+        cantidad: Número aproximado de marcas deseado
+
+    Returns:
+        List[float]: Valores de las marcas dentro del rango
+    """
+    bruto = (maximo - minimo) / cantidad
+    potencia = 10 ** math.floor(math.log10(bruto))
+    paso = next(m * potencia for m in (1, 2, 2.5, 5, 10) if m * potencia >= bruto)
+    inicio = math.ceil(minimo / paso) * paso
+    marcas = []
+    valor = inicio
+    while valor <= maximo + 1e-9:
+        marcas.append(round(valor, 6))
+        valor += paso
+    return marcas
+
+
+def _formato(valor: float) -> str:
+    return f"{valor:g}"
+
+
+def generar_svg(datos: Dict[str, Any]) -> str:
+    """
+    Dibuja el gráfico de percentiles como SVG a partir de sus datos, sin matplotlib.
+
+    Args:
+        datos: Datos del gráfico (series, punto del menor y recomendación)
+
+    Returns:
+        str: Documento SVG
+    """
+    edades = datos["edades"]
+    edad, imc = datos["edad"], datos["imc"]
+    valores = datos["p5"] + datos["p95"] + [imc]
+
+    # Márgenes del 5% como el autoescalado de matplotlib
+    x_min, x_max = min(edades), max(edades)
+    y_min, y_max = min(valores), max(valores)
+    x_pad, y_pad = (x_max - x_min) * 0.05, (y_max - y_min) * 0.05
+    x_min, x_max, y_min, y_max = x_min - x_pad, x_max + x_pad, y_min - y_pad, y_max + y_pad
+
+    izq, der = MARGEN_IZQ, ANCHO - MARGEN_DER
+    sup, inf = MARGEN_SUP, ALTO - MARGEN_INF
+
+    def px(x: float) -> float:
+        return izq + (x - x_min) / (x_max - x_min) * (der - izq)
+
+    def py(y: float) -> float:
+        return inf - (y - y_min) / (y_max - y_min) * (inf - sup)
+
+    partes = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {ANCHO} {ALTO}" '
+        f'width="{ANCHO}" height="{ALTO}" font-family="DejaVu Sans, Arial, sans-serif">',
+        f'<rect width="{ANCHO}" height="{ALTO}" fill="white"/>',
+        f'<text x="{(izq + der) / 2:.1f}" y="32" font-size="20" text-anchor="middle">'
+        f'Gráfico de Percentiles de IMC (1 a 18 años)</text>',
+    ]
+
+    # Cuadrícula y marcas
+    for x in _marcas(x_min, x_max):
+        partes.append(f'<line x1="{px(x):.1f}" y1="{sup}" x2="{px(x):.1f}" y2="{inf}" '
+                      f'stroke="#b0b0b0" stroke-opacity="0.6" stroke-dasharray="4,2"/>')
+        partes.append(f'<text x="{px(x):.1f}" y="{inf + 18}" font-size="14" text-anchor="middle">{_formato(x)}</text>')
+    for y in _marcas(y_min, y_max):
+        partes.append(f'<line x1="{izq}" y1="{py(y):.1f}" x2="{der}" y2="{py(y):.1f}" '
+                      f'stroke="#b0b0b0" stroke-opacity="0.6" stroke-dasharray="4,2"/>')
+        partes.append(f'<text x="{izq - 6}" y="{py(y) + 5:.1f}" font-size="14" text-anchor="end">{_formato(y)}</text>')
+    partes.append(f'<rect x="{izq}" y="{sup}" width="{der - izq}" height="{inf - sup}" fill="none" stroke="black"/>')
+    partes.append(f'<text x="{(izq + der) / 2:.1f}" y="{ALTO - 15}" font-size="16" text-anchor="middle">Edad (años)</text>')
+    partes.append(f'<text x="20" y="{(sup + inf) / 2:.1f}" font-size="16" text-anchor="middle" '
+                  f'transform="rotate(-90 20 {(sup + inf) / 2:.1f})">IMC</text>')
+
+    # Curvas de percentiles
+    for clave, _, color in CURVAS:
+        puntos = " ".join(f"{px(e):.1f},{py(v):.1f}" for e, v in zip(edades, datos[clave]))
+        partes.append(f'<polyline points="{puntos}" fill="none" stroke="{color}" '
+                      f'stroke-width="2.5" stroke-dasharray="9,4"/>')
+
+    # Punto del menor
+    cx, cy = px(edad), py(imc)
+    partes.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="7" fill="red" stroke="black" stroke-width="2"/>')
+
+    # Recomendación junto al punto, dentro de los ejes
+    recomendacion = datos["recomendacion"]
+    caja_ancho = len(recomendacion) * ANCHO_CARACTER + 16
+    caja_alto = 26
+    caja_x = px(edad + 0.5)
+    if caja_x + caja_ancho > der:
+        caja_x = px(edad - 0.5) - caja_ancho
+    caja_y = py(imc + 0.5) - caja_alto
+    if caja_y < sup:
+        caja_y = py(imc - 0.5)
+    partes.append(f'<rect x="{caja_x:.1f}" y="{caja_y:.1f}" width="{caja_ancho:.1f}" height="{caja_alto}" '
+                  f'rx="6" fill="lightyellow" stroke="gray"/>')
+    partes.append(f'<text x="{caja_x + 8:.1f}" y="{caja_y + 18:.1f}" font-size="13" font-weight="bold">'
+                  f'{escape(recomendacion)}</text>')
+
+    # Leyenda
+    entradas: List[Tuple[str, str, bool]] = [(etiqueta, color, False) for _, etiqueta, color in CURVAS]
+    entradas.append((f"Niño/a ({imc:.1f})", "red", True))
+    ley_x, ley_y = izq + 10, sup + 10
+    partes.append(f'<rect x="{ley_x}" y="{ley_y}" width="240" height="{len(entradas) * 22 + 10}" rx="4" '
+                  f'fill="white" fill-opacity="0.8" stroke="#cccccc"/>')
+    for i, (etiqueta, color, es_punto) in enumerate(entradas):
+        y = ley_y + 20 + i * 22
+        if es_punto:
+            partes.append(f'<circle cx="{ley_x + 22}" cy="{y - 4}" r="6" fill="{color}" stroke="black" stroke-width="2"/>')
+        else:
+            partes.append(f'<line x1="{ley_x + 8}" y1="{y - 4}" x2="{ley_x + 36}" y2="{y - 4}" '
+                          f'stroke="{color}" stroke-width="2.5" stroke-dasharray="9,4"/>')
+        partes.append(f'<text x="{ley_x + 46}" y="{y}" font-size="14">{escape(etiqueta)}</text>')
+
+    partes.append("</svg>")
+    return "".join(partes)
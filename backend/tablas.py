@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RUTA_TABLAS = os.path.join("data", "tablas_percentiles.json")
+
+# Segundos mínimos entre dos comprobaciones del mtime del archivo
+INTERVALO_REVISION = 1.0
+
+Umbrales = Tuple[float, float, float]
+
+
+class TablaPercentiles:
+    """
+    Tablas de percentiles preindexadas por sexo y edad.
+
+    Los umbrales (p5, p85, p95) de cada sexo se guardan en una lista indexada
+    directamente por la edad, y las series ordenadas para graficar se calculan
+    una sola vez al cargar.
+    """
+
+    def __init__(self, datos: Dict[str, Dict[str, Dict[str, float]]], version: str) -> None:
+        self.version = version
+        self._umbrales: Dict[str, List[Optional[Umbrales]]] = {}
+        self._series: Dict[str, Tuple[List[int], List[float], List[float], List[float]]] = {}
+
+        for sexo, por_edad in datos.items():
+            edades = sorted(int(edad) for edad in por_edad)
+            indice: List[Optional[Umbrales]] = [None] * (edades[-1] + 1)
+            for edad in edades:
+                fila = por_edad[str(edad)]
+                indice[edad] = (float(fila["p5"]), float(fila["p85"]), float(fila["p95"]))
+            self._umbrales[sexo] = indice
+            self._series[sexo] = (
+                edades,
+                [indice[e][0] for e in edades],
+                [indice[e][1] for e in edades],
+                [indice[e][2] for e in edades],
+            )
+
+    @property
+    def sexos(self) -> List[str]:
+        return list(self._umbrales)
+
+    def umbrales(self, sexo: str, edad: int) -> Optional[Umbrales]:
+        """
+        Obtiene los umbrales de percentil para una edad y sexo.
+
+        Args:
+            sexo: Sexo del menor ('niño' o 'niña')
+            edad: Edad del menor en años
+
+        Returns:
+            Optional[Umbrales]: (p5, p85, p95) o None si no hay datos
+        """
+        indice = self._umbrales.get(sexo)
+        if indice is None or edad < 0 or edad >= len(indice):
+            return None
+        return indice[edad]
+
+    def serie(self, sexo: str) -> Tuple[List[int], List[float], List[float], List[float]]:
+        """
+        Obtiene las series ordenadas por edad para graficar un sexo.
+
+        Args:
+            sexo: Sexo del menor ('niño' o 'niña')
+
+        Returns:
+            Tuple: (edades, p5, p85, p95)
+        """
+        return self._series[sexo]
+
+
+def _validar(datos: object) -> None:
+    if not isinstance(datos, dict) or not datos:
+        raise ValueError("Las tablas deben ser un objeto con un bloque por sexo.")
+    for sexo, por_edad in datos.items():
+        if not isinstance(por_edad, dict) or not por_edad:
+            raise ValueError(f"No hay edades para el sexo '{sexo}'.")
+        for edad, fila in por_edad.items():
+            if not edad.isdigit():
+                raise ValueError(f"Edad no válida '{edad}' en '{sexo}'.")
+            try:
+                p5, p85, p95 = (float(fila[clave]) for clave in ("p5", "p85", "p95"))
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Percentiles incompletos para '{sexo}' de {edad} años.")
+            if not p5 < p85 < p95:
+                raise ValueError(f"Percentiles desordenados para '{sexo}' de {edad} años.")
+
+
+def cargar_tablas(ruta: str = RUTA_TABLAS) -> TablaPercentiles:
+    """
+    Lee, valida e indexa el archivo de tablas de percentiles.
+
+    Args:
+        ruta: Ruta del archivo JSON de percentiles
+
+    Returns:
+        TablaPercentiles: Tablas listas para consultar
+
+    Raises:
+        FileNotFoundError, PermissionError: Si el archivo no se puede leer
+        ValueError: Si el JSON es inválido o no tiene el formato esperado
+    """
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    datos = json.loads(contenido.decode("utf-8"))
+    _validar(datos)
+    return TablaPercentiles(datos, hashlib.sha256(contenido).hexdigest()[:16])
+
+
+_tablas: Optional[TablaPercentiles] = None
+_mtime: Optional[float] = None
+_ultima_revision = 0.0
+_lock = threading.Lock()
+
+
+def inicializar_tablas(ruta: str = RUTA_TABLAS) -> TablaPercentiles:
+    """
+    Carga las tablas al arrancar el servidor. Un archivo ausente o mal formado
+    lanza la excepción aquí, en lugar de fallar en la petición de un usuario.
+
+    Args:
+        ruta: Ruta del archivo JSON de percentiles
+
+    Returns:
+        TablaPercentiles: Tablas cargadas
+    """
+    global _tablas, _mtime, _ultima_revision
+    with _lock:
+        mtime = os.stat(ruta).st_mtime
+        _tablas = cargar_tablas(ruta)
+        _mtime = mtime
+        _ultima_revision = time.monotonic()
+        return _tablas
+
+
+def obtener_tablas(ruta: str = RUTA_TABLAS) -> TablaPercentiles:
+    """
+    Retorna las tablas vigentes, recargándolas si el archivo cambió en disco.
+
+    La recarga construye unas tablas nuevas y solo entonces reemplaza la
+    referencia, así que ninguna petición ve un estado a medias. Si el archivo
+    nuevo es inválido se conservan las tablas anteriores.
+
+    Args:
+        ruta: Ruta del archivo JSON de percentiles
+
+    Returns:
+        TablaPercentiles: Tablas vigentes
+    """
+    global _tablas, _mtime, _ultima_revision
+    if _tablas is None:
+        return inicializar_tablas(ruta)
+
+    ahora = time.monotonic()
+    if ahora - _ultima_revision < INTERVALO_REVISION:
+        return _tablas
+
+    with _lock:
+        if ahora - _ultima_revision < INTERVALO_REVISION:
+            return _tablas
+        _ultima_revision = ahora
+        try:
+            mtime = os.stat(ruta).st_mtime
+        except OSError as e:
+            logger.warning("No se pudo revisar el archivo de percentiles: %s", e)
+            return _tablas
+        if mtime != _mtime:
+            # Se registra el mtime aunque falle la carga para no reintentar
+            # (y avisar) en cada petición hasta que el archivo vuelva a cambiar
+            _mtime = mtime
+            try:
+                _tablas = cargar_tablas(ruta)
+                logger.info("Tablas de percentiles recargadas (versión %s)", _tablas.version)
+            except (OSError, ValueError) as e:
+                logger.warning("No se pudieron recargar las tablas de percentiles: %s", e)
+        return _tablas
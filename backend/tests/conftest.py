@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Los módulos del backend se importan por nombre y leen data/ relativo al directorio actual
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.chdir(BACKEND)
+
+# Antes de importar los módulos: las pruebas no escriben en las bases de datos reales
+_datos = tempfile.mkdtemp(prefix="imc-pruebas-")
+os.environ.setdefault("HISTORIAL_DB", os.path.join(_datos, "historial.db"))
+os.environ.setdefault("ESTADISTICAS_DB", os.path.join(_datos, "estadisticas.db"))
+os.environ.setdefault("SESSION_BACKEND", "memoria")
+os.environ.setdefault("MENSAJES_POR_SEGUNDO", "0")
+
+
+@pytest.fixture(scope="session")
+def pool():
+    """Pool de renderizado real, de un proceso, compartido por las pruebas que dibujan."""
+    import graficos
+
+    graficos.iniciar_renderizado(workers=1)
+    yield
+    graficos.detener_renderizado()
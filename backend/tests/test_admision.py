@@ -0,0 +1,88 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import admision
+import graficos
+import main
+from admision import LimitadorTasa, segundos_retry_after
+from metricas import DESCARTES
+from tablas import obtener_tablas
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 100.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(admision.time, "monotonic", reloj)
+    return reloj
+
+
+def test_limitador_admite_la_rafaga_y_luego_repone_a_la_tasa(reloj):
+    limitador = LimitadorTasa(tasa=2, rafaga=3)
+    assert [limitador.consumir("a") for _ in range(3)] == [0, 0, 0]
+    assert limitador.consumir("a") == pytest.approx(0.5)
+    # Cada cliente tiene su propia cubeta
+    assert limitador.consumir("b") == 0
+    reloj.ahora += 0.5
+    assert limitador.consumir("a") == 0
+    assert limitador.consumir("a") > 0
+
+
+def test_limitador_con_tasa_cero_no_limita(reloj):
+    limitador = LimitadorTasa(tasa=0, rafaga=1)
+    assert all(limitador.consumir("a") == 0 for _ in range(100))
+    assert len(limitador) == 0
+
+
+def test_limitador_descarta_el_cliente_inactivo_hace_mas_tiempo(reloj):
+    limitador = LimitadorTasa(tasa=1, rafaga=1, max_clientes=2)
+    limitador.consumir("a")
+    limitador.consumir("b")
+    limitador.consumir("a")
+    limitador.consumir("c")
+    assert len(limitador) == 2
+    assert set(limitador._cubetas) == {"a", "c"}
+
+
+@pytest.mark.parametrize("espera, esperado", [(0.01, "1"), (1.0, "1"), (1.2, "2")])
+def test_retry_after_en_segundos_enteros(espera, esperado):
+    assert segundos_retry_after(espera) == esperado
+
+
+def test_mensaje_responde_429_al_superar_el_limite(monkeypatch):
+    monkeypatch.setattr(main, "limitador_mensajes", LimitadorTasa(tasa=0.1, rafaga=1))
+    cliente = TestClient(main.app)
+    descartes = DESCARTES.valor(motivo="limite_mensajes")
+    assert cliente.post("/mensaje", json={"texto": "Ana"}).status_code == 200
+    respuesta = cliente.post("/mensaje", json={"texto": "Ana"})
+    assert respuesta.status_code == 429
+    assert int(respuesta.headers["retry-after"]) >= 1
+    assert DESCARTES.valor(motivo="limite_mensajes") == descartes + 1
+
+
+def test_cola_llena_entrega_el_resultado_sin_grafico(monkeypatch):
+    monkeypatch.setattr(graficos, "GRAFICOS_COLA_MAX", 0)
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", False)
+    descartes = DESCARTES.valor(motivo="cola_graficos")
+    respuesta = TestClient(main.app).post("/imc", json={"edad": 6, "sexo": "niño", "peso": 23.7,
+                                                        "talla": 1.13, "grafico": True})
+    assert respuesta.status_code == 200
+    assert respuesta.json()["graph_id"] is None
+    assert DESCARTES.valor(motivo="cola_graficos") == descartes + 1
+
+
+def test_grafico_responde_503_si_hay_que_renderizarlo_con_la_cola_llena(monkeypatch):
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", True)
+    graph_id = graficos.solicitar_grafico(18.63, 77, "niño", 1, obtener_tablas())
+    monkeypatch.setattr(graficos, "GRAFICOS_COLA_MAX", 0)
+    respuesta = TestClient(main.app).get(f"/grafico/{graph_id}")
+    assert respuesta.status_code == 503
+    assert respuesta.headers["retry-after"] == "1"
+    assert respuesta.headers["cache-control"] == "no-store"
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+from tablas import obtener_tablas
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_servidor_no_importa_matplotlib():
+    # En un proceso nuevo: las demás pruebas sí dibujan y ya lo importaron
+    codigo = "import sys, main; print(sorted(m for m in ('matplotlib', 'PIL') if m in sys.modules))"
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=BACKEND, capture_output=True, text=True, check=True)
+    assert salida.stdout.strip() == "[]"
+
+
+def test_precalentar_deja_los_fondos_listos(tmp_path, monkeypatch):
+    import utils
+
+    tablas = obtener_tablas()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(utils, "_fondos", {})
+    utils.precalentar_renderizado(tablas)
+    assert set(utils._fondos) == set(tablas.sexos)
+    fondo = utils._fondos[tablas.sexos[0]]
+    artistas = len(fondo[2].get_children())
+    # El menor de prueba se dibuja y se retira: no queda nada en los ejes ni en disco
+    utils.precalentar_renderizado(tablas)
+    assert len(fondo[2].get_children()) == artistas
+    assert not os.path.exists("graficos")
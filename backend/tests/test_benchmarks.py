@@ -0,0 +1,51 @@
+import json
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import graficos
+import main
+from benchmarks import lineas_base
+from benchmarks.carga import _percentil, _turnos
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(lineas_base, "DIRECTORIO", str(tmp_path))
+    return tmp_path
+
+
+def test_guardar_y_comparar_linea_base(directorio):
+    assert lineas_base.finalizar("micro", {"a": 1.0, "b": 2.0}, guardar=True, comparar=False, umbral=0.2) == 0
+    with open(directorio / "micro.json", encoding="utf-8") as f:
+        assert json.load(f)["metricas"] == {"a": 1.0, "b": 2.0}
+
+    # Dentro del umbral, o una métrica nueva que la línea base no tiene
+    assert lineas_base.finalizar("micro", {"a": 1.15, "b": 1.0, "c": 9.0}, False, True, 0.2) == 0
+    assert lineas_base.comparar_con_linea_base("micro", {"a": 1.5, "b": 2.0}, 0.2) == ["a: +50.0%"]
+    assert lineas_base.finalizar("micro", {"a": 1.5, "b": 2.0}, False, True, 0.2) == 1
+    # Por debajo del mínimo absoluto es ruido
+    assert lineas_base.finalizar("micro", {"a": 1.5, "b": 2.0}, False, True, 0.2, minimo=1.0) == 0
+
+
+def test_comparar_sin_linea_base_falla(directorio):
+    assert lineas_base.finalizar("carga", {"a": 1.0}, guardar=False, comparar=True, umbral=0.2) == 1
+
+
+def test_percentil_por_rango_mas_cercano():
+    valores = list(range(1, 101))
+    assert [_percentil(valores, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert _percentil([3.0], 99) == 3.0
+
+
+def test_conversaciones_de_la_carga_terminan(monkeypatch):
+    # Cada conversación generada debe llegar al resultado, o la carga mediría errores
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", True)
+    cliente = TestClient(main.app)
+    rng = random.Random(0)
+    for numero in range(30):
+        session_id = cliente.get("/bienvenida").json()["session_id"]
+        for texto in _turnos(rng, numero):
+            respuesta = cliente.post("/mensaje", json={"texto": texto, "session_id": session_id}).json()
+        assert respuesta["graph_id"], respuesta["respuesta"]
@@ -0,0 +1,76 @@
+import os
+import time
+
+import pytest
+
+import graficos
+from graficos import CacheGraficos
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(graficos, "DIRECTORIO_GRAFICOS", str(tmp_path))
+    return tmp_path
+
+
+def _guardar(directorio, graph_id, tamano=100, antiguedad=0.0):
+    """Escribe los datos y el PNG de un gráfico, con el mtime de hace `antiguedad` segundos."""
+    instante = time.time() - antiguedad
+    for nombre in (f"grafico_{graph_id}.json", f"grafico_{graph_id}.png"):
+        ruta = directorio / nombre
+        ruta.write_bytes(b"x" * (tamano // 2))
+        os.utime(ruta, (instante, instante))
+
+
+def _ids(directorio):
+    return {graficos._id_de_archivo(nombre) for nombre in os.listdir(directorio)}
+
+
+def test_registrar_expulsa_el_menos_usado(directorio):
+    cache = CacheGraficos(str(directorio), max_bytes=10_000, max_entradas=2, ttl=3600)
+    for graph_id in ("a", "b"):
+        _guardar(directorio, graph_id)
+        cache.registrar(graph_id, 100)
+    assert cache.buscar("a")
+    _guardar(directorio, "c")
+    cache.registrar("c", 100)
+
+    assert _ids(directorio) == {"a", "c"}
+    assert not cache.buscar("b")
+    assert cache.estadisticas()["expulsiones"] == 1
+    assert cache.bytes == 200
+
+
+def test_registrar_respeta_el_limite_de_bytes(directorio):
+    cache = CacheGraficos(str(directorio), max_bytes=250, max_entradas=100, ttl=3600)
+    for graph_id in ("a", "b", "c"):
+        _guardar(directorio, graph_id)
+        cache.registrar(graph_id, 100)
+    assert _ids(directorio) == {"b", "c"}
+    assert cache.bytes == 200
+
+
+def test_buscar_encuentra_graficos_de_otro_worker(directorio):
+    cache = CacheGraficos(str(directorio), max_bytes=10_000, max_entradas=10, ttl=3600)
+    _guardar(directorio, "a")
+    assert cache.buscar("a")
+    assert len(cache) == 1
+
+
+def test_barrido_borra_expirados_y_sobrantes(directorio):
+    cache = CacheGraficos(str(directorio), max_bytes=10_000, max_entradas=2, ttl=3600)
+    _guardar(directorio, "expirado", antiguedad=7200)
+    _guardar(directorio, "viejo", antiguedad=300)
+    _guardar(directorio, "medio", antiguedad=200)
+    _guardar(directorio, "nuevo", antiguedad=100)
+    (directorio / ".grafico_x.png.1.tmp").write_bytes(b"x")
+    huerfano = directorio / ".grafico_y.png.1.tmp"
+    huerfano.write_bytes(b"x")
+    os.utime(huerfano, (time.time() - 7200,) * 2)
+
+    cache.barrer()
+
+    # El temporal reciente puede ser de un renderizado en curso: se conserva
+    assert sorted(os.listdir(directorio)) == [".grafico_x.png.1.tmp", "grafico_medio.json", "grafico_medio.png",
+                                              "grafico_nuevo.json", "grafico_nuevo.png"]
+    assert cache.estadisticas()["expulsiones"] == 2
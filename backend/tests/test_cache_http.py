@@ -0,0 +1,54 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def grafico(pool):
+    cliente = TestClient(main.app)
+    graph_id = cliente.post("/imc", json={"edad": "9", "sexo": "niño", "peso": "30", "talla": "1.33",
+                                          "grafico": True}).json()["graph_id"]
+    respuesta = cliente.get(f"/grafico/{graph_id}", headers={"Accept": "image/png"})
+    assert respuesta.status_code == 200
+    return cliente, graph_id, respuesta
+
+
+def test_grafico_con_etag_e_inmutable(grafico):
+    _, _, respuesta = grafico
+    assert respuesta.headers["content-type"] == "image/png"
+    assert respuesta.headers["cache-control"] == main.CACHE_INMUTABLE
+    assert respuesta.headers["etag"].startswith('"')
+    assert "last-modified" in respuesta.headers
+
+
+@pytest.mark.parametrize("condicion", [
+    lambda r: {"If-None-Match": r.headers["etag"]},
+    lambda r: {"If-None-Match": f'"otro", W/{r.headers["etag"]}'},
+    lambda r: {"If-None-Match": "*"},
+    lambda r: {"If-Modified-Since": r.headers["last-modified"]},
+])
+def test_grafico_no_modificado_responde_304(grafico, condicion):
+    cliente, graph_id, respuesta = grafico
+    condicional = cliente.get(f"/grafico/{graph_id}", headers={"Accept": "image/png", **condicion(respuesta)})
+    assert condicional.status_code == 304
+    assert condicional.content == b""
+    assert condicional.headers["etag"] == respuesta.headers["etag"]
+
+
+def test_etag_distinto_tiene_prioridad_sobre_la_fecha(grafico):
+    cliente, graph_id, respuesta = grafico
+    condicional = cliente.get(f"/grafico/{graph_id}", headers={
+        "Accept": "image/png", "If-None-Match": '"otro"', "If-Modified-Since": respuesta.headers["last-modified"]
+    })
+    assert condicional.status_code == 200
+    assert condicional.content == respuesta.content
+
+
+def test_head_sin_cuerpo(grafico):
+    cliente, graph_id, respuesta = grafico
+    cabeza = cliente.head(f"/grafico/{graph_id}", headers={"Accept": "image/png"})
+    assert cabeza.status_code == 200
+    assert cabeza.content == b""
+    assert cabeza.headers["content-length"] == str(len(respuesta.content))
+    assert cabeza.headers["etag"] == respuesta.headers["etag"]
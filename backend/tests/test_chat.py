@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import graficos
+import main
+from chatbot import extraer_campos
+
+
+@pytest.fixture
+def conversar(monkeypatch):
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", True)
+    cliente = TestClient(main.app)
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+
+    def conversar(texto):
+        return cliente.post("/mensaje", json={"texto": texto, "session_id": session_id}).json()
+    return conversar
+
+
+def test_todos_los_datos_en_un_mensaje(conversar):
+    respuesta = conversar("Ana, 7 años, niña, 25 kg, 1.20 m")
+    assert "El IMC es: 17.36" in respuesta["respuesta"]
+    assert respuesta["grafico"] and respuesta["graph_id"]
+
+
+def test_datos_repartidos_en_dos_mensajes(conversar):
+    respuesta = conversar("Luis, 9 años y 6 meses, niño")
+    assert respuesta["respuesta"].endswith("¿Cuánto pesa? (en kg, ejemplo: 15.5)")
+    respuesta = conversar("pesa 30 y mide 133 cm")
+    assert "El IMC es: 16.96" in respuesta["respuesta"]
+    assert "(9 años y 6 meses)" in respuesta["respuesta"]
+
+
+def test_un_dato_por_mensaje(conversar):
+    for texto in ("Ana", "7", "niña", "25"):
+        assert not conversar(texto)["grafico"]
+    assert "El IMC es: 17.36" in conversar("1.20")["respuesta"]
+
+
+@pytest.mark.parametrize("texto, faltantes, esperado", [
+    ("Ana, 7 años, niña, 25 kg, 1.20 m", ("nombre", "edad", "sexo", "peso", "talla"),
+     {"nombre": "Ana", "edad": 7, "sexo": "niña", "peso": 25, "talla": 1.2}),
+    # Sin unidades, los números van a los campos que faltan en el orden del chat
+    ("25 y 1.20", ("peso", "talla"), {"peso": 25, "talla": 1.2}),
+    # Un decimal menor a 2.5 solo puede ser la talla en metros
+    ("1.15", ("edad", "peso", "talla"), {"talla": 1.15}),
+    ("tiene 8, pesa 27", ("nombre", "edad", "sexo", "peso", "talla"), {"edad": 8, "peso": 27}),
+])
+def test_extraer_campos(texto, faltantes, esperado):
+    assert extraer_campos(texto, faltantes) == esperado
+
+
+def test_imc_sin_sesion_acepta_talla_en_centimetros():
+    cliente = TestClient(main.app)
+    datos = cliente.post("/imc", json={"nombre": "Ana", "edad": "7", "sexo": "niña", "peso": "25", "talla": "120",
+                                       "grafico": False}).json()
+    assert datos["imc"] == pytest.approx(25 / 1.2 ** 2)
+    assert datos["graph_id"] is None
+    assert "Ana" in datos["reporte"]
@@ -0,0 +1,53 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+from fastapi.testclient import TestClient
+
+import graficos
+import main
+from graficos import datos_grafico
+from svg import generar_svg
+from tablas import obtener_tablas
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    # Solo se guardan los datos: los endpoints de datos y SVG no necesitan el PNG
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", True)
+    return TestClient(main.app)
+
+
+def test_datos_y_svg_del_grafico(cliente):
+    resultado = cliente.post("/imc", json={"edad": "7", "sexo": "niña", "peso": "25", "talla": "1.20",
+                                           "grafico": True}).json()
+    graph_id = resultado["graph_id"]
+
+    respuesta = cliente.get(f"/grafico/{graph_id}/datos")
+    assert respuesta.headers["content-type"] == "application/json"
+    datos = respuesta.json()
+    assert datos["clasificacion"] == resultado["clasificacion"]
+    assert len(datos["edades"]) == len(datos["p5"]) == len(datos["p85"]) == len(datos["p95"])
+    # Compacto frente al PNG de ~70 KB
+    assert len(respuesta.content) < 2000
+
+    respuesta = cliente.get(f"/grafico/{graph_id}/svg")
+    assert respuesta.headers["content-type"] == "image/svg+xml"
+    raiz = ET.fromstring(respuesta.text)
+    assert len(raiz.findall(f"{SVG}polyline")) == 3
+    assert datos["recomendacion"] in respuesta.text
+
+
+def test_svg_ubica_el_punto_en_la_edad_con_meses():
+    datos = datos_grafico(15.31, 90, "niño", 0, obtener_tablas())
+    raiz = ET.fromstring(generar_svg(datos))
+    curva = raiz.find(f"{SVG}polyline").get("points").split()
+    x = {edad: float(punto.split(",")[0]) for edad, punto in zip(datos["edades"], curva)}
+    punto = raiz.find(f"{SVG}circle[@r='7']")
+    assert float(punto.get("cx")) == pytest.approx((x[7] + x[8]) / 2, abs=0.1)
+
+
+@pytest.mark.parametrize("ruta", ["datos", "svg"])
+def test_grafico_inexistente_responde_404(cliente, ruta):
+    assert cliente.get(f"/grafico/{'0' * 32}/{ruta}").status_code == 404
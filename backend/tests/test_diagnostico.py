@@ -0,0 +1,88 @@
+import os
+import tracemalloc
+
+import matplotlib
+import pytest
+from fastapi.testclient import TestClient
+
+import diagnostico
+import graficos
+import main
+from benchmarks.soak import _pendiente, _resumir
+
+
+@pytest.fixture
+def trazado(monkeypatch):
+    monkeypatch.setattr(diagnostico, "_anterior", None)
+    ya_trazaba = tracemalloc.is_tracing()
+    diagnostico.iniciar_trazado()
+    yield
+    if not ya_trazaba:
+        tracemalloc.stop()
+
+
+def test_diagnostico_solo_con_la_opcion_activa():
+    assert not diagnostico.DIAGNOSTICO
+    assert TestClient(main.app).get("/diagnostico/memoria").status_code == 404
+
+
+def test_informe_sin_trazado():
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc activo en este proceso")
+    resultado = diagnostico.informe()
+    assert resultado["pid"] == os.getpid()
+    assert resultado["rss_mb"] > 0
+    assert resultado["trazado"] is False
+    assert "asignaciones" not in resultado
+
+
+def test_informe_compara_con_la_instantanea_anterior(trazado):
+    primero = diagnostico.informe(top=3)
+    assert primero["trazado"] and not primero["desde_anterior"]
+    assert len(primero["asignaciones"]) <= 3
+    assert all("kb_diferencia" not in a for a in primero["asignaciones"])
+
+    retenido = [bytearray(1024) for _ in range(1000)]
+    segundo = diagnostico.informe(top=3)
+    assert segundo["desde_anterior"]
+    assert all("kb_diferencia" in a for a in segundo["asignaciones"])
+    assert any(__file__ in a["lugar"] and a["kb_diferencia"] >= 1000 for a in segundo["asignaciones"])
+    del retenido
+
+
+def test_figuras_vivas_cuenta_las_que_no_se_cerraron():
+    # El servidor no usa pyplot: se importa solo para dejar una figura sin cerrar
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+
+    antes = diagnostico.figuras_vivas()
+    figura = plt.figure()
+    try:
+        despues = diagnostico.figuras_vivas()
+        assert despues["pyplot"] == antes["pyplot"] + 1
+        assert despues["figuras"] >= antes["figuras"] + 1
+    finally:
+        plt.close(figura)
+    assert diagnostico.figuras_vivas()["pyplot"] == antes["pyplot"]
+
+
+def test_informe_de_los_procesos_de_renderizado(pool):
+    informes = graficos.diagnosticar_renderizado(top=2, espera=0)
+    assert informes and all(i["pid"] != os.getpid() for i in informes)
+    # Cada gráfico cierra su figura: en los procesos del pool no queda ninguna
+    assert all(i["pyplot"] == 0 for i in informes)
+
+
+def test_soak_estima_el_crecimiento_y_resume_las_muestras():
+    assert _pendiente([0, 1, 2], [10, 12, 14]) == pytest.approx(2)
+    assert _pendiente([1], [10]) == 0
+    assert _pendiente([1, 1], [10, 20]) == 0
+    servidor = {"rss_mb": 100.0, "figuras": 0, "pyplot": 0, "trazada_mb": 5.0}
+    procesos = [
+        {"rss_mb": 80.0, "figuras": 1, "pyplot": 1, "artistas_en_fondos": {"niño": 30, "niña": 31}, "trazada_mb": 2.0},
+        {"rss_mb": 90.0, "figuras": 0, "pyplot": 0, "artistas_en_fondos": {"niño": 30}},
+    ]
+    assert _resumir(5000, {"servidor": servidor, "renderizado": procesos}) == {
+        "conversaciones": 5000, "rss_servidor": 100.0, "rss_renderizado": 90.0,
+        "figuras": 2, "artistas": 31, "trazada": 7.0,
+    }
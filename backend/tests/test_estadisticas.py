@@ -0,0 +1,70 @@
+import math
+
+from fastapi.testclient import TestClient
+
+import main
+from estadisticas import Estadisticas
+from utils import CATEGORIAS
+
+
+def test_registrar_ignora_imc_no_finito(tmp_path):
+    estadisticas = Estadisticas(str(tmp_path / "estadisticas.db"))
+    estadisticas.registrar("niña", 7, CATEGORIAS[1], math.nan)
+    estadisticas.registrar("niña", 7, CATEGORIAS[1], 17.4)
+    assert estadisticas.resumen()["total"] == 1
+
+
+def test_registrar_lote_ignora_imc_no_finito(tmp_path):
+    estadisticas = Estadisticas(str(tmp_path / "estadisticas.db"))
+    estadisticas.registrar_lote(["niña", "niño", "niño"], [7, 8, 9], [0, 0, 0], [17.4, math.nan, math.inf])
+    estadisticas.volcar()
+    assert estadisticas.resumen()["total"] == 1
+
+
+def test_resumen_por_categoria_sexo_edad_e_histograma(tmp_path):
+    estadisticas = Estadisticas(str(tmp_path / "estadisticas.db"))
+    estadisticas.registrar("niña", 7, CATEGORIAS[1], 17.4)
+    estadisticas.registrar("niña", 7, CATEGORIAS[1], 17.2)
+    estadisticas.registrar("niño", 9, CATEGORIAS[3], 24.1)
+    resumen = estadisticas.resumen()
+    assert resumen["total"] == 3
+    assert resumen["categorias"] == {**dict.fromkeys(CATEGORIAS, 0), CATEGORIAS[1]: 2, CATEGORIAS[3]: 1}
+    assert resumen["por_sexo_y_edad"]["niña"]["7"][CATEGORIAS[1]] == 2
+    assert resumen["por_sexo_y_edad"]["niño"]["9"][CATEGORIAS[3]] == 1
+    assert resumen["histograma_imc"] == {"ancho": 0.5, "niña": {"17": 2}, "niño": {"24": 1}}
+
+
+def test_volcado_suma_los_contadores_de_varios_workers(tmp_path):
+    ruta = str(tmp_path / "estadisticas.db")
+    uno, otro = Estadisticas(ruta), Estadisticas(ruta)
+    uno.registrar("niña", 7, CATEGORIAS[1], 17.4)
+    otro.registrar("niña", 7, CATEGORIAS[1], 17.4)
+    otro.registrar("niño", 9, CATEGORIAS[0], 13.1)
+    uno.volcar()
+    otro.volcar()
+    # El primero ve lo del segundo tras su siguiente volcado, sin contar dos veces lo propio
+    assert uno.resumen()["total"] == 1
+    uno.volcar()
+    assert uno.resumen()["total"] == otro.resumen()["total"] == 3
+    assert Estadisticas(ruta).resumen()["total"] == 0
+    reiniciado = Estadisticas(ruta)
+    reiniciado.volcar()
+    assert reiniciado.resumen()["categorias"][CATEGORIAS[1]] == 2
+
+
+def test_volcado_fallido_conserva_los_incrementos(tmp_path):
+    estadisticas = Estadisticas(str(tmp_path / "no-es-directorio" / "estadisticas.db"))
+    (tmp_path / "no-es-directorio").write_text("")
+    estadisticas.registrar("niña", 7, CATEGORIAS[1], 17.4)
+    estadisticas.volcar()
+    assert estadisticas.resumen()["total"] == 1
+    assert estadisticas._pendientes
+
+
+def test_endpoint_estadisticas_cuenta_cada_calculo(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "estadisticas", Estadisticas(str(tmp_path / "estadisticas.db")))
+    cliente = TestClient(main.app)
+    cliente.post("/imc", json={"edad": 7, "sexo": "niña", "peso": 25, "talla": 1.2, "grafico": False})
+    resumen = cliente.get("/estadisticas").json()
+    assert resumen["total"] == 1
+    assert resumen["por_sexo_y_edad"]["niña"]["7"][CATEGORIAS[1]] == 1
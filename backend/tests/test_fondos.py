@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from tablas import cargar_tablas
+from utils import precalentar_fondos, renderizar_completo, renderizar_sobre_fondo
+
+
+@pytest.fixture
+def tablas(tmp_path, monkeypatch):
+    tablas = cargar_tablas()
+    # Los gráficos se guardan en graficos/ del directorio actual
+    monkeypatch.chdir(tmp_path)
+    precalentar_fondos(tablas)
+    return tablas
+
+
+def _rgb(graph_id):
+    with Image.open(f"graficos/grafico_{graph_id}.png") as imagen:
+        return np.asarray(imagen.convert("RGB"), dtype=np.int16)
+
+
+@pytest.mark.parametrize("sexo, edad, categoria", [("niña", 7.5, 1), ("niño", 17.9, 3)])
+def test_sobre_fondo_igual_al_completo(tablas, sexo, edad, categoria):
+    p5, p85, p95 = tablas.umbrales(sexo, int(edad))
+    imc = round((p5 + p85) / 2 if categoria == 1 else p95 + 0.3, 1)
+    assert renderizar_sobre_fondo(imc, edad, sexo, categoria, tablas, "fondo")
+    renderizar_completo(imc, edad, sexo, categoria, tablas, "completo")
+    diferentes = (np.abs(_rgb("fondo") - _rgb("completo")).max(axis=2) > 8).mean()
+    assert diferentes <= 0.001
+
+
+def test_fuera_de_las_curvas_no_usa_el_fondo(tablas):
+    assert not renderizar_sobre_fondo(60.0, 7, "niña", 3, tablas, "fondo")
@@ -0,0 +1,52 @@
+import logging
+from concurrent.futures import Future
+
+import graficos
+from metricas import ERRORES_RENDERIZADO
+from tablas import obtener_tablas
+
+
+def _futuro_fallido(error):
+    futuro = Future()
+    futuro.set_exception(error)
+    return futuro
+
+
+def test_fallo_del_renderizado_se_registra(caplog):
+    antes = ERRORES_RENDERIZADO.valor(tipo="grafico")
+    graficos._pendientes["roto"] = None
+    with caplog.at_level(logging.ERROR, logger="graficos"):
+        graficos._renderizado_terminado("roto", 0.0, _futuro_fallido(RuntimeError("sin memoria")))
+    assert "roto" not in graficos._pendientes
+    assert ERRORES_RENDERIZADO.valor(tipo="grafico") == antes + 1
+    assert "roto" in caplog.text and "sin memoria" in caplog.text
+
+
+def test_renderizado_cancelado_no_cuenta_como_error():
+    antes = ERRORES_RENDERIZADO.valor(tipo="variante")
+    futuro = Future()
+    futuro.cancel()
+    graficos._variante_terminada("roto", graficos.VARIANTE_MOVIL, "roto_640.webp", futuro)
+    assert ERRORES_RENDERIZADO.valor(tipo="variante") == antes
+
+
+def test_grafico_se_dibuja_en_meses_con_la_categoria_informada(monkeypatch, tmp_path):
+    monkeypatch.setattr(graficos, "DIRECTORIO_GRAFICOS", str(tmp_path))
+    encolados = []
+    monkeypatch.setattr(graficos, "_enviar", lambda clave, al_terminar, funcion, *args: encolados.append(args) or Future())
+    graph_id = graficos.solicitar_grafico(14.96, 90, "niño", 0, obtener_tablas())
+    assert graph_id is not None
+    imc, edad, sexo, categoria, _, clave = encolados[0]
+    assert (imc, edad, sexo, categoria, clave) == (15.0, 7.5, "niño", 0, graph_id)
+
+
+def test_grafico_se_renderiza_en_el_pool(pool):
+    tablas = obtener_tablas()
+    graph_id = graficos.solicitar_grafico(17.4, 84, "niña", 1, tablas)
+    # Si sus datos ya estaban en disco (otra prueba, GRAFICO_PNG_DIFERIDO) el PNG se pide aparte
+    (graficos.grafico_pendiente(graph_id) or graficos.asegurar_png(graph_id)).result(timeout=60)
+    with open(graficos.ruta_grafico(graph_id), "rb") as f:
+        assert f.read(8) == b"\x89PNG\r\n\x1a\n"
+    # Otra petición con los mismos datos reutiliza el gráfico sin encolarlo
+    assert graficos.solicitar_grafico(17.4, 84, "niña", 1, tablas) == graph_id
+    assert graficos.grafico_pendiente(graph_id) is None
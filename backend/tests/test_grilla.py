@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from grilla import (
+    Z_PERCENTILES, cargar_grilla, categoria_de_z, categorias_de_z, generar_grilla, guardar_grilla, meses_de,
+    obtener_grilla, percentil_de_z, percentiles_de_z
+)
+from tablas import obtener_tablas
+
+
+@pytest.fixture(scope="module")
+def tablas():
+    return obtener_tablas()
+
+
+@pytest.fixture(scope="module")
+def grilla(tablas):
+    return obtener_grilla(tablas)
+
+
+@pytest.mark.parametrize("edad, meses", [(7, 84), (7.5, 90), (7.25, 87), (1.5, 18), (7.999, 95)])
+def test_meses_de(edad, meses):
+    assert meses_de(edad) == meses
+
+
+def test_percentiles_de_las_tablas_en_los_anios_cumplidos(tablas, grilla):
+    # La grilla pasa por los percentiles 5, 85 y 95 de cada año de las tablas
+    for sexo in tablas.sexos:
+        for edad, *umbrales in zip(*tablas.serie(sexo)):
+            for umbral, z in zip(umbrales, Z_PERCENTILES):
+                assert grilla.puntaje_z(umbral, sexo, edad * 12) == pytest.approx(z, abs=1e-6)
+
+
+def test_categoria_en_los_anios_cumplidos_igual_a_los_umbrales(tablas, grilla):
+    for sexo in tablas.sexos:
+        for edad, p5, p85, p95 in zip(*tablas.serie(sexo)):
+            for imc in np.linspace(p5 - 2, p95 + 2, 41):
+                esperada = sum(imc >= umbral for umbral in (p5, p85, p95))
+                assert categoria_de_z(grilla.puntaje_z(imc, sexo, edad * 12)) == esperada
+
+
+def test_percentil_crece_con_el_imc_y_baja_con_la_edad(grilla):
+    assert grilla.puntaje_z(16, "niño", 90) < grilla.puntaje_z(17, "niño", 90)
+    assert grilla.puntaje_z(17, "niño", 90) > grilla.puntaje_z(17, "niño", 150)
+    assert percentil_de_z(0) == 50
+
+
+def test_versiones_vectorizadas_iguales_a_las_escalares(grilla):
+    generador = np.random.default_rng(1)
+    imcs = generador.uniform(12, 30, 500)
+    sexos = generador.choice(list(grilla.sexos), 500)
+    meses = generador.integers(0, 240, 500)
+    z = grilla.puntajes_z(imcs, sexos, meses)
+    assert z == pytest.approx([grilla.puntaje_z(i, s, int(m)) for i, s, m in zip(imcs, sexos, meses)], abs=1e-12)
+    assert percentiles_de_z(z).tolist() == [percentil_de_z(valor) for valor in z]
+    assert categorias_de_z(z).tolist() == [categoria_de_z(valor) for valor in z]
+
+
+def test_archivo_de_la_grilla(tablas, tmp_path):
+    ruta = str(tmp_path / "grilla.npz")
+    generada = generar_grilla(tablas)
+    guardar_grilla(generada, ruta)
+    cargada = cargar_grilla(ruta)
+    assert (cargada.sexos, cargada.mes_min, cargada.version) == (generada.sexos, generada.mes_min, tablas.version)
+    np.testing.assert_array_equal(cargada.lms, generada.lms)
@@ -0,0 +1,108 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import graficos
+import main
+from historial import Historial, MAX_NINO_ID
+
+
+def _medicion(edad_meses, imc=16.0):
+    return {"edad_meses": edad_meses, "sexo": "niña", "peso": 20.0, "talla": 1.1, "imc": imc,
+            "percentil": 50.0, "puntaje_z": 0.0, "clasificacion": "Peso normal"}
+
+
+@pytest.fixture
+def cliente():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def nino_id():
+    return uuid.uuid4().hex
+
+
+def test_mediciones_por_menor_en_orden_de_fecha(tmp_path):
+    historial = Historial(str(tmp_path / "historial.db"))
+    historial.registrar("ana", _medicion(90), fecha=200.0)
+    historial.registrar("ana", _medicion(84), fecha=100.0)
+    historial.registrar("luis", _medicion(60), fecha=150.0)
+    mediciones = historial.mediciones("ana")
+    assert [m["edad_meses"] for m in mediciones] == [84, 90]
+    assert [m["fecha"] for m in mediciones] == [100.0, 200.0]
+    assert historial.mediciones("otro") == []
+
+
+def test_historia_en_wal_y_leida_por_indice(tmp_path):
+    historial = Historial(str(tmp_path / "historial.db"))
+    historial.registrar("ana", _medicion(84))
+    conexion = historial._conexion()
+    assert conexion.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plan = " ".join(str(fila) for fila in conexion.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM mediciones WHERE nino_id = ? ORDER BY fecha, id", ("ana",)
+    ))
+    assert "idx_mediciones_nino_fecha" in plan
+
+
+def test_historial_sin_mediciones_responde_404(cliente, nino_id):
+    assert cliente.get(f"/historial/{nino_id}").status_code == 404
+    assert cliente.get(f"/historial/{nino_id}/grafico").status_code == 404
+
+
+def test_imc_con_nino_id_agrega_la_medicion(cliente, nino_id):
+    for edad, talla in (("7", 1.2), ("8", 1.26)):
+        respuesta = cliente.post("/imc", json={"edad": edad, "sexo": "niña", "peso": 25, "talla": talla,
+                                               "grafico": False, "nino_id": nino_id})
+        assert respuesta.status_code == 200
+    datos = cliente.get(f"/historial/{nino_id}").json()
+    assert [m["edad_meses"] for m in datos["mediciones"]] == [84, 96]
+    assert datos["mediciones"][0]["imc"] == 17.36
+    assert datos["mediciones"][0]["fecha"].endswith("+00:00")
+    assert datos["grafico"] == f"/historial/{nino_id}/grafico"
+
+
+def test_imc_rechaza_nino_id_demasiado_largo(cliente):
+    respuesta = cliente.post("/imc", json={"edad": 7, "sexo": "niña", "peso": 25, "talla": 1.2,
+                                           "nino_id": "x" * (MAX_NINO_ID + 1)})
+    assert respuesta.status_code == 422
+
+
+def test_chat_con_nino_id_agrega_la_medicion(cliente, nino_id):
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+    cliente.post("/mensaje", json={"texto": "Ana, 7 años, niña, 25 kg, 1.20 m", "session_id": session_id,
+                                   "nino_id": nino_id})
+    mediciones = cliente.get(f"/historial/{nino_id}").json()["mediciones"]
+    assert len(mediciones) == 1 and mediciones[0]["clasificacion"]
+
+
+def test_grafico_de_trayectoria_cambia_con_cada_medicion(cliente, nino_id, pool, monkeypatch):
+    enviar, anteriores = graficos._enviar, []
+
+    def enviar_registrando(clave, al_terminar, funcion, *args):
+        if funcion is graficos.generar_grafico_trayectoria:
+            anteriores.append(args[-1])
+        return enviar(clave, al_terminar, funcion, *args)
+
+    monkeypatch.setattr(graficos, "_enviar", enviar_registrando)
+
+    def medir(edad, talla):
+        cliente.post("/imc", json={"edad": edad, "sexo": "niño", "peso": 24, "talla": talla,
+                                   "grafico": False, "nino_id": nino_id})
+
+    medir(6, 1.15)
+    medir(7, 1.21)
+    primera = cliente.get(f"/historial/{nino_id}/grafico")
+    assert primera.status_code == 200
+    assert primera.content.startswith(b"\x89PNG")
+    assert primera.headers["cache-control"] == "no-cache"
+    etag = primera.headers["etag"]
+    assert cliente.get(f"/historial/{nino_id}/grafico", headers={"If-None-Match": etag}).status_code == 304
+
+    # La nueva medición se dibuja sobre la imagen anterior y cambia el ETag
+    medir(8, 1.27)
+    segunda = cliente.get(f"/historial/{nino_id}/grafico", headers={"If-None-Match": etag})
+    assert segunda.status_code == 200
+    assert segunda.headers["etag"] != etag
+    assert len(anteriores) == 2 and anteriores[0] is None
+    assert anteriores[1][1] == 2
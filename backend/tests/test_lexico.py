@@ -0,0 +1,50 @@
+import pytest
+
+from chatbot import extraer_campos
+from lexico import Intencion, extraer_medida, intencion_de, normalizar_texto, sexo_en
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("Ana,7,25,1.20", {"nombre": "Ana", "edad": 7, "peso": 25, "talla": 1.2}),
+    ("Ana, 7, 25, 1.20", {"nombre": "Ana", "edad": 7, "peso": 25, "talla": 1.2}),
+    ("Ana, 7,5 años, 25,5 kg, 1,20 m", {"nombre": "Ana", "edad": 7.5, "peso": 25.5, "talla": 1.2}),
+    ("pesa 25,5, mide 1.20", {"peso": 25.5, "talla": 1.2}),
+])
+def test_coma_decimal_y_listas_separadas_por_comas(texto, esperado):
+    assert extraer_campos(texto) == esperado
+
+
+@pytest.mark.parametrize("texto, campo, valor", [
+    ("25,5", "peso", 25.5),
+    ("80 lb", "peso", 36.29),
+    ("2500 g", "peso", 2.5),
+    ("110 cm", "talla", 1.1),
+    ("5 pies 4 pulgadas", "talla", 1.626),
+    ("5'4\"", "talla", 1.626),
+    ("7 años y 6 meses", "edad", 7.5),
+    ("18 meses", "edad", 1.5),
+])
+def test_unidades_se_convierten(texto, campo, valor):
+    assert extraer_medida(texto, campo).valor == valor
+
+
+@pytest.mark.parametrize("texto, normalizado", [("  José Ángel ", "jose angel"), ("NIÑA", "nina"), ("ana", "ana")])
+def test_normalizar_texto(texto, normalizado):
+    assert normalizar_texto(texto) == normalizado
+
+
+@pytest.mark.parametrize("texto, intencion", [
+    ("¡Sí!", Intencion("confirmar", "")),
+    ("Niña.", Intencion("sexo", "niña")),
+    ("M", Intencion("sexo", "niño")),
+    ("calcular   otro", Intencion("reinicio", "")),
+    ("No es correcto", Intencion("negar", "")),
+    ("Ana", None),
+])
+def test_intencion_de_una_respuesta_completa(texto, intencion):
+    assert intencion_de(texto) == intencion
+
+
+@pytest.mark.parametrize("texto, sexo", [("es niña", "niña"), ("Luis, varón, 9 años", "niño"), ("mide 1 m", None)])
+def test_sexo_dentro_de_una_frase(texto, sexo):
+    assert sexo_en(texto) == sexo
@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import graficos
+import lote
+import main
+from grilla import categoria_de_z, obtener_grilla
+from lote import clasificar_lote
+from tablas import obtener_tablas
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", True)
+    return TestClient(main.app)
+
+
+def _lineas(respuesta):
+    assert respuesta.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(linea) for linea in respuesta.text.splitlines()]
+
+
+def test_vectorizado_igual_al_escalar():
+    tablas = obtener_tablas()
+    grilla = obtener_grilla(tablas)
+    generador = np.random.default_rng(0)
+    n = 2000
+    sexos = generador.choice(["niño", "niña"], n)
+    meses = generador.integers(12, 18 * 12 + 1, n)
+    pesos = generador.uniform(8, 90, n)
+    tallas = generador.uniform(0.7, 1.9, n)
+    imcs, puntajes_z, categorias = clasificar_lote(sexos, meses, pesos, tallas, tablas)
+    for i in range(n):
+        z = grilla.puntaje_z(pesos[i] / tallas[i] ** 2, sexos[i], int(meses[i]))
+        assert puntajes_z[i] == pytest.approx(z, abs=1e-12)
+        assert categorias[i] == categoria_de_z(z)
+
+
+@pytest.mark.parametrize("tipo, cuerpo", [
+    ("application/json", json.dumps([{"nombre": "Ana", "edad": 7, "sexo": "niña", "peso": 25, "talla": 1.2},
+                                     {"nombre": "Luis", "edad": 9, "sexo": "niño", "peso": 30, "talla": 133}])),
+    ("application/json", json.dumps({"filas": [{"nombre": "Ana", "edad": 7, "sexo": "niña", "peso": 25, "talla": 1.2},
+                                               {"nombre": "Luis", "edad": 9, "sexo": "niño", "peso": 30, "talla": 133}]})),
+    ("application/x-ndjson", '{"nombre": "Ana", "edad": 7, "sexo": "niña", "peso": 25, "talla": 1.2}\n'
+                             '{"nombre": "Luis", "edad": 9, "sexo": "niño", "peso": 30, "talla": 133}\n'),
+    ("text/csv", "nombre,edad,sexo,peso,talla\nAna,7,niña,25,1.2\nLuis,9,niño,30,133\n"),
+])
+def test_formatos_de_entrada(cliente, tipo, cuerpo):
+    lineas = _lineas(cliente.post("/imc/lote", content=cuerpo.encode(), headers={"Content-Type": tipo}))
+    assert [(linea["fila"], linea["nombre"]) for linea in lineas] == [(1, "Ana"), (2, "Luis")]
+    assert lineas[1]["imc"] == pytest.approx(30 / 1.33 ** 2)
+    assert all("graph_id" not in linea for linea in lineas)
+
+
+def test_formato_no_soportado(cliente):
+    respuesta = cliente.post("/imc/lote", content=b"<filas/>", headers={"Content-Type": "application/xml"})
+    assert respuesta.status_code == 415
+
+
+def test_varios_bloques_en_orden_con_graficos_opcionales(cliente, monkeypatch):
+    monkeypatch.setattr(lote, "TAMANO_BLOQUE", 7)
+    filas = "".join(f"{edad},niña,{20 + edad},1.2,{'si' if edad % 5 == 0 else ''}\n" for edad in range(1, 19))
+    cuerpo = "edad,sexo,peso,talla,grafico\n" + filas + "7,niña,-3,1.2,\n"
+    lineas = _lineas(cliente.post("/imc/lote", content=cuerpo.encode(), headers={"Content-Type": "text/csv"}))
+    assert [linea["fila"] for linea in lineas] == list(range(1, 20))
+    assert [linea["fila"] for linea in lineas if "graph_id" in linea] == [5, 10, 15]
+    assert "error" in lineas[-1]
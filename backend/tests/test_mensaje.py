@@ -0,0 +1,167 @@
+import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import chatbot
+import graficos
+import main
+from metricas import IDEMPOTENCIA
+
+
+@pytest.fixture
+def cliente():
+    return TestClient(main.app)
+
+
+def _enviar(cliente, session_id, texto, clave=None):
+    cabeceras = {"Idempotency-Key": clave} if clave else {}
+    respuesta = cliente.post("/mensaje", json={"texto": texto, "session_id": session_id}, headers=cabeceras)
+    assert respuesta.status_code == 200
+    return respuesta
+
+
+def _almacen_lento(monkeypatch):
+    """Hace que leer la sesión tarde, como SQLite bajo carga, y cuenta los mensajes en curso por sesión."""
+    obtener, guardar = chatbot.almacen.obtener, chatbot.almacen.guardar
+    en_curso = {"actual": 0, "maximo": 0}
+    lock = threading.Lock()
+
+    def obtener_lento(session_id):
+        with lock:
+            en_curso["actual"] += 1
+            en_curso["maximo"] = max(en_curso["maximo"], en_curso["actual"])
+        estado = obtener(session_id)
+        time.sleep(0.05)
+        return estado
+
+    def guardar_contando(session_id, estado):
+        guardar(session_id, estado)
+        with lock:
+            en_curso["actual"] -= 1
+
+    monkeypatch.setattr(chatbot.almacen, "obtener", obtener_lento)
+    monkeypatch.setattr(chatbot.almacen, "guardar", guardar_contando)
+    return en_curso
+
+
+def test_mensajes_de_una_sesion_se_procesan_de_a_uno(cliente, monkeypatch):
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+    en_curso = _almacen_lento(monkeypatch)
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda texto: _enviar(cliente, session_id, texto), ["Ana", "7", "niña", "25"]))
+    assert en_curso["maximo"] == 1
+
+
+def test_mensaje_sin_sesion_no_comparte_estado(cliente):
+    primera = cliente.post("/mensaje", json={"texto": "Ana"}).json()
+    segunda = cliente.post("/mensaje", json={"texto": "Luis"}).json()
+    assert primera["session_id"] != segunda["session_id"]
+    assert chatbot.almacen.obtener(primera["session_id"])["nombre"] == "Ana"
+    assert chatbot.almacen.obtener(segunda["session_id"])["nombre"] == "Luis"
+
+
+def test_mensaje_se_procesa_fuera_del_event_loop(cliente):
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+    respuesta = _enviar(cliente, session_id, "Ana")
+    # El desglose de Server-Timing se sigue registrando desde el hilo del threadpool
+    assert "sesion;dur=" in respuesta.headers["server-timing"]
+    assert "chat;dur=" in respuesta.headers["server-timing"]
+
+
+def test_websocket_conversacion(cliente):
+    with cliente.websocket_connect("/ws/chat") as ws:
+        bienvenida = ws.receive_json()
+        assert bienvenida["tipo"] == "respuesta" and bienvenida["session_id"]
+        ws.send_json({"texto": "Ana"})
+        assert "edad" in ws.receive_json()["respuesta"]
+
+
+def test_websocket_continua_sesion_sin_bienvenida(cliente):
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+    with cliente.websocket_connect(f"/ws/chat?session_id={session_id}") as ws:
+        ws.send_json({"texto": "Ana"})
+        respuesta = ws.receive_json()
+    assert respuesta["tipo"] == "respuesta" and respuesta["session_id"] == session_id
+    assert chatbot.almacen.obtener(session_id)["nombre"] == "Ana"
+
+
+def test_websocket_mensaje_invalido_no_cierra_la_conexion(cliente):
+    with cliente.websocket_connect("/ws/chat") as ws:
+        ws.receive_json()
+        ws.send_text("Ana")
+        assert ws.receive_json()["tipo"] == "error"
+        ws.send_json({"texto": "Ana"})
+        assert ws.receive_json()["tipo"] == "respuesta"
+
+
+def test_websocket_avisa_cuando_el_grafico_esta_listo(cliente, pool):
+    with cliente.websocket_connect("/ws/chat?imagen=true") as ws:
+        ws.receive_json()
+        ws.send_json({"texto": "Ana, 7 años, niña, 25 kg, 1.20 m"})
+        # El texto llega primero, sin esperar al renderizado
+        respuesta = ws.receive_json()
+        assert respuesta["tipo"] == "respuesta" and respuesta["grafico"]
+        evento = ws.receive_json()
+    assert evento["tipo"] == "grafico_listo" and evento["graph_id"] == respuesta["graph_id"]
+    assert evento["url"] == f"/grafico/{respuesta['graph_id']}"
+    assert base64.b64decode(evento["imagen"]).startswith(b"\x89PNG")
+
+
+def test_reintentos_simultaneos_se_aplican_una_vez(cliente, monkeypatch):
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+    _enviar(cliente, session_id, "Ana")
+    _almacen_lento(monkeypatch)
+
+    procesados = IDEMPOTENCIA.valor(resultado="fallo")
+    with ThreadPoolExecutor(4) as pool:
+        respuestas = list(pool.map(lambda _: _enviar(cliente, session_id, "7", "clave-edad").json(), range(4)))
+    assert len({r["respuesta"] for r in respuestas}) == 1
+    # Solo el primero se procesó; los demás esperaron y recibieron su respuesta
+    assert IDEMPOTENCIA.valor(resultado="fallo") == procesados + 1
+    assert chatbot.almacen.obtener(session_id)["edad"] == 7
+    assert chatbot.almacen.obtener(session_id)["sexo"] is None
+
+
+def test_reintento_del_ultimo_turno_no_pide_otro_grafico(cliente, monkeypatch):
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", True)
+    solicitudes = []
+    solicitar = chatbot.solicitar_grafico
+    monkeypatch.setattr(chatbot, "solicitar_grafico", lambda *args: solicitudes.append(args) or solicitar(*args))
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+    _enviar(cliente, session_id, "Ana, 7 años, niña, 25 kg")
+
+    aciertos = IDEMPOTENCIA.valor(resultado="acierto")
+    primera = _enviar(cliente, session_id, "1.20", "clave-talla").json()
+    reintento = _enviar(cliente, session_id, "1.20", "clave-talla").json()
+    assert reintento == primera and primera["graph_id"]
+    assert len(solicitudes) == 1
+    assert IDEMPOTENCIA.valor(resultado="acierto") == aciertos + 1
+    assert 'imc_idempotencia_total{resultado="acierto"}' in cliente.get("/metrics").text
+
+
+def test_misma_clave_con_otro_texto_se_procesa(cliente):
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+    _enviar(cliente, session_id, "Ana", "clave")
+    _enviar(cliente, session_id, "7", "clave")
+    assert chatbot.almacen.obtener(session_id)["edad"] == 7
+
+
+@pytest.mark.parametrize("opcion, valor", [("IDEMPOTENCIA_TTL", 0), ("IDEMPOTENCIA_MAX", 1)])
+def test_respuesta_guardada_vencida_o_expulsada_se_reprocesa(cliente, monkeypatch, opcion, valor):
+    monkeypatch.setattr(chatbot, opcion, valor)
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+    _enviar(cliente, session_id, "Ana", "clave-nombre")
+    _enviar(cliente, session_id, "7", "clave-edad")
+    _enviar(cliente, session_id, "Ana", "clave-nombre")
+    # Sin respuesta guardada, "Ana" se toma como respuesta a la pregunta del sexo
+    assert chatbot.almacen.obtener(session_id)["intentos_fallidos"] == 1
+
+
+def test_idempotency_key_demasiado_larga(cliente):
+    respuesta = cliente.post("/mensaje", json={"texto": "Ana"},
+                             headers={"Idempotency-Key": "x" * (chatbot.MAX_CLAVE_IDEMPOTENCIA + 1)})
+    assert respuesta.status_code == 422
@@ -0,0 +1,68 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+import graficos
+import main
+import metricas
+from metricas import Contador, Histograma
+
+
+@pytest.fixture
+def registrar():
+    """Crea métricas de prueba y las saca del registro global al terminar."""
+    creadas = []
+
+    def registrar(metrica):
+        creadas.append(metrica)
+        return metrica
+    yield registrar
+    for metrica in creadas:
+        metricas.registro.remove(metrica)
+
+
+def test_histograma_acumula_por_cubeta(registrar):
+    histograma = registrar(Histograma("prueba_segundos", "Prueba", ("etapa",), limites=(0.1, 1.0)))
+    for valor in (0.05, 0.1, 0.5, 3.0):
+        histograma.observar(valor, etapa="nombre")
+    assert histograma.exponer().splitlines() == [
+        "# HELP prueba_segundos Prueba",
+        "# TYPE prueba_segundos histogram",
+        'prueba_segundos_bucket{etapa="nombre",le="0.1"} 2',
+        'prueba_segundos_bucket{etapa="nombre",le="1"} 3',
+        'prueba_segundos_bucket{etapa="nombre",le="+Inf"} 4',
+        'prueba_segundos_sum{etapa="nombre"} 3.65',
+        'prueba_segundos_count{etapa="nombre"} 4',
+    ]
+
+
+def test_contador_escapa_etiquetas(registrar):
+    contador = registrar(Contador("prueba_total", "Prueba", ("motivo",)))
+    contador.incrementar(motivo='con "comillas"')
+    contador.incrementar(2, motivo='con "comillas"')
+    assert contador.muestras() == ['prueba_total{motivo="con \\"comillas\\""} 3']
+    assert contador.valor(motivo="otro") == 0
+
+
+def test_mensaje_con_server_timing_y_metricas(monkeypatch):
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", True)
+    cliente = TestClient(main.app)
+    session_id = cliente.get("/bienvenida").json()["session_id"]
+    respuesta = cliente.post("/mensaje", json={"texto": "Ana, 7 años, niña, 25 kg, 1.20 m", "session_id": session_id})
+
+    entradas = dict(re.findall(r"(\w+);dur=([\d.]+)", respuesta.headers["server-timing"]))
+    assert {"total", "sesion", "percentiles", "clasificacion", "grafico", "guardado"} <= set(entradas)
+    assert all(float(entradas[nombre]) <= float(entradas["total"]) for nombre in entradas)
+
+    texto = cliente.get("/metrics")
+    assert texto.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE imc_mensaje_segundos histogram" in texto.text
+    # Con todos los datos en un mensaje, se procesa en la etapa del nombre
+    assert re.search(r'^imc_mensaje_segundos_count\{etapa="nombre"\} [1-9]\d*$', texto.text, re.MULTILINE)
+    assert re.search(r"^imc_sesiones_activas [1-9]\d*$", texto.text, re.MULTILINE)
+
+
+def test_server_timing_solo_en_las_rutas_medidas():
+    respuesta = TestClient(main.app).get("/bienvenida")
+    assert "server-timing" not in respuesta.headers
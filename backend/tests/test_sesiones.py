@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sesiones import AlmacenMemoria, AlmacenSQLite, estado_inicial
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def crear(request, tmp_path):
+    def crear(**opciones):
+        if request.param == "sqlite":
+            return AlmacenSQLite(str(tmp_path / "sesiones.db"), **opciones)
+        return AlmacenMemoria(**opciones)
+    return crear
+
+
+def test_sesiones_independientes(crear):
+    almacen = crear()
+    almacen.guardar("a", {**estado_inicial(), "nombre": "Ana"})
+    almacen.guardar("b", {**estado_inicial(), "nombre": "Luis"})
+    assert almacen.obtener("a")["nombre"] == "Ana"
+    assert almacen.obtener("b")["nombre"] == "Luis"
+    assert almacen.obtener("c") == estado_inicial()
+    almacen.eliminar("a")
+    assert almacen.obtener("a") == estado_inicial()
+    assert len(almacen) == 1
+
+
+def test_sesion_expira_tras_el_ttl(crear):
+    almacen = crear(ttl=0.05)
+    almacen.guardar("a", {**estado_inicial(), "nombre": "Ana"})
+    assert almacen.obtener("a")["nombre"] == "Ana"
+    time.sleep(0.1)
+    assert almacen.obtener("a") == estado_inicial()
+    assert len(almacen) == 0
+
+
+def test_memoria_expulsa_la_sesion_menos_usada():
+    almacen = AlmacenMemoria(max_sesiones=2)
+    almacen.guardar("a", estado_inicial())
+    almacen.guardar("b", estado_inicial())
+    almacen.guardar("a", {**estado_inicial(), "nombre": "Ana"})
+    almacen.guardar("c", estado_inicial())
+    assert len(almacen) == 2
+    assert almacen.obtener("a")["nombre"] == "Ana"
+    assert "b" not in almacen._sesiones
+
+
+def test_sqlite_purga_cada_intervalo_con_escrituras_concurrentes(tmp_path, monkeypatch):
+    almacen = AlmacenSQLite(str(tmp_path / "sesiones.db"), max_sesiones=10)
+    purgas = []
+    monkeypatch.setattr(almacen, "_purgar", purgas.append)
+    total = 8 * almacen.INTERVALO_PURGA
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: almacen.guardar(f"s{i}", estado_inicial()), range(total)))
+    # Ninguna escritura se pierde en el contador: se purga exactamente una vez por intervalo
+    assert len(purgas) == total // almacen.INTERVALO_PURGA
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+import tablas
+from tablas import RUTA_TABLAS, cargar_tablas
+
+
+@pytest.fixture
+def archivo(tmp_path, monkeypatch):
+    # Estado propio del módulo, para no reemplazar las tablas que usan las demás pruebas
+    monkeypatch.setattr(tablas, "_tablas", None)
+    monkeypatch.setattr(tablas, "_mtime", None)
+    monkeypatch.setattr(tablas, "_ultima_revision", 0.0)
+    monkeypatch.setattr(tablas, "INTERVALO_REVISION", 0.0)
+    with open(RUTA_TABLAS, encoding="utf-8") as f:
+        datos = json.load(f)
+    ruta = tmp_path / "tablas.json"
+    ruta.write_text(json.dumps(datos), encoding="utf-8")
+    return ruta, datos
+
+
+def _reescribir(ruta, contenido, segundos):
+    ruta.write_text(contenido, encoding="utf-8")
+    # Otro mtime aunque el sistema de archivos tenga resolución de segundos
+    os.utime(ruta, (segundos, segundos))
+
+
+def test_tablas_indexadas_por_edad_y_sexo():
+    tabla = cargar_tablas()
+    edades, p5, p85, p95 = tabla.serie("niño")
+    assert edades == sorted(edades)
+    assert tabla.umbrales("niño", edades[0]) == (p5[0], p85[0], p95[0])
+    assert tabla.umbrales("niño", 99) is None
+
+
+@pytest.mark.parametrize("contenido", ["{", "{}", '{"niño": {"7": {"p5": 16, "p85": 15, "p95": 17}}}'])
+def test_archivo_mal_formado_falla_al_cargar(tmp_path, contenido):
+    ruta = tmp_path / "tablas.json"
+    ruta.write_text(contenido, encoding="utf-8")
+    with pytest.raises(ValueError):
+        cargar_tablas(str(ruta))
+
+
+def test_recarga_cuando_cambia_el_archivo(archivo):
+    ruta, datos = archivo
+    anteriores = tablas.obtener_tablas(str(ruta))
+    assert tablas.obtener_tablas(str(ruta)) is anteriores
+
+    datos["niño"]["7"]["p95"] += 1
+    _reescribir(ruta, json.dumps(datos), 1_000_000)
+    nuevas = tablas.obtener_tablas(str(ruta))
+    assert nuevas.version != anteriores.version
+    assert nuevas.umbrales("niño", 7)[2] == anteriores.umbrales("niño", 7)[2] + 1
+
+
+def test_recarga_invalida_conserva_las_tablas(archivo):
+    ruta, _ = archivo
+    anteriores = tablas.obtener_tablas(str(ruta))
+    _reescribir(ruta, "{", 1_000_000)
+    assert tablas.obtener_tablas(str(ruta)) is anteriores
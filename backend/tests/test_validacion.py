@@ -0,0 +1,94 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import graficos
+import main
+from lote import validar_fila
+from tablas import obtener_tablas
+from utils import CATEGORIAS, texto_recomendacion
+
+FILA = {"nombre": "Ana", "edad": "7", "sexo": "niña", "peso": "25", "talla": "1.20"}
+
+ERROR_NUMEROS = "Edad, peso y talla deben ser números."
+
+
+@pytest.fixture
+def cliente():
+    # Sin los eventos de arranque: las tablas se cargan al primer uso y no se lanza el pool de renderizado
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("campo", ["edad", "peso", "talla"])
+@pytest.mark.parametrize("valor", ["nan", "NaN", "inf", "-inf"])
+def test_validar_fila_rechaza_valores_no_finitos(campo, valor):
+    valida, error = validar_fila(1, {**FILA, campo: valor}, obtener_tablas())
+    assert valida is None
+    assert error == ERROR_NUMEROS
+
+
+def test_lote_con_nan_responde_todas_las_filas(cliente):
+    cuerpo = "nombre,edad,sexo,peso,talla\nAna,7,niña,25,1.20\nLuis,8,niño,nan,1.25\nEva,9,niña,28,1.30\n"
+    respuesta = cliente.post("/imc/lote", content=cuerpo.encode(), headers={"Content-Type": "text/csv"})
+    assert respuesta.status_code == 200
+    lineas = [json.loads(linea) for linea in respuesta.text.splitlines()]
+    assert [linea["fila"] for linea in lineas] == [1, 2, 3]
+    assert lineas[1]["error"] == ERROR_NUMEROS
+    assert "imc" in lineas[0] and "imc" in lineas[2]
+
+
+def test_imc_con_nan_responde_422(cliente):
+    respuesta = cliente.post("/imc", json={**FILA, "peso": "nan", "grafico": False})
+    assert respuesta.status_code == 422
+    assert respuesta.json() == {"error": ERROR_NUMEROS}
+
+
+def _banda(percentil):
+    # Índice en CATEGORIAS que corresponde al percentil informado
+    return sum(percentil >= corte for corte in (5, 85, 95))
+
+
+@pytest.mark.parametrize("edad", ["7", "7.5", "7.9", "12.25"])
+def test_imc_categoria_coincide_con_percentil(cliente, edad):
+    for peso in range(18, 60, 2):
+        datos = cliente.post("/imc", json={**FILA, "edad": edad, "peso": peso, "grafico": False}).json()
+        assert datos["clasificacion"] == CATEGORIAS[_banda(datos["percentil"])], datos
+
+
+def test_lote_categoria_coincide_con_percentil(cliente):
+    cuerpo = "edad,sexo,peso,talla\n" + "".join(f"7.9,niño,{peso},1.25\n" for peso in range(18, 60, 2))
+    respuesta = cliente.post("/imc/lote", content=cuerpo.encode(), headers={"Content-Type": "text/csv"})
+    for datos in map(json.loads, respuesta.text.splitlines()):
+        assert datos["clasificacion"] == CATEGORIAS[_banda(datos["percentil"])], datos
+
+
+def test_grafico_usa_la_edad_en_meses(cliente, monkeypatch):
+    # Niño de 7 años y 6 meses con IMC 15.31: bajo el percentil 5 a los 90 meses,
+    # aunque con los umbrales de los 7 años cumplidos sería peso normal
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", True)
+    fila = {"edad": "7.5", "sexo": "niño", "peso": "15.31", "talla": "1", "grafico": True}
+    resultado = cliente.post("/imc", json=fila).json()
+    assert resultado["clasificacion"] == CATEGORIAS[0]
+
+    datos = cliente.get(f"/grafico/{resultado['graph_id']}/datos").json()
+    assert (datos["edad"], datos["meses"]) == (7.5, 90)
+    assert datos["clasificacion"] == CATEGORIAS[0]
+    assert datos["recomendacion"] == texto_recomendacion(0)
+
+    a_los_7 = cliente.post("/imc", json={**fila, "edad": "7"}).json()
+    assert a_los_7["graph_id"] != resultado["graph_id"]
+
+
+def test_imc_lote_y_grafico_clasifican_igual(cliente, monkeypatch):
+    monkeypatch.setattr(graficos, "PNG_DIFERIDO", True)
+    filas = [(edad, sexo, peso) for edad in ("2.25", "7.5", "7.9", "15.75") for sexo in ("niña", "niño")
+             for peso in range(10, 70, 6)]
+    cuerpo = "edad,sexo,peso,talla,grafico\n" + "".join(f"{e},{s},{p},1.25,true\n" for e, s, p in filas)
+    lote = [json.loads(linea) for linea in
+            cliente.post("/imc/lote", content=cuerpo.encode(), headers={"Content-Type": "text/csv"}).text.splitlines()]
+    for (edad, sexo, peso), fila in zip(filas, lote):
+        imc = cliente.post("/imc", json={"edad": edad, "sexo": sexo, "peso": peso, "talla": "1.25",
+                                         "grafico": False}).json()
+        datos = cliente.get(f"/grafico/{fila['graph_id']}/datos").json()
+        assert fila["clasificacion"] == imc["clasificacion"] == datos["clasificacion"], (edad, sexo, peso)
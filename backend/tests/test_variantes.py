@@ -0,0 +1,68 @@
+import io
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import graficos
+import main
+from graficos import ANCHO_ORIGINAL, ORIGINAL, Variante, elegir_variante
+from utils import generar_variante
+
+
+@pytest.mark.parametrize("ancho, dpi, formato, accept, esperada", [
+    (None, None, None, "image/png", ORIGINAL),
+    (None, None, None, "image/avif,image/webp,*/*", Variante(ANCHO_ORIGINAL, "webp")),
+    (300, None, None, "", Variante(320, "png")),
+    (500, None, "png8", "image/webp", Variante(640, "png8")),
+    (5000, None, "png", "", ORIGINAL),
+    (None, 48, None, "", Variante(480, "png")),
+    (640, 200, "webp", "", Variante(640, "webp")),
+])
+def test_elegir_variante(ancho, dpi, formato, accept, esperada):
+    assert elegir_variante(ancho, dpi, formato, accept) == esperada
+
+
+def test_ruta_de_la_variante_junto_al_original():
+    assert graficos.ruta_grafico("abc") == os.path.join("graficos", "grafico_abc.png")
+    assert graficos.ruta_grafico("abc", Variante(640, "webp")) == os.path.join("graficos", "grafico_abc_640_webp.webp")
+    assert graficos.ruta_grafico("abc", Variante(320, "png8")) == os.path.join("graficos", "grafico_abc_320_png8.png")
+
+
+@pytest.mark.parametrize("formato, modo, tipo", [("webp", "RGB", "WEBP"), ("png8", "P", "PNG"), ("png", "RGB", "PNG")])
+def test_generar_variante_reduce_y_convierte(tmp_path, formato, modo, tipo):
+    origen = tmp_path / "original.png"
+    Image.new("RGB", (1000, 600), "white").save(origen)
+    nombre = f"prueba_variante_{formato}"
+    try:
+        assert generar_variante(str(origen), nombre, 640, formato) == nombre
+        with Image.open(os.path.join("graficos", nombre)) as variante:
+            assert variante.size == (640, 384)
+            assert variante.mode == modo and variante.format == tipo
+    finally:
+        os.remove(os.path.join("graficos", nombre))
+
+
+def test_grafico_se_sirve_en_la_variante_negociada(pool):
+    cliente = TestClient(main.app)
+    graph_id = cliente.post("/imc", json={"edad": 10, "sexo": "niña", "peso": 33, "talla": 1.38,
+                                          "grafico": True}).json()["graph_id"]
+    original = cliente.get(f"/grafico/{graph_id}", headers={"Accept": "image/png"})
+    assert original.status_code == 200
+
+    movil = cliente.get(f"/grafico/{graph_id}?ancho=600", headers={"Accept": "image/webp,*/*"})
+    assert movil.status_code == 200
+    assert movil.headers["content-type"] == "image/webp"
+    assert movil.headers["vary"] == "Accept"
+    assert movil.headers["etag"] != original.headers["etag"]
+    assert len(movil.content) * 2 < len(original.content)
+    with Image.open(io.BytesIO(movil.content)) as imagen:
+        assert imagen.width == 640
+
+    paleta = cliente.get(f"/grafico/{graph_id}?dpi=32&formato=png8", headers={"Accept": "image/webp"})
+    assert paleta.headers["content-type"] == "image/png"
+    with Image.open(io.BytesIO(paleta.content)) as imagen:
+        assert (imagen.width, imagen.mode) == (320, "P")
+    # La variante queda en disco junto al original
+    assert os.path.exists(graficos.ruta_grafico(graph_id, Variante(320, "png8")))
@@ -1,7 +1,33 @@
-import matplotlib.pyplot as plt
+import io
 import os
 import uuid
-from typing import Dict, Any
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from tablas import TablaPercentiles
+
+# matplotlib y PIL solo se importan al dibujar: el servidor importa este módulo
+# para clasificar y no los necesita, porque los gráficos se dibujan en procesos aparte
+if TYPE_CHECKING:
+    from matplotlib.artist import Artist
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
+
+# Categorías de IMC en orden creciente, separadas por los percentiles 5, 85 y 95.
+# Es la única clasificación: grilla.categoria_de_z da el índice a partir del puntaje z
+CATEGORIAS = (
+    "bajo peso (percentil < 5)",
+    "peso normal (percentil 5-85)",
+    "riesgo de sobrepeso (percentil 85-95)",
+    "obesidad (percentil > 95)",
+)
+
+# Recomendación que se muestra sobre el gráfico, por categoría
+RECOMENDACIONES = (
+    "Recomendación: Bajo peso, evalúe con pediatra.",
+    "Recomendación: Peso saludable, siga con buenos hábitos.",
+    "Recomendación: Riesgo de sobrepeso, controle dieta y actividad.",
+    "Recomendación: Obesidad, consultar especialista.",
+)
 
 def calcular_imc(peso: float, talla: float) -> float:
     """
@@ -16,94 +42,377 @@ def calcular_imc(peso: float, talla: float) -> float:
     """
     return peso / (talla ** 2)
 
-def clasificar_por_percentil(imc: float, edad: int, sexo: str, tablas: Dict[str, Any]) -> str:
+ESTILO_CURVAS = (
+    ("Límite mínimo saludable", "orange"),
+    ("Inicio del sobrepeso", "orangered"),
+    ("Límite de obesidad", "crimson"),
+)
+
+# Fondos ya dibujados por sexo: sexo -> (versión de tablas, figura, ejes, región rasterizada)
+_fondos: Dict[str, Tuple[str, "Figure", "Axes", Any]] = {}
+
+def texto_recomendacion(categoria: int) -> str:
     """
-    Clasifica el IMC según los percentiles definidos en las tablas por edad y sexo.
+    Elige el texto de recomendación que se muestra sobre el gráfico.
+    
+    Args:
+        categoria: Índice en CATEGORIAS, el mismo que se informa al usuario
+            (grilla.categoria_de_z con la edad en meses)
+    
+    Returns:
+        str: Texto de recomendación
+    """
+    return RECOMENDACIONES[categoria]
+
+def _crear_figura(sexo: str, tablas: TablaPercentiles) -> Tuple["Figure", "Axes"]:
+    """
+    Dibuja la parte fija del gráfico de un sexo: curvas de percentiles,
+    título, ejes y cuadrícula.
     
     Args:
-        imc: Índice de Masa Corporal calculado
-        edad: Edad del menor en años
         sexo: Sexo del menor ('niño' o 'niña')
-        tablas: Diccionario con datos de percentiles por edad y sexo
+        tablas: Tablas de percentiles preindexadas por edad y sexo
     
     Returns:
-        str: Clasificación del IMC (bajo peso, peso normal, riesgo de sobrepeso, obesidad)
+        Tuple[Figure, Axes]: Figura con lienzo Agg y sus ejes
     """
-    try:
-        edad_str = str(edad)
-        datos = tablas[sexo][edad_str]
-
-        if imc < datos["p5"]:
-            return "bajo peso (percentil < 5)"
-        elif imc < datos["p85"]:
-            return "peso normal (percentil 5-85)"
-        elif imc < datos["p95"]:
-            return "riesgo de sobrepeso (percentil 85-95)"
-        else:
-            return "obesidad (percentil > 95)"
-    except KeyError:
-        return "No hay datos para esa edad o sexo."
-
-def generar_grafico_percentil(imc_usuario: float, edad: int, sexo: str, tablas: Dict[str, Any]) -> str:
+    # API orientada a objetos con lienzo Agg: sin pyplot ni su estado global
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    edades, *curvas = tablas.serie(sexo)
+
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for valores, (etiqueta, color) in zip(curvas, ESTILO_CURVAS):
+        ax.plot(edades, valores, label=etiqueta, linestyle="--", color=color, linewidth=2.5)
+
+    ax.set_title("Gráfico de Percentiles de IMC (1 a 18 años)", fontsize=16)
+    ax.set_xlabel("Edad (años)", fontsize=13)
+    ax.set_ylabel("IMC", fontsize=13)
+    ax.tick_params(labelsize=11)
+    ax.grid(True, linestyle='--', alpha=0.6)
+    fig.tight_layout()
+    return fig, ax
+
+def _dibujar_menor(fig: "Figure", ax: "Axes", imc_usuario: float, edad: float, texto: str,
+                   animado: bool) -> Tuple["Artist", ...]:
     """
-    Genera un gráfico del IMC comparado con percentiles saludables por edad y sexo.
-    Guarda el gráfico con un nombre único basado en UUID.
+    Añade el punto del menor, la recomendación y la leyenda a unos ejes.
     
     Args:
+        fig: Figura que contiene los ejes
+        ax: Ejes con las curvas de percentiles
         imc_usuario: IMC calculado del menor
         edad: Edad del menor en años
+        texto: Recomendación a mostrar junto al punto
+        animado: Si True, los artistas no se dibujan con la figura y deben
+            dibujarse a mano con draw_artist
+    
+    Returns:
+        Tuple[Artist, ...]: (punto, recomendación, leyenda) añadidos
+    """
+    punto = ax.scatter([edad], [imc_usuario], color="red", s=150, edgecolors="black",
+                       linewidths=2, zorder=5, label=f"Niño/a ({imc_usuario:.1f})", animated=animado)
+
+    # Mostrar recomendación sobre el gráfico; si se sale de los ejes por la
+    # derecha va a la izquierda del punto, y si se sale por arriba, debajo
+    recomendacion = ax.text(edad + 0.5, imc_usuario + 0.5, texto,
+                            fontsize=12, weight='bold', color='black', animated=animado,
+                            bbox=dict(facecolor='lightyellow', edgecolor='gray', boxstyle='round,pad=0.4'))
+    # get_ylim() aplica el autoescalado pendiente (el del punto recién añadido):
+    # sin él, ax.bbox y la posición del texto se calcularían con los límites viejos
+    ax.get_ylim()
+    extension = recomendacion.get_window_extent(fig.canvas.get_renderer())
+    if extension.x1 > ax.bbox.x1:
+        recomendacion.set_x(edad - 0.5)
+        recomendacion.set_horizontalalignment("right")
+    if extension.y1 > ax.bbox.y1:
+        recomendacion.set_y(imc_usuario - 0.5)
+        recomendacion.set_verticalalignment("top")
+
+    leyenda = ax.legend(fontsize=11)
+    leyenda.set_animated(animado)
+    return punto, recomendacion, leyenda
+
+@contextmanager
+def _artistas_temporales(ax: "Axes") -> Iterator[None]:
+    """
+    Quita de los ejes de un fondo todo artista añadido dentro del bloque,
+    también si algo falla después de crear solo algunos. Un artista que
+    quedara en el fondo se acumularía en cada gráfico siguiente (memoria del
+    proceso y entradas repetidas en la leyenda).
+    """
+    previos = set(map(id, ax.get_children()))
+    try:
+        yield
+    finally:
+        for artista in ax.get_children():
+            if id(artista) not in previos:
+                artista.remove()
+
+def _obtener_fondo(sexo: str, tablas: TablaPercentiles) -> Tuple[str, "Figure", "Axes", Any]:
+    """
+    Obtiene el fondo rasterizado de un sexo, dibujándolo si no existe o si
+    las tablas cambiaron.
+    
+    Args:
         sexo: Sexo del menor ('niño' o 'niña')
-        tablas: Diccionario con datos de percentiles por edad y sexo
+        tablas: Tablas de percentiles preindexadas por edad y sexo
     
     Returns:
-        str: ID único del gráfico generado (UUID)
-    """
-    edad_int = int(edad)
-    edades = sorted([int(k) for k in tablas[sexo].keys()])
-
-    p5 = [tablas[sexo][str(e)]["p5"] for e in edades]
-    p85 = [tablas[sexo][str(e)]["p85"] for e in edades]
-    p95 = [tablas[sexo][str(e)]["p95"] for e in edades]
-
-    plt.figure(figsize=(10, 6))
-    plt.plot(edades, p5, label="Límite mínimo saludable", linestyle="--", color="orange", linewidth=2.5)
-    plt.plot(edades, p85, label="Inicio del sobrepeso", linestyle="--", color="orangered", linewidth=2.5)
-    plt.plot(edades, p95, label="Límite de obesidad", linestyle="--", color="crimson", linewidth=2.5)
-
-    # Punto del menor
-    plt.scatter([edad_int], [imc_usuario], color="red", s=150, edgecolors="black",
-                linewidths=2, zorder=5, label=f"Niño/a ({imc_usuario:.1f})")
-
-    # Recomendación visual
-    if imc_usuario < tablas[sexo][str(edad)]["p5"]:
-        texto = "Recomendación: Bajo peso, evalúe con pediatra."
-    elif imc_usuario < tablas[sexo][str(edad)]["p85"]:
-        texto = "Recomendación: Peso saludable, siga con buenos hábitos."
-    elif imc_usuario < tablas[sexo][str(edad)]["p95"]:
-        texto = "Recomendación: Riesgo de sobrepeso, controle dieta y actividad."
-    else:
-        texto = "Recomendación: Obesidad, consultar especialista."
-
-    # Mostrar recomendación sobre el gráfico
-    plt.text(edad_int + 0.5, imc_usuario + 0.5, texto,
-             fontsize=12, weight='bold', color='black',
-             bbox=dict(facecolor='lightyellow', edgecolor='gray', boxstyle='round,pad=0.4'))
-
-    plt.title("Gráfico de Percentiles de IMC (1 a 18 años)", fontsize=16)
-    plt.xlabel("Edad (años)", fontsize=13)
-    plt.ylabel("IMC", fontsize=13)
-    plt.xticks(fontsize=11)
-    plt.yticks(fontsize=11)
-    plt.grid(True, linestyle='--', alpha=0.6)
-    plt.legend(fontsize=11)
-    plt.tight_layout()
-
-    # Generar nombre único para el gráfico
-    graph_id = str(uuid.uuid4())
-    graph_filename = f"grafico_{graph_id}.png"
+        Tuple: (versión de tablas, figura, ejes, región rasterizada del lienzo)
+    """
+    fondo = _fondos.get(sexo)
+    if fondo is None or fondo[0] != tablas.version:
+        fig, ax = _crear_figura(sexo, tablas)
+        fig.canvas.draw()
+        fondo = (tablas.version, fig, ax, fig.canvas.copy_from_bbox(fig.bbox))
+        _fondos[sexo] = fondo
+    return fondo
+
+def precalentar_fondos(tablas: TablaPercentiles) -> None:
+    """
+    Dibuja por adelantado los fondos de todos los sexos.
+    Pensado como inicializador de los procesos de renderizado.
+    
+    Args:
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+    """
+    for sexo in tablas.sexos:
+        _obtener_fondo(sexo, tablas)
+
+def precalentar_renderizado(tablas: TablaPercentiles) -> None:
+    """
+    Deja listo un proceso de renderizado: importa matplotlib, dibuja los
+    fondos y dibuja y descarta un menor de prueba, para que el primer gráfico
+    real no pague la carga de la fuente en negrita, la caché de texto del
+    renderizador ni el codificador PNG.
+    Pensado como inicializador de los procesos de renderizado.
     
+    Args:
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+    """
+    from PIL import Image
+
+    precalentar_fondos(tablas)
+    sexo = tablas.sexos[0]
+    _, fig, ax, region = _obtener_fondo(sexo, tablas)
+    edades, p5, p85, _ = tablas.serie(sexo)
+    imc_usuario = (p5[0] + p85[0]) / 2
+    texto = texto_recomendacion(1)
+    try:
+        with _artistas_temporales(ax):
+            for artista in _dibujar_menor(fig, ax, imc_usuario, edades[0], texto, animado=True):
+                ax.draw_artist(artista)
+            Image.frombuffer("RGBA", fig.canvas.get_width_height(), fig.canvas.buffer_rgba(),
+                             "raw", "RGBA", 0, 1).convert("RGB").save(io.BytesIO(), format="PNG")
+    finally:
+        fig.canvas.restore_region(region)
+
+def _guardar_png(graph_id: str, escribir: Callable[[str], None]) -> None:
+    """
+    Guarda un gráfico en un temporal y lo renombra, para que nadie lea un PNG a medias.
+    
+    Args:
+        graph_id: ID del gráfico
+        escribir: Función que escribe el PNG en la ruta recibida
+    """
+    _guardar_archivo(f"grafico_{graph_id}.png", escribir)
+
+def _guardar_archivo(graph_filename: str, escribir: Callable[[str], None]) -> None:
+    """Como _guardar_png, con el nombre del archivo dentro de graficos/."""
     os.makedirs("graficos", exist_ok=True)
-    plt.savefig(os.path.join("graficos", graph_filename))
-    plt.close()
+    ruta_temporal = os.path.join("graficos", f".{graph_filename}.{os.getpid()}.tmp")
+    escribir(ruta_temporal)
+    os.replace(ruta_temporal, os.path.join("graficos", graph_filename))
+
+def renderizar_completo(imc_usuario: float, edad: float, sexo: str, categoria: int,
+                        tablas: TablaPercentiles, graph_id: str) -> None:
+    """
+    Dibuja el gráfico completo desde cero, sin usar el fondo precalculado.
     
+    Args:
+        imc_usuario: IMC calculado del menor
+        edad: Edad del menor en años, con decimales (meses / 12)
+        sexo: Sexo del menor ('niño' o 'niña')
+        categoria: Índice en CATEGORIAS informado al usuario
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+        graph_id: ID con el que se guarda el gráfico
+    """
+    fig, ax = _crear_figura(sexo, tablas)
+    _dibujar_menor(fig, ax, imc_usuario, edad, texto_recomendacion(categoria), animado=False)
+    _guardar_png(graph_id, lambda ruta: fig.savefig(ruta, format="png"))
+
+def renderizar_sobre_fondo(imc_usuario: float, edad: float, sexo: str, categoria: int,
+                           tablas: TablaPercentiles, graph_id: str) -> bool:
+    """
+    Dibuja solo el punto, la recomendación y la leyenda sobre el fondo
+    rasterizado del sexo. No es seguro llamarla desde varios hilos.
+    
+    Args:
+        imc_usuario: IMC calculado del menor
+        edad: Edad del menor en años, con decimales (meses / 12)
+        sexo: Sexo del menor ('niño' o 'niña')
+        categoria: Índice en CATEGORIAS informado al usuario
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+        graph_id: ID con el que se guarda el gráfico
+    
+    Returns:
+        bool: False si el punto cae fuera del rango de las curvas, donde el
+            gráfico completo reescalaría los ejes y el fondo no sirve
+    """
+    from PIL import Image
+
+    _, fig, ax, region = _obtener_fondo(sexo, tablas)
+    limites = ax.dataLim
+    if not (limites.x0 <= edad <= limites.x1 and limites.y0 <= imc_usuario <= limites.y1):
+        return False
+
+    texto = texto_recomendacion(categoria)
+    fig.canvas.restore_region(region)
+    with _artistas_temporales(ax):
+        for artista in _dibujar_menor(fig, ax, imc_usuario, edad, texto, animado=True):
+            ax.draw_artist(artista)
+        # El fondo es opaco: se guarda en RGB, que codifica más rápido y ocupa menos
+        imagen = Image.frombuffer("RGBA", fig.canvas.get_width_height(), fig.canvas.buffer_rgba(),
+                                  "raw", "RGBA", 0, 1).convert("RGB")
+        _guardar_png(graph_id, lambda ruta: imagen.save(ruta, format="PNG"))
+    return True
+
+def generar_grafico_percentil(imc_usuario: float, edad: float, sexo: str, categoria: int,
+                              tablas: TablaPercentiles, graph_id: Optional[str] = None) -> str:
+    """
+    Genera un gráfico del IMC comparado con percentiles saludables por edad y sexo.
+    Reutiliza el fondo precalculado del sexo y, si el punto queda fuera de
+    las curvas, dibuja el gráfico completo.
+    
+    Args:
+        imc_usuario: IMC calculado del menor
+        edad: Edad del menor en años, con decimales (meses / 12)
+        sexo: Sexo del menor ('niño' o 'niña')
+        categoria: Índice en CATEGORIAS informado al usuario
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+        graph_id: ID a usar para el gráfico (por defecto se genera uno nuevo)
+    
+    Returns:
+        str: ID único del gráfico generado
+    """
+    graph_id = graph_id or str(uuid.uuid4())
+    if not renderizar_sobre_fondo(imc_usuario, edad, sexo, categoria, tablas, graph_id):
+        renderizar_completo(imc_usuario, edad, sexo, categoria, tablas, graph_id)
     return graph_id
+
+# Estilo de la trayectoria de un menor: una línea con un marcador por medición. Sin
+# ajuste a píxeles, que matplotlib aplica solo a las líneas con tramos horizontales
+# o verticales: un tramo debe verse igual dibujado solo que dentro de la trayectoria
+ESTILO_TRAYECTORIA = dict(color="royalblue", linewidth=2, marker="o", markersize=8,
+                          markerfacecolor="red", markeredgecolor="black", markeredgewidth=1.5, snap=False)
+
+def _dibujar_trayectoria(ax: "Axes", edades: Sequence[float], imcs: Sequence[float],
+                         animado: bool) -> Tuple["Artist", ...]:
+    """
+    Añade la trayectoria (o un tramo de ella) y la leyenda a unos ejes.
+    La leyenda va siempre arriba a la izquierda, para que sea la misma al
+    dibujar solo un tramo nuevo sobre la imagen anterior.
+    
+    Returns:
+        Tuple[Artist, ...]: (línea, leyenda) añadidas
+    """
+    linea, = ax.plot(edades, imcs, label="Mediciones", zorder=5, animated=animado, **ESTILO_TRAYECTORIA)
+    # Opaca, para que volver a dibujarla sobre la imagen anterior no la oscurezca
+    leyenda = ax.legend(fontsize=11, loc="upper left", framealpha=1)
+    leyenda.set_animated(animado)
+    return linea, leyenda
+
+def generar_grafico_trayectoria(puntos: List[Tuple[float, float]], sexo: str, tablas: TablaPercentiles,
+                                nombre: str, anterior: Optional[Tuple[str, int]] = None) -> bool:
+    """
+    Dibuja la trayectoria de un menor (todas sus mediciones) sobre las curvas
+    de percentiles y la guarda como graficos/<nombre>.
+    
+    Si se recibe la imagen de la misma trayectoria con sus primeros puntos,
+    solo se dibujan encima los tramos nuevos; si no, se dibuja la trayectoria
+    completa sobre el fondo rasterizado del sexo. Con algún punto fuera del
+    rango de las curvas se dibuja el gráfico completo reescalando los ejes.
+    
+    Args:
+        puntos: (edad en años con decimales, IMC) de cada medición, en orden
+        sexo: Sexo del menor ('niño' o 'niña')
+        tablas: Tablas de percentiles preindexadas por edad y sexo
+        nombre: Nombre del archivo PNG
+        anterior: (ruta, número de puntos) de una imagen previa de la trayectoria
+    
+    Returns:
+        bool: True si se dibujó de forma incremental sobre la imagen anterior
+    """
+    import numpy as np
+    from PIL import Image
+
+    edades, imcs = zip(*puntos)
+    _, fig, ax, region = _obtener_fondo(sexo, tablas)
+    limites = ax.dataLim
+    if not all(limites.x0 <= edad <= limites.x1 and limites.y0 <= imc <= limites.y1 for edad, imc in puntos):
+        fig_completa, ax_completo = _crear_figura(sexo, tablas)
+        _dibujar_trayectoria(ax_completo, edades, imcs, animado=False)
+        _guardar_archivo(nombre, lambda ruta: fig_completa.savefig(ruta, format="png"))
+        return False
+
+    # Desde qué punto hay que dibujar: el último de la imagen anterior, para unir el tramo
+    desde = 0
+    if anterior is not None and 0 < anterior[1] < len(puntos):
+        ancho, alto = fig.canvas.get_width_height()
+        try:
+            with Image.open(anterior[0]) as imagen_anterior:
+                pixeles = np.asarray(imagen_anterior.convert("RGBA"))
+        except OSError:
+            pixeles = None
+        if pixeles is not None and pixeles.shape == (alto, ancho, 4):
+            np.asarray(fig.canvas.buffer_rgba())[...] = pixeles
+            desde = anterior[1] - 1
+    if desde == 0:
+        fig.canvas.restore_region(region)
+
+    try:
+        with _artistas_temporales(ax):
+            for artista in _dibujar_trayectoria(ax, edades[desde:], imcs[desde:], animado=True):
+                ax.draw_artist(artista)
+            imagen = Image.frombuffer("RGBA", fig.canvas.get_width_height(), fig.canvas.buffer_rgba(),
+                                      "raw", "RGBA", 0, 1).convert("RGB")
+            _guardar_archivo(nombre, lambda ruta: imagen.save(ruta, format="PNG"))
+    finally:
+        fig.canvas.restore_region(region)
+    return desde > 0
+
+def generar_variante(origen: str, nombre: str, ancho: int, formato: str) -> str:
+    """
+    Crea una variante de un gráfico ya guardado: reducida al ancho pedido y
+    en otro formato. Parte de los píxeles del PNG original en lugar de volver
+    a dibujar con matplotlib.
+    
+    Args:
+        origen: Ruta del PNG original
+        nombre: Nombre del archivo de la variante dentro de graficos/
+        ancho: Ancho en píxeles (el alto conserva la proporción)
+        formato: 'png', 'png8' (paleta de 256 colores) o 'webp'
+    
+    Returns:
+        str: Nombre del archivo guardado
+    """
+    from PIL import Image
+
+    with Image.open(origen) as original:
+        imagen = original.convert("RGB")
+    if ancho < imagen.width:
+        imagen = imagen.resize((ancho, round(imagen.height * ancho / imagen.width)), Image.Resampling.LANCZOS)
+    if formato == "webp":
+        # Con pérdida: el texto y las líneas se mantienen nítidos y pesa varias veces menos que el PNG
+        escribir = lambda ruta: imagen.save(ruta, format="WEBP", quality=80, method=4)
+    elif formato == "png8":
+        paleta = imagen.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+        escribir = lambda ruta: paleta.save(ruta, format="PNG", optimize=True)
+    else:
+        escribir = lambda ruta: imagen.save(ruta, format="PNG")
+    _guardar_archivo(nombre, escribir)
+    return nombre
@@ -1,32 +1,58 @@
 import 'dart:convert';
+import 'dart:math';
 import 'package:http/http.dart' as http;
 
 class ApiService {
   static const baseUrl = 'http://127.0.0.1:8000'; // Cambia si corres en Android
 
-  // Enviar mensaje al bot
+  // ID de la conversación, asignado por el backend en /bienvenida
+  static String? _sessionId;
+
+  static final _random = Random.secure();
+
+  // Clave aleatoria que identifica un envío y sus reintentos
+  static String _nuevaClave() =>
+      List.generate(16, (_) => _random.nextInt(256).toRadixString(16).padLeft(2, '0')).join();
+
+  // Enviar mensaje al bot. Si la red falla se reenvía una vez con la misma
+  // Idempotency-Key, así el backend no aplica el mensaje dos veces
   static Future<Map<String, dynamic>> enviarMensaje(String mensaje) async {
-    final res = await http.post(
-      Uri.parse('$baseUrl/mensaje'),
-      headers: {'Content-Type': 'application/json'},
-      body: jsonEncode({'texto': mensaje}),
-    );
-    return jsonDecode(res.body);
+    final clave = _nuevaClave();
+    Future<http.Response> enviar() => http.post(
+          Uri.parse('$baseUrl/mensaje'),
+          headers: {'Content-Type': 'application/json', 'Idempotency-Key': clave},
+          body: jsonEncode({'texto': mensaje, 'session_id': _sessionId}),
+        );
+    http.Response res;
+    try {
+      res = await enviar();
+    } on http.ClientException {
+      res = await enviar();
+    }
+    final data = jsonDecode(res.body);
+    // Sin /bienvenida previa el backend crea la sesión en el primer mensaje
+    _sessionId ??= data['session_id'];
+    return data;
   }
 
-  // Obtener gráfico IMC por ID
+  // Obtener gráfico IMC por ID, en la variante para celulares (WebP de 640 px,
+  // que el backend genera junto con el gráfico)
   static String getGraficoUrl(String graphId) {
-    return '$baseUrl/grafico/$graphId';
+    return '$baseUrl/grafico/$graphId?ancho=640&formato=webp';
   }
 
   // Reiniciar estado conversacional
   static Future<void> reiniciar() async {
-    await http.get(Uri.parse('$baseUrl/reiniciar'));
+    await http.get(Uri.parse('$baseUrl/reiniciar').replace(
+      queryParameters: _sessionId != null ? {'session_id': _sessionId} : null,
+    ));
   }
 
   // ✅ Obtener mensaje de bienvenida
   static Future<Map<String, dynamic>> getBienvenida() async {
     final res = await http.get(Uri.parse('$baseUrl/bienvenida'));
-    return jsonDecode(res.body);
+    final data = jsonDecode(res.body);
+    _sessionId = data['session_id'];
+    return data;
   }
 }